@@ -1,10 +1,10 @@
 #backend/app/__init__.py
 import os
 from flask import Flask, g, send_from_directory
-import firebase_admin
-from firebase_admin import credentials
 from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request 
 from .extensions import db, migrate, jwt, admin, cors, mail
+from .db_pool import configure_database, instrument_pool
+from .db_routing import init_db_routing, STICKY_HEADER
 
 
 def create_app(config_object):
@@ -25,13 +25,12 @@ def create_app(config_object):
         try:
             # ตรวจสอบ JWT ใน cookie
             verify_jwt_in_request(locations=['cookies'], optional=True)
-            current_user_id = get_jwt_identity()
-            if current_user_id:
-                from .models import User
-                user = User.query.get(current_user_id)
+            if get_jwt_identity():
+                from .current_user import current_identity
+                # ข้อมูลผู้ใช้จาก cache (ไม่ query ใหม่ทุกครั้งที่ render template)
+                user = current_identity()
                 if user:
-                    # ทำให้ template รู้จัก current_user
-                    user.is_authenticated = True
+                    # ทำให้ template รู้จัก current_user (UserIdentity มี is_authenticated = True)
                     return dict(current_user=user)
         except Exception:
             pass # ถ้ามี error ใดๆ ก็แค่ไม่ส่ง current_user เข้าไป
@@ -67,11 +66,16 @@ def create_app(config_object):
 
 def register_extensions(app):
     """Register Flask extensions."""
+    # ต้องตั้งค่า pool / gevent ก่อน db.init_app สร้าง engine
+    configure_database(app)
     db.init_app(app)
+    instrument_pool(app)
+    init_db_routing(app)
     migrate.init_app(app, db)
     jwt.init_app(app)
     admin.init_app(app)
-    cors.init_app(app, resources={r"/api/*": {"origins": "*"}})
+    # expose_headers: ให้ JavaScript ของ web อ่าน X-DB-Primary-Until แล้วส่งกลับมาได้ (read-your-writes ใน db_routing)
+    cors.init_app(app, resources={r"/api/*": {"origins": "*"}}, expose_headers=[STICKY_HEADER])
     mail.init_app(app)
 
 def register_blueprints(app):
@@ -105,22 +109,16 @@ def register_cli_commands(app):
     """Register Click commands."""
     from . import cli
     app.cli.add_command(cli.admin_cli)
+    app.cli.add_command(cli.scheduler_cli)
+    app.cli.add_command(cli.outbox_cli)
 
 def initialize_services(app):
-    """Initialize other services like Firebase and Scheduler."""
-    with app.app_context():
-        if not firebase_admin._apps:
-            try:
-                service_account_key_path = app.config.get('FIREBASE_SERVICE_ACCOUNT_KEY')
-                if service_account_key_path and os.path.exists(service_account_key_path):
-                    cred = credentials.Certificate(service_account_key_path)
-                    firebase_admin.initialize_app(cred, {'databaseURL': app.config.get('FIREBASE_DATABASE_URL')})
-                    print("Firebase Admin SDK initialized successfully.")
-                else:
-                    print(f"Firebase Service Account Key not found or not configured.")
-            except Exception as e:
-                print(f"Failed to initialize Firebase Admin SDK: {e}")
-
+    """
+    Initialize other services like the Scheduler.
+    Firebase Admin SDK ถูกเริ่มต้นแบบ lazy ตอนใช้งานครั้งแรก (app/firebase_service.py) เพื่อลดเวลาเริ่ม worker/CLI
+    """
+    # Development: รันใน process ลูกของ reloader เท่านั้น
+    # Production: ใช้ `flask scheduler run` (หรือเปิด SCHEDULER_EMBEDDED ใน wsgi.py)
     if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
         from .scheduler import init_scheduler
         init_scheduler(app)
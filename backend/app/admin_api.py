@@ -1,9 +1,15 @@
-from flask import Blueprint, jsonify
+import json
+from flask import Blueprint, jsonify, current_app
 from flask_jwt_extended import verify_jwt_in_request
 from .extensions import db
-from .models import MedicationLog, User, Appointment, MasterMedicine, Medication
-from sqlalchemy import func
-from datetime import date, timedelta
+from .models import MedicationLog, User, Appointment, MasterMedicine, Medication, SchedulerWatermark, SchedulerMetricsSnapshot
+from . import metrics
+from .db_pool import pool_status
+from .date_ranges import day_range, year_range, within
+from .db_routing import read_replica
+from .current_user import current_role
+from sqlalchemy import func, extract
+from datetime import date, datetime, timedelta
 
 # สร้าง Blueprint สำหรับ API ที่ใช้ในหน้า Admin Panel เท่านั้น
 admin_api_bp = Blueprint('admin_api', __name__, url_prefix='/api/admin')
@@ -22,6 +28,7 @@ def admin_required():
         raise e
 
 @admin_api_bp.route('/stats/medication_adherence')
+@read_replica
 def medication_adherence_stats():
     """
     คำนวณสถิติการทานยา 7 วันย้อนหลัง
@@ -41,7 +48,7 @@ def medication_adherence_stats():
         func.date(MedicationLog.taken_at).label('log_date'),
         func.count(MedicationLog.id).label('log_count')
     ).filter(
-        MedicationLog.taken_at >= seven_days_ago,
+        within(MedicationLog.taken_at, day_range(seven_days_ago, days=7)),
         MedicationLog.status == 'taken'
     ).group_by('log_date').order_by('log_date').all()
 
@@ -50,8 +57,8 @@ def medication_adherence_stats():
     data = [0] * 7
 
     for log in daily_logs:
-        # แปลง date object จาก query ให้เป็น string เพื่อเปรียบเทียบ
-        log_date_str = log.log_date.isoformat()
+        # แปลงผลจาก query ให้เป็น string เพื่อเปรียบเทียบ (SQLite คืนค่าเป็น String, PostgreSQL คืนค่าเป็น date)
+        log_date_str = str(log.log_date)
         try:
             index = labels.index(log_date_str)
             data[index] = log.log_count
@@ -65,6 +72,7 @@ def medication_adherence_stats():
     })
 
 @admin_api_bp.route('/stats/user_overview')
+@read_replica
 def user_overview_stats():
     """
     ดึงข้อมูลสรุปภาพรวมจำนวนผู้ใช้ในระบบ
@@ -89,6 +97,7 @@ def user_overview_stats():
     })
 
 @admin_api_bp.route('/stats/medicine_form_distribution')
+@read_replica
 def medicine_form_stats():
     """
     คำนวณสถิติรูปแบบยา (เม็ด, น้ำ, etc.) ที่ถูกสั่งจ่ายให้ผู้ป่วย
@@ -119,6 +128,7 @@ def medicine_form_stats():
 
 # --- *** 2. API ใหม่สำหรับกราฟแท่ง: จำนวนการนัดหมายในแต่ละเดือน *** ---
 @admin_api_bp.route('/stats/appointments_per_month')
+@read_replica
 def appointments_per_month_stats():
     """
     คำนวณจำนวนการนัดหมายทั้งหมดในแต่ละเดือนของปีปัจจุบัน
@@ -131,12 +141,14 @@ def appointments_per_month_stats():
     current_year = date.today().year
     
     # Query เพื่อนับจำนวนนัดหมายในแต่ละเดือนของปีปัจจุบัน
+    # (กรองด้วยช่วงเวลาของปีเพื่อใช้ index ได้ และใช้ extract ซึ่งทำงานได้ทั้ง SQLite และ PostgreSQL)
+    month = extract('month', Appointment.appointment_datetime)
     monthly_counts = db.session.query(
-        func.strftime('%m', Appointment.appointment_datetime).label('month'),
+        month.label('month'),
         func.count(Appointment.id).label('count')
     ).filter(
-        func.strftime('%Y', Appointment.appointment_datetime) == str(current_year)
-    ).group_by('month').order_by('month').all()
+        within(Appointment.appointment_datetime, year_range(current_year))
+    ).group_by(month).order_by(month).all()
     
     # เตรียมข้อมูลสำหรับกราฟ
     # สร้าง list 12 เดือน (0-11)
@@ -144,7 +156,7 @@ def appointments_per_month_stats():
     data = [0] * 12
 
     for item in monthly_counts:
-        # เดือนที่ได้จาก query จะเป็น string '01', '02', ...
+        # เดือนที่ได้จาก query เป็นตัวเลข 1-12
         # เราต้องแปลงเป็น index ของ list (0-11)
         month_index = int(item.month) - 1
         if 0 <= month_index < 12:
@@ -154,4 +166,64 @@ def appointments_per_month_stats():
         "labels": labels,
         "data": data,
         "title": f"จำนวนการนัดหมายรายเดือน (ปี {current_year + 543})"
-    })
\ No newline at end of file
+    })
+
+
+# --- API สำหรับดูสถานะและ metric ของ Scheduler (เฉพาะ Admin) ---
+@admin_api_bp.route('/stats/db_pool')
+def db_pool_stats():
+    """
+    คืนค่าสถานะ connection pool ของฐานข้อมูลใน process นี้ พร้อม metric เวลารอ connection (checkout)
+    """
+    try:
+        admin_required()
+    except Exception:
+        return jsonify(msg="Authentication required"), 401
+
+    if current_role() != 'admin':
+        return jsonify(msg="Admins only"), 403
+
+    snapshot = metrics.snapshot()
+    return jsonify({
+        "pool": pool_status(db.engine),
+        **{kind: [m for m in entries if m['name'].startswith('db_pool_')] for kind, entries in snapshot.items()}
+    })
+
+@admin_api_bp.route('/stats/scheduler')
+def scheduler_stats():
+    """
+    คืนค่า metric ของทุก process ที่รัน Scheduler (เวลาที่ใช้ต่อ tick, lag, จำนวน SQL, จำนวนที่ตรวจ/ส่ง)
+    พร้อม watermark ของแต่ละ Job จากฐานข้อมูล
+    metric อ่านจาก scheduler_metrics_snapshot ที่แต่ละ process บันทึกไว้ (ไม่ใช่หน่วยความจำของ web worker นี้)
+    ค่าเป็นค่าสะสมตั้งแต่ process นั้นเริ่มทำงาน และเก่าได้ไม่เกิน SCHEDULER_METRICS_PUBLISH_SECONDS
+    """
+    try:
+        admin_required()
+    except Exception:
+        return jsonify(msg="Authentication required"), 401
+
+    if current_role() != 'admin':
+        return jsonify(msg="Admins only"), 403
+
+    lease = current_app.extensions.get('scheduler_lease')
+    watermarks = SchedulerWatermark.query.order_by(SchedulerWatermark.name).all()
+    snapshots = SchedulerMetricsSnapshot.query.order_by(
+        SchedulerMetricsSnapshot.is_leader.desc(), SchedulerMetricsSnapshot.updated_at.desc()
+    ).all()
+    # process ที่ไม่ได้บันทึกเกิน 3 รอบถือว่าหยุดทำงานไปแล้ว
+    stale_before = datetime.utcnow() - timedelta(seconds=3 * current_app.config.get('SCHEDULER_METRICS_PUBLISH_SECONDS', 15))
+
+    processes = [{
+        "holder": snap.holder,
+        "is_leader": snap.is_leader,
+        "updated_at": snap.updated_at.isoformat(),
+        "stale": snap.updated_at < stale_before,
+        **json.loads(snap.metrics)
+    } for snap in snapshots]
+
+    return jsonify({
+        "is_leader": bool(lease and lease.is_leader),
+        "leader": next((p["holder"] for p in processes if p["is_leader"] and not p["stale"]), None),
+        "watermarks": {w.name: w.processed_until.isoformat() for w in watermarks},
+        "processes": processes
+    })
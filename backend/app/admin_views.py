@@ -2,12 +2,15 @@
 from flask_admin.contrib.sqla import ModelView
 from flask_admin import BaseView, expose
 from flask import redirect, url_for, request, flash
-from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+from flask_jwt_extended import verify_jwt_in_request
 from flask_wtf import FlaskForm
 from wtforms import StringField, TextAreaField, SelectField, PasswordField
 from wtforms.validators import DataRequired, Optional
 from .extensions import db
-from .email_service import send_email
+from .email_service import send_template_email
+from .recipients import invalidate_user, invalidate_elders
+from .elder_access import manager_ids_of, invalidate_managers
+from .current_user import current_role
 import wtforms
 
 # -----------------------------------------------------------------------------
@@ -22,11 +25,7 @@ class ProtectedAdminView(ModelView):
         try:
             # ตรวจสอบว่ามี JWT ใน cookie หรือไม่
             verify_jwt_in_request(locations=['cookies'])
-            current_user_id = get_jwt_identity()
-            # Import model ภายในฟังก์ชันเพื่อป้องกัน Circular Import
-            from .models import User
-            user = User.query.get(current_user_id)
-            return user.role == 'admin'
+            return current_role() == 'admin'
         except Exception:
             return False
 
@@ -95,13 +94,7 @@ class UserAdminView(ProtectedAdminView):
             if (old_status == 'pending' and new_status == 'active' and model.role == 'osm'):
                 if model.email:
                     try:
-                        subject = "✅ บัญชี อสม. ของคุณได้รับการอนุมัติแล้ว"
-                        body = (
-                            f"สวัสดีคุณ {model.first_name},\n\n"
-                            f"บัญชี อสม. ของคุณในแอปพลิเคชัน 'ยาไม่ลืม' ได้รับการอนุมัติเรียบร้อยแล้ว\n"
-                            f"ตอนนี้คุณสามารถเข้าสู่ระบบเพื่อเริ่มใช้งานได้ทันที"
-                        )
-                        send_email(subject, [model.email], body)
+                        send_template_email('osm_account_approved', [model.email], {'first_name': model.first_name})
                         flash(f"ส่งอีเมลแจ้งเตือนการอนุมัติไปยัง {model.username} เรียบร้อยแล้ว", 'success')
                     except Exception as e:
                         flash(f"ไม่สามารถส่งอีเมลแจ้งเตือนได้: {e}", 'error')
@@ -118,6 +111,21 @@ class UserAdminView(ProtectedAdminView):
         form.username.render_kw = {'readonly': True}
         return form
 
+    # 5. ล้าง cache ผู้รับแจ้งเตือน (อีเมลของผู้ดูแลอาจเปลี่ยน) หลังบันทึกลงฐานข้อมูลแล้ว
+    #    และ cache สิทธิ์ของผู้ดูแล (การเชื่อมโยงอาจถูกแก้ในฟอร์ม)
+    def after_model_change(self, form, model, is_created):
+        invalidate_user(model)
+        invalidate_managers(model.id, *manager_ids_of(model.id))
+
+    def on_model_delete(self, model):
+        # เก็บรายชื่อผู้สูงอายุ/ผู้ดูแลที่เกี่ยวข้องไว้ก่อน เพราะการเชื่อมโยงจะถูกลบไปพร้อมกับผู้ใช้
+        model._affected_elder_ids = [model.id] + [elder.id for elder in model.managed_elders]
+        model._affected_manager_ids = [model.id] + manager_ids_of(model.id)
+
+    def after_model_delete(self, model):
+        invalidate_elders(*model._affected_elder_ids)
+        invalidate_managers(*model._affected_manager_ids)
+
 # -----------------------------------------------------------------------------
 # View สำหรับ Model อื่นๆ ที่ต้องการการปรับแต่งเล็กน้อย
 # -----------------------------------------------------------------------------
@@ -218,10 +226,7 @@ class CustomProtectedView(BaseView):
     def is_accessible(self):
         try:
             verify_jwt_in_request(locations=['cookies'])
-            current_user_id = get_jwt_identity()
-            from .models import User
-            user = User.query.get(current_user_id)
-            return user and user.role == 'admin'
+            return current_role() == 'admin'
         except Exception:
             return False
 
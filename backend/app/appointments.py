@@ -6,18 +6,33 @@ from flask_mail import Message
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime
 from flask import current_app
-from .email_service import send_email
+from .email_service import send_template_email
+from .recipients import get_manager_emails, get_manager_ids
+from .db_routing import read_replica
+from .elder_access import can_manage_elder
+from .current_user import current_identity, current_role
+from .pagination import PageArgumentError, parse_page_args, keyset_paginate, page_meta
+from . import reminder_engine
 
 
 appointments_bp = Blueprint('appointments', __name__, url_prefix='/api/appointments')
 
+
+# --- Query ของ Endpoint (ใช้ร่วมกับ `flask admin explain-check`) ---
+def upcoming_appointments_query(elder_id, now):
+    """นัดหมายของผู้สูงอายุตั้งแต่ now เป็นต้นไป (index (user_id, appointment_datetime, id))"""
+    return Appointment.query.filter(
+        Appointment.user_id == elder_id,
+        Appointment.appointment_datetime >= now
+    )
+
 # --- Endpoint สำหรับผู้ดูแล (Caregiver) ---
 
 @appointments_bp.route('/add', methods=['POST'])
 @jwt_required()
 def add_appointment():
     current_user_id = get_jwt_identity()
-    caregiver = User.query.get(current_user_id)
+    caregiver = current_identity()
 
     if not caregiver or caregiver.role not in ['caregiver', 'osm']: # อนุญาตให้ อสม. เพิ่มได้ด้วย
         return jsonify(msg="Permission denied"), 403
@@ -32,7 +47,7 @@ def add_appointment():
         return jsonify(msg="Missing required fields"), 400
 
     elder = User.query.filter_by(id=elder_id, role='elder').first()
-    if not elder or elder not in caregiver.managed_elders:
+    if not elder or not can_manage_elder(caregiver.id, elder.id):
         return jsonify(msg="Elder not found or you do not manage this elder"), 404
 
     try:
@@ -50,66 +65,60 @@ def add_appointment():
         notes=data.get('notes')
     )
     db.session.add(new_appointment)
-    db.session.commit()
     
     # --- *** เพิ่ม Logic การแจ้งเตือนการสร้างนัดหมายใหม่ *** ---
+    # (อีเมลถูกเขียนลง email_outbox และ commit พร้อมกับนัดหมาย)
     try:
-        elder_name = f"{elder.first_name} {elder.last_name}"
-        creator_name = f"{caregiver.first_name} {caregiver.last_name}"
-        appt_datetime_str_formatted = appointment_dt.strftime('%d/%m/%Y เวลา %H:%M น.')
+        params = {
+            'elder_name': f"{elder.first_name} {elder.last_name}",
+            'creator_name': f"{caregiver.first_name} {caregiver.last_name}",
+            'title': title, 'location': location,
+            'datetime': appointment_dt.strftime('%d/%m/%Y เวลา %H:%M น.')
+        }
 
         # ก. ส่งอีเมลหาผู้สูงอายุ (ถ้ามีอีเมล)
         if elder.email:
-            subject_elder = f"🗓️ มีนัดหมายใหม่: {title}"
-            body_elder = (
-                f"สวัสดีคุณ {elder.first_name},\n\n"
-                f"ผู้ดูแล {creator_name} ได้เพิ่มนัดหมายใหม่ให้คุณ:\n\n"
-                f"เรื่อง: {title}\n"
-                f"วันที่: {appt_datetime_str_formatted}\n"
-                f"สถานที่: {location}\n\n" 
-                f"กรุณาตรวจสอบและเตรียมตัวค่ะ"
-            )
-            send_email(subject_elder, [elder.email], body_elder)
+            send_template_email('appointment_created_elder', [elder.email], {**params, 'first_name': elder.first_name})
 
         # ข. ส่งอีเมลหาผู้ดูแลคนอื่นๆ (ที่ไม่ใช่คนสร้างนัดหมายนี้)
-        other_managers_emails = [
-            manager.email for manager in elder.managers 
-            if manager.email and manager.id != current_user_id
-        ]
+        other_managers_emails = get_manager_emails(elder.id, exclude_id=caregiver.id)
         if other_managers_emails:
-            subject_manager = f"🗓️ มีนัดหมายใหม่สำหรับ {elder_name}"
-            body_manager = (
-                f"แจ้งเตือน: {creator_name} ได้เพิ่มนัดหมายใหม่ให้คุณ {elder_name}:\n\n"
-                f"เรื่อง: {title}\n"
-                f"วันที่: {appt_datetime_str_formatted}\n"
-                f"สถานที่: {location}"
-            )
-            send_email(subject_manager, other_managers_emails, body_manager)
+            send_template_email('appointment_created_manager', other_managers_emails, params)
 
     except Exception as e:
         # ป้องกันไม่ให้ Error จากการส่งอีเมล ทำให้ request ทั้งหมดล้มเหลว
         print(f"Error sending appointment creation notification: {e}")
     # --- จบส่วนการแจ้งเตือน ---
 
+    db.session.flush()
+    reminder_engine.notify_appointment(new_appointment.id)
+    db.session.commit()
+
     return jsonify(msg="Appointment added successfully"), 201
 
 # --- Endpoint สำหรับผู้สูงอายุ ---
 
 @appointments_bp.route('/my_appointments', methods=['GET'])
 @jwt_required()
+@read_replica
 def get_my_appointments():
     current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
-
-    if not user or user.role != 'elder':
+    # ใช้ role จาก token (ไม่ต้อง query ผู้ใช้)
+    if current_role() != 'elder':
         return jsonify(msg="Permission denied"), 403
 
-    # ดึงนัดหมายในอนาคตทั้งหมด เรียงตามวันที่ใกล้ที่สุดก่อน
+    try:
+        limit, before, after = parse_page_args(request.args)
+    except PageArgumentError as e:
+        return jsonify(msg=str(e)), 400
+
+    # ดึงนัดหมายในอนาคต เรียงตามวันที่ใกล้ที่สุดก่อน (หน้าถัดไปใช้ after=next_cursor)
     now = datetime.utcnow()
-    appointments = Appointment.query.filter(
-        Appointment.user_id == current_user_id,
-        Appointment.appointment_datetime >= now
-    ).order_by(Appointment.appointment_datetime.asc()).all()
+    page = keyset_paginate(
+        upcoming_appointments_query(current_user_id, now),
+        Appointment.appointment_datetime, Appointment.id, limit, before, after, descending=False
+    )
+    appointments = page.items
 
     appointment_list = [
         {
@@ -122,26 +131,33 @@ def get_my_appointments():
         } for app in appointments
     ]
     
-    return jsonify(appointments=appointment_list), 200
+    return jsonify(appointments=appointment_list, page=page_meta(page)), 200
 
 @appointments_bp.route('/elder/<int:elder_id>', methods=['GET'])
 @jwt_required()
+@read_replica
 def get_appointments_for_elder_by_manager(elder_id):
     current_user_id = get_jwt_identity()
-    manager = User.query.get(current_user_id)
+    manager = current_identity()
     elder = User.query.filter_by(id=elder_id, role='elder').first()
 
     if not manager or manager.role not in ['caregiver', 'osm']:
         return jsonify(msg="Permission denied."), 403
     
-    if not elder or elder not in manager.managed_elders:
+    if not elder or not can_manage_elder(manager.id, elder.id):
         return jsonify(msg="Elder not found or you do not manage this elder."), 404
 
+    try:
+        limit, before, after = parse_page_args(request.args)
+    except PageArgumentError as e:
+        return jsonify(msg=str(e)), 400
+
     now = datetime.utcnow()
-    appointments = Appointment.query.filter(
-        Appointment.user_id == elder_id,
-        Appointment.appointment_datetime >= now
-    ).order_by(Appointment.appointment_datetime.asc()).all()
+    page = keyset_paginate(
+        upcoming_appointments_query(elder_id, now),
+        Appointment.appointment_datetime, Appointment.id, limit, before, after, descending=False
+    )
+    appointments = page.items
 
     appointment_list = [
         {
@@ -154,13 +170,13 @@ def get_appointments_for_elder_by_manager(elder_id):
             "status": app.status          # <-- เพิ่มบรรทัดนี้ไปด้วยเลย
         } for app in appointments
     ]
-    return jsonify(appointments=appointment_list), 200
+    return jsonify(appointments=appointment_list, page=page_meta(page)), 200
 
 @appointments_bp.route('/delete/<int:appointment_id>', methods=['DELETE'])
 @jwt_required()
 def delete_appointment(appointment_id):
     current_user_id = get_jwt_identity()
-    manager = User.query.get(current_user_id)
+    manager = current_identity()
     
     if not manager or manager.role not in ['caregiver', 'osm']:
         return jsonify(msg="Permission denied."), 403
@@ -171,10 +187,11 @@ def delete_appointment(appointment_id):
         return jsonify(msg="Appointment not found."), 404
 
     elder = User.query.get(app_to_delete.user_id)
-    if not elder or elder not in manager.managed_elders:
+    if not elder or not can_manage_elder(manager.id, elder.id):
         return jsonify(msg="You are not authorized to delete this appointment."), 403
 
     db.session.delete(app_to_delete)
+    reminder_engine.notify_appointment(appointment_id)
     db.session.commit()
     
     return jsonify(msg="Appointment deleted successfully."), 200
@@ -183,7 +200,7 @@ def delete_appointment(appointment_id):
 @jwt_required()
 def update_appointment_status(appointment_id):
     current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    user = current_identity()
     
     appointment = Appointment.query.get(appointment_id)
 
@@ -191,7 +208,7 @@ def update_appointment_status(appointment_id):
         return jsonify(msg="Appointment not found."), 404
 
     # ตรวจสอบสิทธิ์: เฉพาะเจ้าของนัด หรือผู้ดูแลเท่านั้นที่อัปเดตได้
-    if user.id != appointment.user_id and user not in appointment.patient.managers:
+    if user.id != appointment.user_id and not can_manage_elder(user.id, appointment.user_id):
         return jsonify(msg="Permission denied."), 403
 
     data = request.json
@@ -208,11 +225,12 @@ def update_appointment_status(appointment_id):
     appointment.notes = (appointment.notes or "") + f"\n[{timestamp}] Status updated to: {new_status} by {user.role}"
     appointment.status = new_status
 
+    reminder_engine.notify_appointment(appointment.id)
     db.session.commit()
 
     # แจ้งเตือนผู้ดูแล
     if user.role == 'elder':
-        for manager in appointment.patient.managers:
+        for manager_id in get_manager_ids(appointment.user_id):
             # TODO: สร้าง Notification ใน DB และส่ง FCM
             pass
     
@@ -222,7 +240,7 @@ def update_appointment_status(appointment_id):
 @jwt_required()
 def update_appointment(appointment_id):
     current_user_id = get_jwt_identity()
-    manager = User.query.get(current_user_id)
+    manager = current_identity()
     
     if not manager or manager.role not in ['caregiver', 'osm']:
         return jsonify(msg="Permission denied."), 403
@@ -230,7 +248,7 @@ def update_appointment(appointment_id):
     app_to_update = Appointment.query.get_or_404(appointment_id)
     
     elder = User.query.get(app_to_update.user_id)
-    if not elder or elder not in manager.managed_elders:
+    if not elder or not can_manage_elder(manager.id, elder.id):
         return jsonify(msg="You are not authorized to update this appointment."), 403
 
     data = request.json
@@ -251,50 +269,42 @@ def update_appointment(appointment_id):
     app_to_update.doctor_name = data.get('doctor_name')
     app_to_update.notes = data.get('notes')
     app_to_update.appointment_datetime = new_datetime
-
-    db.session.commit()
     
     # --- *** 3. เปลี่ยน Logic การแจ้งเตือนเป็นการส่งอีเมล *** ---
-    elder_name = f"{elder.first_name} {elder.last_name}"
-    new_datetime_str = new_datetime.strftime('%d/%m/%Y เวลา %H:%M น.')
+    # (อีเมลถูกเขียนลง email_outbox และ commit พร้อมกับการแก้ไขนัดหมาย)
+    params = {
+        'elder_name': f"{elder.first_name} {elder.last_name}",
+        'title': app_to_update.title, 'location': app_to_update.location,
+        'old_datetime': old_datetime_str,
+        'new_datetime': new_datetime.strftime('%d/%m/%Y เวลา %H:%M น.')
+    }
     
     # ก. ส่งอีเมลหาผู้ดูแลและ อสม. ทุกคน
-    manager_emails = [m.email for m in elder.managers if m.email]
+    manager_emails = get_manager_emails(elder.id)
     if manager_emails:
-        subject = f"🔄 อัปเดตการนัดหมายของ {elder_name}"
-        body = (
-            f"การนัดหมายเรื่อง '{app_to_update.title}' ของคุณ {elder_name} มีการเปลี่ยนแปลง:\n\n"
-            f"จากเดิม: {old_datetime_str}\n"
-            f"เป็น: {new_datetime_str}\n"
-            f"สถานที่: {app_to_update.location}"
-        )
-        send_email(subject, manager_emails, body)
+        send_template_email('appointment_updated_manager', manager_emails, params)
     
     # ข. ส่งอีเมลหาผู้สูงอายุ (ถ้ามี)
     if elder.email:
-        subject = f'🔄 อัปเดตการนัดหมาย: {app_to_update.title}'
-        body = (
-            f"สวัสดีคุณ {elder.first_name},\n\n"
-            f"การนัดหมายเรื่อง '{app_to_update.title}' ของคุณมีการเปลี่ยนแปลง\n"
-            f"จากเดิมวันที่: {old_datetime_str}\n"
-            f"เป็นวันที่ใหม่: {new_datetime_str}\n\n"
-            f"สถานที่: {app_to_update.location}"
-        )
-        send_email(subject, [elder.email], body)
+        send_template_email('appointment_updated_elder', [elder.email], {**params, 'first_name': elder.first_name})
+
+    reminder_engine.notify_appointment(app_to_update.id)
+    db.session.commit()
 
     return jsonify(msg="Appointment updated successfully."), 200
 
 @appointments_bp.route('/details/<int:appointment_id>', methods=['GET'])
 @jwt_required()
+@read_replica
 def get_appointment_details(appointment_id):
     current_user_id = get_jwt_identity()
-    manager = User.query.get(current_user_id)
+    manager = current_identity()
     
     app_details = Appointment.query.get_or_404(appointment_id)
     
     # ตรวจสอบสิทธิ์
     elder = User.query.get(app_details.user_id)
-    if not manager or manager.role not in ['caregiver', 'osm'] or elder not in manager.managed_elders:
+    if not manager or manager.role not in ['caregiver', 'osm'] or not elder or not can_manage_elder(manager.id, elder.id):
         return jsonify(msg="Permission denied"), 403
 
     return jsonify({
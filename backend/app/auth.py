@@ -4,10 +4,9 @@ from .models import User
 from .extensions import db
 from flask_jwt_extended import create_access_token,set_access_cookies, unset_jwt_cookies
 from flask import render_template, redirect, url_for, flash, make_response, request
-from flask_mail import Message
 from itsdangerous import URLSafeTimedSerializer
 from flask import current_app
-from .extensions import mail 
+from .password_reset import get_password_reset_queue
 
 # สร้าง Blueprint
 auth_bp = Blueprint('auth', __name__, url_prefix='/api/auth')
@@ -27,27 +26,15 @@ def verify_reset_token(token, max_age=3600): # 1 hour
 
 @auth_bp.route('/request_reset_password', methods=['POST'])
 def request_reset_password():
-    data = request.json
+    """
+    ขอรีเซ็ตรหัสผ่าน: ใส่อีเมลเข้าคิวแล้วตอบกลับทันที การค้นหาผู้ใช้และการเขียน outbox ทำนอก request
+    (app/password_reset.py) จึงตอบกลับข้อความเดียวกันด้วยงานเท่ากันเสมอ
+    เพื่อป้องกันการเดาอีเมลในระบบ ทั้งจากข้อความและจากเวลาตอบกลับ
+    """
+    data = request.json or {}
     email = data.get('email')
-    user = User.query.filter_by(email=email).first()
-
-    if user:
-        token = generate_reset_token(user.id)
-        # *** สำคัญ: เปลี่ยน FRONTEND_URL ให้เป็น URL ของ Web App ของคุณ ***
-        reset_url = f"http://localhost:5173/reset-password/{token}"
-        
-        msg = Message('Password Reset Request',
-                      sender=current_app.config['MAIL_DEFAULT_SENDER'],
-                      recipients=[user.email])
-        msg.body = f'''To reset your password, visit the following link:
-{reset_url}
-
-If you did not make this request then simply ignore this email and no changes will be made.
-'''
-        mail.send(msg)
-        return jsonify(msg="An email has been sent with instructions to reset your password."), 200
-    
-    # ส่ง 200 เหมือนกันเพื่อป้องกันการเดาอีเมลในระบบ
+    if isinstance(email, str) and email:
+        get_password_reset_queue(current_app._get_current_object()).put(email)
     return jsonify(msg="If an account with that email exists, an email has been sent."), 200
 
 @auth_bp.route('/reset_password/<token>', methods=['POST'])
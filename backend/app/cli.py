@@ -100,4 +100,289 @@ def create_admin():
     db.session.add(admin_user)
     db.session.commit()
     
-    click.echo(f"Success! Admin user '{username}' has been created.")
\ No newline at end of file
+    click.echo(f"Success! Admin user '{username}' has been created.")
+
+# --- 5. Command Group สำหรับ Scheduler ---
+# เวลาเรียกใช้: flask scheduler <command>
+@click.group('scheduler')
+def scheduler_cli():
+    """Commands for running the reminder scheduler."""
+    pass
+
+
+@scheduler_cli.command('run')
+@with_appcontext
+def run_scheduler():
+    """Runs the reminder scheduler as a dedicated process (leader-elected)."""
+    from flask import current_app
+    from .scheduler import init_scheduler
+
+    click.echo("Starting scheduler process (waiting for leader lease)...")
+    init_scheduler(current_app._get_current_object(), blocking=True)
+
+
+@scheduler_cli.command('status')
+@with_appcontext
+def scheduler_status():
+    """Shows which process currently holds the scheduler leader lease."""
+    from datetime import datetime
+    from .models import SchedulerLease
+
+    lease = SchedulerLease.query.get('scheduler')
+    if not lease:
+        click.echo("No scheduler has ever acquired the lease.")
+        return
+
+    state = "active" if lease.expires_at > datetime.utcnow() else "expired"
+    click.echo(f"Holder:       {lease.holder}")
+    click.echo(f"Acquired at:  {lease.acquired_at:%Y-%m-%d %H:%M:%S} (UTC)")
+    click.echo(f"Heartbeat at: {lease.heartbeat_at:%Y-%m-%d %H:%M:%S} (UTC)")
+    click.echo(f"Expires at:   {lease.expires_at:%Y-%m-%d %H:%M:%S} (UTC) [{state}]")
+
+
+# --- 6. สร้าง Command ย่อย: 'load-sim' ---
+@admin_cli.command('load-sim')
+@click.option('--elders', default=5000, show_default=True, help='Number of synthetic elders.')
+@click.option('--meds-per-elder', default=4, show_default=True, help='Medications per elder.')
+@click.option('--managers-per-elder', default=2, show_default=True, help='Managers linked to each elder.')
+@click.option('--appointments-per-elder', default=0.2, show_default=True, help='Appointments per elder (today + tomorrow).')
+@click.option('--date', 'sim_date', type=click.DateTime(formats=['%Y-%m-%d']), default=None, help='Simulated day (default: today).')
+@click.option('--start', default='00:00', show_default=True, help='Simulated clock start (HH:MM).')
+@click.option('--end', default='24:00', show_default=True, help='Simulated clock end (HH:MM, exclusive).')
+@click.option('--step', 'step_minutes', default=1, show_default=True, help='Minutes between ticks.')
+@click.option('--db', 'db_path', type=click.Path(dir_okay=False), default=None, help='Scratch SQLite file (default: temporary file).')
+@click.option('--seed', default=0, show_default=True, help='Random seed for the synthetic population.')
+@click.option('--no-memory', is_flag=True, help='Skip tracemalloc (faster, no peak memory figures).')
+@click.option('--csv', 'csv_path', type=click.Path(dir_okay=False), default=None, help='Write per-tick measurements to this CSV file.')
+@with_appcontext
+def load_sim(elders, meds_per_elder, managers_per_elder, appointments_per_elder, sim_date, start, end,
+             step_minutes, db_path, seed, no_memory, csv_path):
+    """Benchmarks the scheduler jobs over a simulated day on a scratch SQLite database."""
+    import csv
+    import os
+    import tempfile
+    from datetime import date
+    from flask import Flask, current_app
+    from . import load_sim as sim
+
+    if db_path is None:
+        db_path = os.path.join(tempfile.mkdtemp(prefix='load-sim-'), 'load_sim.db')
+    elif os.path.exists(db_path):
+        click.echo(f"Error: '{db_path}' already exists. Please choose a new scratch database file.")
+        return
+    db_path = os.path.abspath(db_path)
+
+    # แอปขนาดเล็กที่มีแค่ db และค่าตั้งค่าเดียวกับแอปปัจจุบัน แต่ชี้ไปที่ฐานข้อมูลชั่วคราว
+    # (Job ของ Scheduler ใช้แค่ db และ current_app.config)
+    sim_app = Flask(__name__)
+    sim_app.config.update({key: value for key, value in current_app.config.items() if key.isupper()})
+    sim_app.config.update(
+        SQLALCHEMY_DATABASE_URI='sqlite:///' + db_path,
+        SQLALCHEMY_BINDS={},
+        SQLALCHEMY_ENGINE_OPTIONS={},
+        TESTING=True,
+    )
+    db.init_app(sim_app)
+
+    def to_minute(value):
+        hour, minute = value.split(':')
+        return int(hour) * 60 + int(minute)
+
+    sim_day = sim_date.date() if sim_date else date.today()
+    with sim_app.app_context():
+        db.create_all()
+        click.echo(f"Seeding scratch database {db_path} ...")
+        counts = sim.seed_population(
+            sim_day, elders, meds_per_elder, managers_per_elder, appointments_per_elder, seed=seed
+        )
+        click.echo(
+            f"Seeded {counts['elders']} elders, {counts['managers']} managers, "
+            f"{counts['medications']} medications, {counts['appointments']} appointments."
+        )
+
+    click.echo(f"Simulating {sim_day} {start}-{end} every {step_minutes} minute(s) ...")
+    results = sim.run_simulated_day(
+        sim_app, sim_day, start_minute=to_minute(start), end_minute=to_minute(end),
+        step_minutes=step_minutes, trace_memory=not no_memory
+    )
+
+    if csv_path:
+        with open(csv_path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['job', 'simulated_time', 'seconds', 'peak_memory_bytes', 'emails'])
+            for job, now, duration, peak, emails in results:
+                writer.writerow([job, now.isoformat(), f'{duration:.6f}', peak, emails])
+        click.echo(f"Per-tick measurements written to {csv_path}")
+
+    click.echo(f"{'Job':<30} | {'Ticks':>5} | {'p50 ms':>8} | {'p95 ms':>8} | {'max ms':>8} | {'Slowest':>7} | {'Peak MiB':>8} | {'Emails':>7} | {'Max/tick':>8}")
+    click.echo("-" * 114)
+    for job, row in sim.summarize(results).items():
+        click.echo(
+            f"{job:<30} | {row['ticks']:>5} | {row['p50'] * 1000:>8.1f} | {row['p95'] * 1000:>8.1f} | "
+            f"{row['max'] * 1000:>8.1f} | {row['slowest_at'].strftime('%H:%M'):>7} | {row['peak_memory'] / 2 ** 20:>8.1f} | "
+            f"{row['emails']:>7} | {row['max_emails']:>8}"
+        )
+
+
+# --- 6.1 สร้าง Command ย่อย: 'startup-bench' ---
+@admin_cli.command('startup-bench')
+@click.option('--runs', default=5, show_default=True, help='Fresh interpreter runs (median is reported).')
+@click.option('--config', 'config_name', default=None, help='Config name from config.py (default: FLASK_CONFIG or "default").')
+@click.option('--top', default=15, show_default=True, help='Number of packages to list.')
+def startup_bench(runs, config_name, top):
+    """Measures import + create_app time in fresh interpreters with `python -X importtime`."""
+    import os
+    from . import startup_bench as bench
+
+    config_name = config_name or os.getenv('FLASK_CONFIG') or 'default'
+    click.echo(f"Measuring create_app('{config_name}') over {runs} fresh interpreter(s) ...")
+    try:
+        results = [bench.run_once(config_name) for _ in range(runs)]
+    except RuntimeError as e:
+        click.echo(f"Error: {e}")
+        return
+    summary = bench.summarize(results)
+
+    click.echo(f"Import app package: {summary['import'] * 1000:>8.1f} ms")
+    click.echo(f"create_app():       {summary['create_app'] * 1000:>8.1f} ms")
+    click.echo(f"Total:              {summary['total'] * 1000:>8.1f} ms")
+    click.echo(f"\n{'Package':<30} | {'Import ms (self)':>16}")
+    click.echo("-" * 49)
+    for package, micros in summary['packages'][:top]:
+        click.echo(f"{package:<30} | {micros / 1000:>16.1f}")
+    if summary['deferred_loaded']:
+        click.echo(f"\nWarning: loaded during startup but should be lazy: {', '.join(summary['deferred_loaded'])}")
+    else:
+        click.echo(f"\nNot loaded during startup: {', '.join(bench.DEFERRED_MODULES)}")
+
+
+# --- 6.2 สร้าง Command ย่อย: 'explain-check' ---
+@admin_cli.command('explain-check')
+@click.option('--verbose', is_flag=True, help='Print the full query plan of every query.')
+@with_appcontext
+def explain_check(verbose):
+    """Checks with EXPLAIN that the hot date-range queries use their composite indexes."""
+    from .query_plans import check_hot_queries
+
+    failed = 0
+    for name, index_name, ok, plan in check_hot_queries():
+        click.echo(f"[{'OK' if ok else 'FAIL'}] {name} -> {index_name}")
+        if verbose or not ok:
+            click.echo('    ' + plan.replace('\n', '\n    '))
+        failed += not ok
+    if failed:
+        raise click.ClickException(f"{failed} quer{'y does' if failed == 1 else 'ies do'} not use the expected index. Run `flask db upgrade`?")
+    click.echo("All hot queries use their indexes.")
+
+
+
+# --- 6.3 สร้าง Command ย่อย: 'replica-sticky-check' ---
+@admin_cli.command('replica-sticky-check')
+def replica_sticky_check():
+    """Checks that read-your-writes routing holds when the next request lands on another worker."""
+    from flask import Flask, g, jsonify
+    from .db_routing import init_db_routing, _is_sticky, STICKY_HEADER
+
+    def make_worker():
+        # 1 Flask app = 1 worker (cache ของ process แยกกันใน app.extensions)
+        worker = Flask(__name__)
+        worker.config.update(SQLALCHEMY_BINDS={'replica': 'sqlite://'}, REPLICA_STICKY_SECONDS=10)
+        init_db_routing(worker)
+
+        @worker.route('/write', methods=['POST'])
+        def write():
+            g.db_wrote = True
+            return jsonify(ok=True)
+
+        @worker.route('/read')
+        def read():
+            return jsonify(primary=_is_sticky(worker))
+        return worker
+
+    # ไม่เก็บ cookie (เหมือน web ที่เรียกข้าม origin) ส่งต่อได้เฉพาะ header ที่ client echo กลับ
+    worker_a, worker_b = make_worker().test_client(use_cookies=False), make_worker().test_client(use_cookies=False)
+    primary_until = worker_a.post('/write').headers.get(STICKY_HEADER)
+
+    def reads_primary(client, header):
+        headers = {STICKY_HEADER: header} if header else {}
+        return client.get('/read', headers=headers).get_json()['primary']
+
+    checks = [
+        ('write response carries ' + STICKY_HEADER, primary_until is not None),
+        ('other worker reads primary when the header is echoed', bool(primary_until) and reads_primary(worker_b, primary_until)),
+        ('other worker reads replica without the header', not reads_primary(worker_b, None)),
+        ('expired header reads replica', not reads_primary(worker_b, '1')),
+    ]
+    failed = 0
+    for name, ok in checks:
+        click.echo(f"[{'OK' if ok else 'FAIL'}] {name}")
+        failed += not ok
+    if failed:
+        raise click.ClickException(f"{failed} read-your-writes check(s) failed.")
+    click.echo("Read-your-writes holds across workers for clients that echo " + STICKY_HEADER + ".")
+
+
+# --- 7. Command Group สำหรับ Email Outbox ---
+# เวลาเรียกใช้: flask outbox <command>
+@click.group('outbox')
+def outbox_cli():
+    """Commands for the durable email outbox."""
+    pass
+
+
+@outbox_cli.command('run')
+@click.option('--poll', 'poll_seconds', type=float, default=None, help='Seconds to wait when the outbox is empty.')
+@with_appcontext
+def run_outbox(poll_seconds):
+    """Runs a dedicated outbox drainer (several can run side by side)."""
+    from flask import current_app
+    from .email_outbox import run_outbox_drainer
+
+    click.echo("Starting email outbox drainer...")
+    run_outbox_drainer(current_app._get_current_object(), poll_seconds)
+
+
+@outbox_cli.command('status')
+@with_appcontext
+def outbox_status():
+    """Shows how many outbox emails are in each status."""
+    from .email_outbox import outbox_counts
+
+    counts = outbox_counts()
+    for status in ('pending', 'sending', 'sent', 'dead'):
+        click.echo(f"{status:<8} {counts.get(status, 0)}")
+
+
+@outbox_cli.command('retry-dead')
+@with_appcontext
+def retry_dead():
+    """Moves dead-lettered emails back to pending for another round of attempts."""
+    from datetime import datetime
+    from .models import EmailOutbox
+
+    count = EmailOutbox.query.filter_by(status='dead').update(
+        {'status': 'pending', 'attempts': 0, 'next_attempt_at': datetime.utcnow()},
+        synchronize_session=False
+    )
+    db.session.commit()
+    click.echo(f"Requeued {count} dead email(s).")
+
+
+@outbox_cli.command('stub-server')
+@click.option('--host', default='127.0.0.1', show_default=True)
+@click.option('--port', type=int, default=8025, show_default=True)
+@click.option('--fail-with', 'fail_with', multiple=True, type=int, help='HTTP status to return for the next request (repeatable).')
+def stub_server(host, port, fail_with):
+    """Runs a local stand-in for the SendGrid mail/send API."""
+    from .sendgrid_stub import SendGridStub
+
+    server = SendGridStub(host, port, verbose=True)
+    server.fail_with = list(fail_with)
+    click.echo(f"SendGrid stub listening; set SENDGRID_API_URL={server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        click.echo(f"Accepted {len(server.requests)} request(s) with {len(server.emails())} email(s).")
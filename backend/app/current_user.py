@@ -0,0 +1,137 @@
+# backend/app/current_user.py
+"""
+ผู้ใช้ปัจจุบันของ request (จาก JWT) โดย query ฐานข้อมูลไม่เกิน 1 ครั้งต่อ request
+
+- current_identity(): ข้อมูลพื้นฐานของผู้ใช้ (id, username, role, status, ชื่อ) แบบอ่านอย่างเดียว
+  เก็บใน cache ของ process อายุ IDENTITY_CACHE_TTL_SECONDS และจำไว้ใน g ตลอด request
+  ถูกล้างอัตโนมัติหลัง commit ที่แก้ไขหรือลบแถวของผู้ใช้ (ดู event ท้ายไฟล์)
+- current_role(): role จาก claim ของ JWT (token ของแอปมือถือมี role อยู่แล้ว) ไม่ต้องแตะฐานข้อมูล
+  token ที่ไม่มี claim role (token ของหน้า admin) จะใช้ role จาก current_identity() แทน
+- get_current_user(): object User เต็มรูปแบบ (สำหรับ handler ที่ต้องแก้ไขข้อมูลผู้ใช้) จำไว้ใน g
+"""
+import threading
+from collections import namedtuple
+
+from cachetools import TTLCache
+from flask import current_app, g, has_app_context
+from flask_jwt_extended import get_jwt, get_jwt_identity
+from sqlalchemy import event
+from sqlalchemy.orm import object_session
+
+from .models import User
+from .extensions import db
+from .db_routing import RoutingSession
+from . import metrics
+
+_lock = threading.Lock()
+
+
+class UserIdentity(namedtuple('UserIdentity', ['id', 'username', 'role', 'status', 'first_name', 'last_name'])):
+    """ข้อมูลพื้นฐานของผู้ใช้ที่ cache ได้ (ห้ามใช้แทน User เมื่อต้องแก้ไขข้อมูล)"""
+    __slots__ = ()
+    # ใช้ใน template ของหน้า admin (current_user.is_authenticated)
+    is_authenticated = True
+
+    @property
+    def full_name(self):
+        return f"{self.first_name} {self.last_name}"
+
+
+def _cache():
+    """cache ของแอปปัจจุบัน (สร้างครั้งแรกตามค่าใน config)"""
+    app = current_app._get_current_object()
+    cache = app.extensions.get('identity_cache')
+    if cache is None:
+        with _lock:
+            cache = app.extensions.get('identity_cache')
+            if cache is None:
+                cache = app.extensions['identity_cache'] = TTLCache(
+                    maxsize=app.config.get('IDENTITY_CACHE_SIZE', 10000),
+                    ttl=app.config.get('IDENTITY_CACHE_TTL_SECONDS', 60)
+                )
+    return cache
+
+
+def load_identity(user_id):
+    """UserIdentity ของผู้ใช้ user_id (None ถ้าไม่พบ)"""
+    if user_id is None:
+        return None
+    user_id = int(user_id)
+    if 'identities' not in g:
+        g.identities = {}
+    if user_id in g.identities:
+        return g.identities[user_id]
+
+    cache = _cache()
+    with _lock:
+        identity = cache.get(user_id)
+    if identity is not None:
+        metrics.inc('identity_cache_hits_total')
+    else:
+        metrics.inc('identity_cache_misses_total')
+        row = db.session.query(
+            User.id, User.username, User.role, User.status, User.first_name, User.last_name
+        ).filter(User.id == user_id).first()
+        identity = UserIdentity(*row) if row else None
+        if identity is not None:
+            with _lock:
+                cache[user_id] = identity
+    g.identities[user_id] = identity
+    return identity
+
+
+def current_identity():
+    """UserIdentity ของเจ้าของ JWT ใน request นี้ (ต้องผ่าน jwt_required/verify_jwt_in_request มาก่อน)"""
+    return load_identity(get_jwt_identity())
+
+
+def current_role():
+    """role ของเจ้าของ JWT: ใช้ claim ใน token ถ้ามี ไม่เช่นนั้นใช้จาก current_identity()"""
+    role = get_jwt().get('role')
+    if role is not None:
+        return role
+    identity = current_identity()
+    return identity.role if identity else None
+
+
+def get_current_user():
+    """object User ของเจ้าของ JWT (query ครั้งเดียวต่อ request)"""
+    if 'current_user' not in g:
+        user_id = get_jwt_identity()
+        g.current_user = db.session.get(User, int(user_id)) if user_id is not None else None
+    return g.current_user
+
+
+def invalidate_identity(*user_ids):
+    """ล้าง cache ของผู้ใช้ที่ข้อมูลเปลี่ยน (ถูกเรียกอัตโนมัติหลัง commit)"""
+    if not has_app_context():
+        return
+    cache = _cache()
+    with _lock:
+        for user_id in user_ids:
+            cache.pop(user_id, None)
+    if 'identities' in g:
+        for user_id in user_ids:
+            g.identities.pop(user_id, None)
+
+
+# --- ล้าง cache เมื่อแถวของผู้ใช้ถูกแก้ไข/ลบ ---
+# จดไว้ใน session.info ระหว่าง flush แล้วล้างจริงหลัง commit (ถ้า rollback ข้อมูลเดิมใน cache ยังถูกต้อง)
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _remember_changed_user(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('changed_user_ids', set()).add(target.id)
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _invalidate_changed_users(session):
+    changed = session.info.pop('changed_user_ids', None)
+    if changed:
+        invalidate_identity(*changed)
+
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _forget_changed_users(session):
+    session.info.pop('changed_user_ids', None)
@@ -0,0 +1,32 @@
+# backend/app/date_ranges.py
+"""
+ช่วงเวลาแบบ half-open [start, end) สำหรับกรองคอลัมน์ DateTime
+
+ใช้ `column >= start, column < end` แทน func.date(column) == วันที่ / extract('month', column) == เดือน
+เพราะการครอบคอลัมน์ด้วยฟังก์ชันทำให้ฐานข้อมูลใช้ index บนคอลัมน์นั้นไม่ได้ (ต้องสแกนทั้งตาราง)
+"""
+from datetime import datetime, time, timedelta
+
+
+def day_range(day, days=1):
+    """ช่วงตั้งแต่ต้นวัน day ถึงต้นวันที่ day + days"""
+    start = datetime.combine(day, time.min)
+    return start, start + timedelta(days=days)
+
+
+def month_range(year, month):
+    """ช่วงของเดือน month ในปี year"""
+    start = datetime(year, month, 1)
+    end = datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)
+    return start, end
+
+
+def year_range(year):
+    """ช่วงของปี year"""
+    return datetime(year, 1, 1), datetime(year + 1, 1, 1)
+
+
+def within(column, bounds):
+    """เงื่อนไข start <= column < end (ใช้กับ .filter())"""
+    start, end = bounds
+    return (column >= start) & (column < end)
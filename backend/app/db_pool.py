@@ -0,0 +1,148 @@
+# backend/app/db_pool.py
+"""
+การเชื่อมต่อฐานข้อมูลสำหรับ gunicorn --worker-class gevent
+
+- psycopg2 รอผลจาก PostgreSQL แบบ blocking ใน C ทำให้ query ที่ช้า 1 ตัวหยุดทุก greenlet ใน worker
+  ถ้า process ถูก monkey-patch ด้วย gevent จะตั้ง wait callback ให้ psycopg2 รอ socket ผ่าน event loop ของ gevent แทน
+  (วิธีเดียวกับแพ็กเกจ psycogreen)
+- MeteredQueuePool คือ QueuePool ที่วัดเวลารอ connection (checkout) เมื่อ greenlet มากกว่าขนาด pool
+  และนับครั้งที่รอจนหมดเวลา เพื่อใช้ปรับ DB_POOL_SIZE / DB_MAX_OVERFLOW
+- instrument_pool() ผูก pool event checkout/checkin/connect ของ engine หลัก เพื่อบันทึกสถานะของ pool
+ใช้เฉพาะ API สาธารณะของ SQLAlchemy (Pool.connect(), pool event และ size()/checkedout()/checkedin()/overflow())
+"""
+from time import perf_counter
+
+from sqlalchemy import exc, event
+from sqlalchemy.pool import QueuePool
+
+from .extensions import db
+from . import metrics
+
+# ช่องของ histogram เวลารอ connection (วินาที)
+CHECKOUT_WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def gevent_active():
+    """process นี้ถูก monkey-patch ด้วย gevent หรือไม่"""
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched('socket')
+
+
+def gevent_wait_callback(conn, timeout=None):
+    """wait callback ของ psycopg2: รอ socket ของ connection ผ่าน gevent (greenlet อื่นทำงานต่อได้ระหว่างรอ)"""
+    from psycopg2 import extensions, OperationalError
+    from gevent.socket import wait_read, wait_write
+
+    while True:
+        state = conn.poll()
+        if state == extensions.POLL_OK:
+            break
+        elif state == extensions.POLL_READ:
+            wait_read(conn.fileno(), timeout=timeout)
+        elif state == extensions.POLL_WRITE:
+            wait_write(conn.fileno(), timeout=timeout)
+        else:
+            raise OperationalError(f"Bad result from poll: {state!r}")
+
+
+def make_psycopg_green():
+    """ตั้ง wait callback ของ psycopg2 ให้ทำงานร่วมกับ gevent (คืนค่า True ถ้าตั้งค่าแล้ว)"""
+    try:
+        from psycopg2 import extensions
+    except ImportError:
+        return False
+    if extensions.get_wait_callback() is not gevent_wait_callback:
+        extensions.set_wait_callback(gevent_wait_callback)
+        print("psycopg2: ใช้ gevent wait callback (query ไม่บล็อก greenlet อื่น)")
+    return True
+
+
+class MeteredQueuePool(QueuePool):
+    """
+    QueuePool ที่บันทึกเวลารอ connection ลง app/metrics.py
+    (Engine ขอ connection ผ่าน connect() ทุกครั้ง เวลาที่วัดจึงรวมการรอ connection ว่าง การเปิดใหม่ และ pre-ping)
+    """
+
+    def connect(self):
+        started = perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            metrics.inc('db_pool_checkout_timeouts_total')
+            raise
+        finally:
+            metrics.observe('db_pool_checkout_wait_seconds', perf_counter() - started, buckets=CHECKOUT_WAIT_BUCKETS)
+
+
+def configure_database(app):
+    """
+    เตรียมค่าการเชื่อมต่อฐานข้อมูลก่อน db.init_app(app)
+    - ใช้ MeteredQueuePool กับฐานข้อมูลที่ไม่ใช่ SQLite (ถ้าไม่ได้ระบุ poolclass เอง)
+    - เปิด gevent wait callback ของ psycopg2 เมื่อรันภายใต้ gevent
+    """
+    uri = app.config.get('SQLALCHEMY_DATABASE_URI') or ''
+    if uri.startswith('sqlite'):
+        return
+    options = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    if app.config.get('DB_POOL_METRICS', True):
+        options.setdefault('poolclass', MeteredQueuePool)
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+
+    if uri.startswith('postgresql') and gevent_active():
+        make_psycopg_green()
+
+
+def instrument_pool(app):
+    """
+    บันทึกสถานะ pool ของ engine หลักทุกครั้งที่มีการยืม/คืน connection และนับ connection ที่เปิดใหม่
+    (เรียกหลัง db.init_app ซึ่งเป็นผู้สร้าง engine; ผูก event กับ engine จึงยังทำงานหลัง engine.dispose() สร้าง pool ใหม่)
+    """
+    if not app.config.get('DB_POOL_METRICS', True):
+        return
+    with app.app_context():
+        engine = db.engine
+    if not isinstance(engine.pool, QueuePool):
+        return
+
+    def record_status(checked_out, overflow, idle):
+        metrics.set_gauge('db_pool_checked_out', checked_out)
+        metrics.set_gauge('db_pool_overflow', max(overflow, 0))
+        metrics.set_gauge('db_pool_idle', idle)
+
+    def record_checkout(*args):
+        pool = engine.pool
+        record_status(pool.checkedout(), pool.overflow(), pool.checkedin())
+
+    def record_checkin(*args):
+        # event checkin ถูกเรียกก่อน connection กลับเข้า pool จึงคำนวณสถานะหลังคืนเอง:
+        # ถ้า pool ยังไม่เต็ม connection กลับไปรอใช้ต่อ ไม่เช่นนั้นเป็น connection ส่วนเกิน (overflow) ที่ถูกปิด
+        pool = engine.pool
+        if pool.checkedin() < pool.size():
+            record_status(pool.checkedout() - 1, pool.overflow(), pool.checkedin() + 1)
+        else:
+            record_status(pool.checkedout() - 1, pool.overflow() - 1, pool.checkedin())
+
+    def record_connect(*args):
+        metrics.inc('db_pool_connections_opened_total')
+
+    event.listen(engine, 'checkout', record_checkout)
+    event.listen(engine, 'checkin', record_checkin)
+    event.listen(engine, 'connect', record_connect)
+
+
+def pool_status(engine):
+    """สถานะปัจจุบันของ pool (สำหรับหน้า admin)"""
+    pool = engine.pool
+    if not isinstance(pool, QueuePool):
+        return {'pool': type(pool).__name__}
+    return {
+        'pool': type(pool).__name__,
+        'size': pool.size(),
+        'checked_out': pool.checkedout(),
+        'idle': pool.checkedin(),
+        'overflow': max(pool.overflow(), 0),
+        'timeout': pool.timeout(),
+    }
@@ -0,0 +1,208 @@
+# backend/app/db_routing.py
+"""
+ส่ง query ของ endpoint ที่อ่านอย่างเดียวไปยังฐานข้อมูลสำเนา (read replica)
+
+- endpoint ที่ติด @read_replica จะอ่านจาก bind 'replica' (SQLALCHEMY_BINDS) ถ้าตั้งค่าไว้
+  endpoint อื่นทั้งหมด, การเขียน, SELECT ... FOR UPDATE และการ flush ใช้ฐานข้อมูลหลักเสมอ
+- read-your-writes: เมื่อ request ใดเขียนข้อมูล query ที่เหลือใน request นั้นใช้ฐานข้อมูลหลัก
+  และ response จะมี header X-DB-Primary-Until (เวลาที่ต้องอ่านจากฐานข้อมูลหลักต่อไปอีก REPLICA_STICKY_SECONDS วินาที)
+  client ต้องส่ง header นี้กลับมาใน request ถัดไป (web_frontend/src/api/apiClient.js ทำให้อัตโนมัติ)
+  ทุก worker จึงรู้ว่าต้องอ่านจากฐานข้อมูลหลัก ไม่ว่า request ถัดไปจะไปตก worker ไหน
+  cookie db_primary_until ใช้ได้เฉพาะ client ที่อยู่ origin เดียวกัน (web ที่เรียกข้าม origin ไม่เก็บ cookie นี้)
+  ส่วน cache ของ process (ตาม user id) เป็นเพียงตัวสำรองที่ได้ผลเฉพาะเมื่อ request ถัดไปตก worker เดิม
+  client ที่ไม่ส่ง header กลับจึงอาจอ่านข้อมูลเก่าจากสำเนาได้ไม่เกิน REPLICA_MAX_LAG_SECONDS
+- ถ้าสำเนาตามหลังเกิน REPLICA_MAX_LAG_SECONDS หรือเชื่อมต่อไม่ได้ จะอ่านจากฐานข้อมูลหลักแทน
+  (ตรวจ lag ไม่บ่อยกว่าทุก REPLICA_LAG_CHECK_SECONDS ต่อ process)
+"""
+import threading
+from functools import wraps
+from time import monotonic, time
+
+from cachetools import TTLCache
+from flask import current_app, g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+
+from . import metrics
+
+REPLICA_BIND = 'replica'
+STICKY_COOKIE = 'db_primary_until'
+STICKY_HEADER = 'X-DB-Primary-Until'
+
+# lag ของ PostgreSQL standby (0 ถ้า replay WAL ที่ได้รับครบแล้ว เพื่อไม่ให้ primary ที่ว่างงานดูเหมือนมี lag)
+POSTGRES_LAG_SQL = text(
+    "SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+_lock = threading.Lock()
+_sticky_lock = threading.Lock()
+
+
+class ReplicaMonitor:
+    """วัด lag ของฐานข้อมูลสำเนาเป็นระยะ (ค่าเป็นของแต่ละ process)"""
+
+    def __init__(self, engine, max_lag=5, check_interval=5):
+        self.engine = engine
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.lag = None
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def measure(self):
+        """lag ปัจจุบัน (วินาที) ฐานข้อมูลที่วัด lag ไม่ได้ (เช่น SQLite ในการทดสอบ) ถือว่าเป็น 0"""
+        with self.engine.connect() as conn:
+            if conn.dialect.name == 'postgresql':
+                return float(conn.execute(POSTGRES_LAG_SQL).scalar() or 0)
+            conn.execute(text('SELECT 1'))
+            return 0.0
+
+    def healthy(self):
+        now = monotonic()
+        if self._checked_at is None or now - self._checked_at >= self.check_interval:
+            with self._lock:
+                if self._checked_at is None or now - self._checked_at >= self.check_interval:
+                    try:
+                        self.lag = self.measure()
+                        metrics.set_gauge('db_replica_lag_seconds', self.lag)
+                    except Exception as e:
+                        self.lag = None
+                        metrics.inc('db_replica_errors_total')
+                        print(f"Read replica: ตรวจสอบ lag ไม่สำเร็จ จะอ่านจากฐานข้อมูลหลักแทน: {e}")
+                    self._checked_at = now
+        return self.lag is not None and self.lag <= self.max_lag
+
+
+def get_replica_monitor(app, engine):
+    monitor = app.extensions.get('replica_monitor')
+    if monitor is None:
+        with _lock:
+            monitor = app.extensions.get('replica_monitor')
+            if monitor is None:
+                monitor = app.extensions['replica_monitor'] = ReplicaMonitor(
+                    engine,
+                    max_lag=app.config.get('REPLICA_MAX_LAG_SECONDS', 5),
+                    check_interval=app.config.get('REPLICA_LAG_CHECK_SECONDS', 5)
+                )
+    return monitor
+
+
+def _sticky_cache(app):
+    cache = app.extensions.get('replica_sticky')
+    if cache is None:
+        with _lock:
+            cache = app.extensions.get('replica_sticky')
+            if cache is None:
+                cache = app.extensions['replica_sticky'] = TTLCache(
+                    maxsize=10000, ttl=app.config.get('REPLICA_STICKY_SECONDS', 10)
+                )
+    return cache
+
+
+def _current_identity():
+    try:
+        from flask_jwt_extended import get_jwt_identity
+        return get_jwt_identity()
+    except Exception:
+        return None
+
+
+def _is_sticky(app):
+    """ผู้ใช้คนนี้เพิ่งเขียนข้อมูล (ต้องอ่านจากฐานข้อมูลหลักเพื่อให้เห็นสิ่งที่ตัวเองเขียน)"""
+    for marker in (request.headers.get(STICKY_HEADER), request.cookies.get(STICKY_COOKIE)):
+        try:
+            if marker and float(marker) > time():
+                return True
+        except ValueError:
+            pass
+    identity = _current_identity()
+    if identity is None:
+        return False
+    cache = _sticky_cache(app)
+    with _sticky_lock:
+        return str(identity) in cache
+
+
+def _choose_target(engines):
+    app = current_app._get_current_object()
+    if REPLICA_BIND not in engines:
+        return 'primary', 'no_replica'
+    if _is_sticky(app):
+        return 'primary', 'sticky'
+    if not get_replica_monitor(app, engines[REPLICA_BIND]).healthy():
+        return 'primary', 'lag'
+    return 'replica', 'ok'
+
+
+def _use_replica(engines):
+    if not has_request_context() or not g.get('db_read_replica') or g.get('db_wrote'):
+        return False
+    target = g.get('db_read_target')
+    if target is None:
+        target, reason = _choose_target(engines)
+        g.db_read_target = target
+        metrics.inc('db_read_route_total', target=target, reason=reason)
+    return target == 'replica'
+
+
+def _is_write(clause):
+    return clause is not None and (
+        getattr(clause, 'is_dml', False) or getattr(clause, '_for_update_arg', None) is not None
+    )
+
+
+class RoutingSession(Session):
+    """Session ของ Flask-SQLAlchemy ที่เลือกฐานข้อมูลสำเนาให้ query อ่านอย่างเดียวของ endpoint ที่ติด @read_replica"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and not _is_write(clause):
+            engines = self._db.engines
+            if _use_replica(engines):
+                return engines[REPLICA_BIND]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _mark_write():
+    if has_request_context():
+        g.db_wrote = True
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _after_flush(session, flush_context):
+    _mark_write()
+
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _after_dml(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        _mark_write()
+
+
+def read_replica(func):
+    """ให้ endpoint นี้อ่านจากฐานข้อมูลสำเนาได้ (ต้องเป็น endpoint ที่ไม่ได้พึ่งข้อมูลที่เพิ่งเขียนจาก request อื่น)"""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        g.db_read_replica = True
+        return func(*args, **kwargs)
+    return wrapper
+
+
+def init_db_routing(app):
+    """จำผู้ใช้ที่เพิ่งเขียนข้อมูล เพื่อให้ request ถัดไปของเขาอ่านจากฐานข้อมูลหลัก"""
+    @app.after_request
+    def remember_writer(response):
+        if g.get('db_wrote') and app.config.get('SQLALCHEMY_BINDS', {}).get(REPLICA_BIND):
+            sticky_seconds = app.config.get('REPLICA_STICKY_SECONDS', 10)
+            primary_until = str(int(time() + sticky_seconds) + 1)
+            response.headers[STICKY_HEADER] = primary_until
+            response.set_cookie(
+                STICKY_COOKIE, primary_until,
+                max_age=sticky_seconds + 1, httponly=True, samesite='Lax'
+            )
+            identity = _current_identity()
+            if identity is not None:
+                cache = _sticky_cache(app)
+                with _sticky_lock:
+                    cache[str(identity)] = True
+        return response
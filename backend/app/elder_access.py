@@ -0,0 +1,110 @@
+# backend/app/elder_access.py
+"""
+ตรวจสิทธิ์ "ผู้ดูแล/อสม. คนนี้ดูแลผู้สูงอายุคนนี้หรือไม่"
+
+ใช้แทน `elder not in manager.managed_elders` ซึ่งเป็นความสัมพันธ์แบบ dynamic
+(โหลดผู้สูงอายุทุกคนของผู้ดูแลมาวนหาใน Python ทุกครั้งที่เช็ค)
+- can_manage_elder(): EXISTS บน manager_elder_link 1 ครั้ง (ใช้ primary key (manager_id, elder_id))
+  และจำคำตอบไว้ใน g ตลอด request (เช็คซ้ำใน request เดียวกันไม่ query ใหม่)
+- managed_elder_ids(): set ของ elder_id ที่ผู้ดูแลคนหนึ่งดูแล เก็บใน cache ของ process
+  (ใช้กับงานที่ต้องการรายชื่อทั้งหมด เช่น dashboard ของ อสม.)
+Endpoint ที่เปลี่ยนการเชื่อมโยงต้องเรียก invalidate_managers() หลัง commit
+(cache เป็นของแต่ละ process จึงมีอายุ ELDER_ACCESS_CACHE_TTL_SECONDS เพื่อรับการเปลี่ยนแปลงจาก process อื่น
+ส่วน can_manage_elder ถามฐานข้อมูลทุก request จึงไม่ได้รับผลจาก cache ที่ค้าง)
+"""
+import threading
+from cachetools import TTLCache
+from flask import current_app, g, has_app_context
+from sqlalchemy import exists, select
+
+from .models import manager_elder_link
+from .extensions import db
+from . import metrics
+
+_lock = threading.Lock()
+
+
+def _cache():
+    """cache ของแอปปัจจุบัน (สร้างครั้งแรกตามค่าใน config)"""
+    app = current_app._get_current_object()
+    cache = app.extensions.get('elder_access_cache')
+    if cache is None:
+        with _lock:
+            cache = app.extensions.get('elder_access_cache')
+            if cache is None:
+                cache = app.extensions['elder_access_cache'] = TTLCache(
+                    maxsize=app.config.get('ELDER_ACCESS_CACHE_SIZE', 10000),
+                    ttl=app.config.get('ELDER_ACCESS_CACHE_TTL_SECONDS', 60)
+                )
+    return cache
+
+
+def _memo():
+    """คำตอบที่เช็คแล้วใน request (หรือ app context) ปัจจุบัน: (manager_id, elder_id) -> bool"""
+    if 'elder_access' not in g:
+        g.elder_access = {}
+    return g.elder_access
+
+
+def access_query(manager_id, elder_id):
+    """SELECT EXISTS(...) ของการเชื่อมโยง manager_id -> elder_id (อ่านจาก primary key อย่างเดียว)"""
+    return select(exists().where(
+        manager_elder_link.c.manager_id == manager_id,
+        manager_elder_link.c.elder_id == elder_id
+    ))
+
+
+def can_manage_elder(manager_id, elder_id):
+    """ผู้ใช้ manager_id เป็นผู้ดูแลของผู้สูงอายุ elder_id หรือไม่"""
+    if manager_id is None or elder_id is None:
+        return False
+    key = (int(manager_id), int(elder_id))
+    memo = _memo()
+    if key in memo:
+        metrics.inc('elder_access_checks_total', result='memo')
+        return memo[key]
+
+    allowed = db.session.execute(access_query(*key)).scalar()
+    memo[key] = bool(allowed)
+    metrics.inc('elder_access_checks_total', result='allowed' if allowed else 'denied')
+    return memo[key]
+
+
+def managed_elder_ids(manager_id):
+    """frozenset ของ elder_id ทั้งหมดที่ผู้ดูแล manager_id ดูแลอยู่"""
+    manager_id = int(manager_id)
+    cache = _cache()
+    with _lock:
+        cached = cache.get(manager_id)
+    if cached is not None:
+        metrics.inc('elder_access_cache_hits_total')
+        return cached
+
+    metrics.inc('elder_access_cache_misses_total')
+    elder_ids = frozenset(
+        elder_id for (elder_id,) in db.session.query(manager_elder_link.c.elder_id).filter(
+            manager_elder_link.c.manager_id == manager_id
+        )
+    )
+    with _lock:
+        cache[manager_id] = elder_ids
+    return elder_ids
+
+
+def manager_ids_of(elder_id):
+    """id ของผู้ดูแลทุกคนของผู้สูงอายุ elder_id (ใช้หาว่าต้องล้าง cache ของใครเมื่อผู้สูงอายุถูกแก้ไข/ลบ)"""
+    return [manager_id for (manager_id,) in db.session.query(manager_elder_link.c.manager_id).filter(
+        manager_elder_link.c.elder_id == elder_id
+    )]
+
+
+def invalidate_managers(*manager_ids):
+    """ล้าง cache และคำตอบที่จำไว้ใน request ของผู้ดูแลที่การเชื่อมโยงเปลี่ยน (เรียกหลัง commit)"""
+    manager_ids = {int(manager_id) for manager_id in manager_ids}
+    cache = _cache()
+    with _lock:
+        for manager_id in manager_ids:
+            cache.pop(manager_id, None)
+    if has_app_context() and 'elder_access' in g:
+        for key in [key for key in g.elder_access if key[0] in manager_ids]:
+            del g.elder_access[key]
@@ -0,0 +1,239 @@
+# backend/app/email_outbox.py
+import json
+import random
+import time
+import uuid
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import select, update, delete, or_, and_, func
+
+from .models import EmailOutbox
+from .extensions import db
+from .email_service import get_dispatcher, sender_address, build_payload, plan_batches
+from .email_templates import render_email
+from .rate_limit import get_rate_limiter
+from . import metrics
+
+
+def _ready_condition(now):
+    """แถวที่พร้อมส่ง: รอส่งและถึงเวลาแล้ว หรือถูกจองไว้แต่การจองหมดอายุ (drainer เดิมตายระหว่างส่ง)"""
+    return or_(
+        and_(EmailOutbox.status == 'pending', EmailOutbox.next_attempt_at <= now),
+        and_(EmailOutbox.status == 'sending', EmailOutbox.locked_until < now)
+    )
+
+
+def claim_batch(batch_size, lease_seconds):
+    """
+    จองแถวที่พร้อมส่งไม่เกิน batch_size แถว แล้ว commit การจองทันที
+    - PostgreSQL: เลือกแถวด้วย FOR UPDATE SKIP LOCKED drainer หลายตัวจึงได้แถวไม่ซ้ำกันโดยไม่ต้องรอกัน
+    - SQLite: UPDATE แบบมีเงื่อนไข (ตรวจสถานะซ้ำใน WHERE) ซึ่งปลอดภัยเพราะ SQLite เขียนได้ทีละ transaction
+    """
+    now = datetime.utcnow()
+    token = uuid.uuid4().hex
+    ready = _ready_condition(now)
+
+    # อีเมลเร่งด่วน (priority 0) ถูกดึงก่อน
+    candidates = select(EmailOutbox.id).where(ready).order_by(
+        EmailOutbox.priority, EmailOutbox.next_attempt_at
+    ).limit(batch_size)
+    if db.session.get_bind().dialect.name == 'postgresql':
+        candidates = candidates.with_for_update(skip_locked=True)
+
+    db.session.execute(
+        update(EmailOutbox)
+        .where(EmailOutbox.id.in_(candidates), ready)
+        .values(status='sending', locked_by=token, locked_until=now + timedelta(seconds=lease_seconds))
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return EmailOutbox.query.filter_by(locked_by=token, status='sending').order_by(
+        EmailOutbox.priority, EmailOutbox.id
+    ).all()
+
+
+def backoff_delay(attempts, base_seconds, max_seconds):
+    """ระยะรอก่อนส่งใหม่แบบ exponential backoff (base * 2^(attempts-1)) พร้อม jitter 0-10%"""
+    delay = min(base_seconds * 2 ** (attempts - 1), max_seconds)
+    return timedelta(seconds=delay * (1 + random.random() * 0.1))
+
+
+def render_row(row):
+    """(subject, text_body, html_body) ของแถว: render จากแม่แบบถ้าแถวเก็บชื่อแม่แบบไว้"""
+    if row.template_id:
+        return render_email(row.template_id, json.loads(row.template_params or '{}'))
+    return row.subject, row.text_body, row.html_body
+
+
+def _record_success(row):
+    row.status = 'sent'
+    row.sent_at = datetime.utcnow()
+    row.locked_by = None
+    row.locked_until = None
+    metrics.inc('email_outbox_sent_total')
+
+
+def _record_failure(row, error, retryable, config):
+    row.attempts += 1
+    row.last_error = error
+    row.locked_by = None
+    row.locked_until = None
+    if not retryable or row.attempts >= config.get('EMAIL_OUTBOX_MAX_ATTEMPTS', 8):
+        row.status = 'dead'
+        metrics.inc('email_outbox_dead_total')
+        print(f"EmailOutbox: อีเมล #{row.id} ส่งไม่สำเร็จ {row.attempts} ครั้ง ย้ายไป dead-letter: {error}")
+    else:
+        row.status = 'pending'
+        row.next_attempt_at = datetime.utcnow() + backoff_delay(
+            row.attempts,
+            config.get('EMAIL_OUTBOX_BACKOFF_SECONDS', 30),
+            config.get('EMAIL_OUTBOX_BACKOFF_MAX_SECONDS', 3600)
+        )
+        metrics.inc('email_outbox_retries_total')
+
+
+def _defer(row, seconds):
+    """เลื่อนแถวที่ถูกจำกัดอัตราไปส่งภายหลัง (ไม่นับเป็นการส่งที่ล้มเหลว)"""
+    row.status = 'pending'
+    row.locked_by = None
+    row.locked_until = None
+    row.next_attempt_at = datetime.utcnow() + timedelta(seconds=seconds)
+    metrics.inc('email_deferred_total', priority='urgent' if row.priority == 0 else 'normal')
+
+
+def _release(row):
+    """คืนแถวที่จองไว้แต่ยังไม่ได้ส่ง ให้รอบถัดไปดึงใหม่ตามลำดับเดิม (ไม่เลื่อนเวลา ไม่นับเป็นการเลื่อน)"""
+    row.status = 'pending'
+    row.locked_by = None
+    row.locked_until = None
+
+
+def _record_result(row, result, config):
+    if result is None:
+        _record_success(row)
+    else:
+        _record_failure(row, *result, config)
+
+
+def drain_outbox(app, batch_size=None):
+    """
+    ส่งอีเมลใน outbox 1 batch ผ่าน EmailDispatcher (worker pool + connection pool)
+    อีเมลหลายฉบับถูกรวมเป็นคำขอแบบ multi-personalization (ไม่เกินขีดจำกัดของ SendGrid ต่อคำขอ)
+    แล้วบันทึกผล: สำเร็จ -> 'sent', ล้มเหลว -> retry ภายหลัง หรือ 'dead'
+    คืนค่าจำนวนแถวที่ประมวลผล (ไม่นับแถวที่คืนกลับเพราะโควตาของผู้ให้บริการหมด)
+    """
+    with app.app_context():
+        config = current_app.config
+        batch_size = batch_size or config.get('EMAIL_OUTBOX_BATCH_SIZE', 1000)
+        limiter = get_rate_limiter(app)
+        try:
+            if limiter:
+                # token นับเป็นผู้รับ แต่ละแถวมีผู้รับอย่างน้อย 1 คน จำนวน token จึงเป็นขอบบนของจำนวนแถวที่ส่งได้
+                # (อย่างน้อย 1 แถว) แถวที่ดึงเกินมาถูกคืนกลับเมื่อโควตาหมดด้านล่าง
+                batch_size = max(min(batch_size, limiter.available(urgent=True)), 1)
+            rows = claim_batch(batch_size, config.get('EMAIL_OUTBOX_LEASE_SECONDS', 120))
+            if not rows:
+                return 0
+
+            valid_rows = []
+            messages = []
+            released = 0
+            for index, row in enumerate(rows):
+                try:
+                    recipients = json.loads(row.recipients)
+                    subject, text_body, html_body = render_row(row)
+                except Exception as e:
+                    # ข้อมูลในแถวเสีย (หรือแม่แบบ/params ไม่ตรงกัน) ส่งซ้ำก็ไม่สำเร็จ
+                    _record_failure(row, f"invalid message: {e}", False, config)
+                    continue
+                # rows เรียงอีเมลเร่งด่วนไว้ก่อน จึงได้ token ก่อน ส่วนอีเมลปกติใช้ได้เฉพาะ token ที่เกินส่วนสำรอง
+                wait, scope = limiter.acquire(recipients, urgent=row.priority == 0) if limiter else (0, None)
+                if scope == 'provider':
+                    # โควตาของผู้ให้บริการหมด แถวที่เหลือ (เร่งด่วนเท่ากันหรือน้อยกว่า) ก็ส่งไม่ได้เช่นกัน
+                    # คืนทั้งหมดให้รอบถัดไป แทนการเลื่อนเวลาทีละแถว
+                    for rest in rows[index:]:
+                        _release(rest)
+                    released = len(rows) - index
+                    break
+                if wait:
+                    # ถูกจำกัดเฉพาะโดเมนของแถวนี้ แถวของโดเมนอื่นยังส่งต่อได้
+                    _defer(row, wait)
+                    continue
+                valid_rows.append(row)
+                messages.append((subject, recipients, text_body, html_body))
+
+            if not valid_rows:
+                db.session.commit()
+                return len(rows) - released
+
+            sender = sender_address()
+            if sender is None:
+                for row in valid_rows:
+                    _record_failure(row, "MAIL_DEFAULT_SENDER is not configured", True, config)
+                db.session.commit()
+                return len(rows) - released
+
+            dispatcher = get_dispatcher(app)
+            batches = plan_batches(
+                messages,
+                config.get('EMAIL_BATCH_MAX_RECIPIENTS', 1000),
+                config.get('EMAIL_BATCH_MAX_SUBSTITUTION_BYTES', 10000)
+            )
+            pending = [
+                (batch, dispatcher.submit(build_payload(sender, [messages[i] for i in batch])))
+                for batch in batches
+            ]
+
+            for batch, future in pending:
+                result = future.result()
+                if result is not None and not result[1] and len(batch) > 1:
+                    # SendGrid ปฏิเสธทั้งคำขอ (เช่น มีที่อยู่ผู้รับผิดรูปแบบเพียงฉบับเดียว)
+                    # ส่งแยกทีละฉบับอีกครั้ง เพื่อให้เฉพาะฉบับที่ผิดจริงไป dead-letter
+                    metrics.inc('email_batch_splits_total')
+                    singles = [(i, dispatcher.submit(build_payload(sender, [messages[i]]))) for i in batch]
+                    for i, single in singles:
+                        _record_result(valid_rows[i], single.result(), config)
+                    continue
+                for i in batch:
+                    _record_result(valid_rows[i], result, config)
+
+            db.session.commit()
+            return len(rows) - released
+        except Exception as e:
+            db.session.rollback()
+            print(f"EmailOutbox: เกิดข้อผิดพลาดขณะส่งอีเมลใน outbox: {e}")
+            return 0
+        finally:
+            db.session.remove()
+
+
+def run_outbox_drainer(app, poll_seconds=None):
+    """วนส่งอีเมลใน outbox ไปเรื่อยๆ (ใช้กับคำสั่ง `flask outbox run`) ถ้า batch ไม่เต็มจะพักก่อนตรวจรอบถัดไป"""
+    poll_seconds = poll_seconds or app.config.get('EMAIL_OUTBOX_POLL_SECONDS', 5)
+    batch_size = app.config.get('EMAIL_OUTBOX_BATCH_SIZE', 1000)
+    try:
+        while True:
+            if drain_outbox(app, batch_size) < batch_size:
+                time.sleep(poll_seconds)
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        dispatcher = app.extensions.get('email_dispatcher')
+        if dispatcher:
+            dispatcher.shutdown(app.config.get('EMAIL_DRAIN_TIMEOUT_SECONDS', 30))
+
+
+def outbox_counts():
+    """จำนวนอีเมลใน outbox แยกตามสถานะ"""
+    return dict(db.session.query(EmailOutbox.status, func.count(EmailOutbox.id)).group_by(EmailOutbox.status).all())
+
+
+def prune_outbox(app, keep_days=7):
+    """Job รายวัน: ลบอีเมลที่ส่งสำเร็จแล้วและเก่ากว่า keep_days วัน (แถว 'dead' เก็บไว้ให้ตรวจสอบ)"""
+    with app.app_context():
+        cutoff = datetime.utcnow() - timedelta(days=keep_days)
+        result = db.session.execute(
+            delete(EmailOutbox).where(EmailOutbox.status == 'sent', EmailOutbox.sent_at < cutoff)
+        )
+        db.session.commit()
+        print(f"ลบอีเมลที่ส่งแล้วใน outbox ที่เก่ากว่า {keep_days} วัน จำนวน {result.rowcount} รายการ")
@@ -1,63 +1,271 @@
 # backend/app/email_service.py
 import os
-from threading import Thread
+import json
+import atexit
+import queue
+import threading
+from concurrent.futures import Future
+from time import perf_counter, monotonic
 from flask import current_app
 
-# --- Import ที่จำเป็นสำหรับ SendGrid ---
-from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import Mail
+from . import metrics
+from .extensions import db
+from .models import EmailOutbox
+from .email_templates import get_template
 
-def send_async_email(app, message):
+# สัญญาณให้ worker หยุดทำงาน
+_STOP = object()
+_dispatcher_lock = threading.Lock()
+
+# คำขอแบบรวมหลายฉบับ: เนื้อหากลางเป็น token แล้วแทนค่าด้วยเนื้อหาของแต่ละฉบับผ่าน substitutions ของ personalization
+TEXT_TOKEN = '-text_body-'
+HTML_TOKEN = '-html_body-'
+# ช่องของ histogram จำนวนอีเมลต่อคำขอ
+BATCH_SIZE_BUCKETS = (1, 5, 10, 50, 100, 250, 500, 1000)
+
+
+class EmailDispatcher:
     """
-    ฟังก์ชันสำหรับส่งอีเมลใน background thread เพื่อไม่ให้ request หลักต้องรอ
+    ส่งอีเมลผ่าน SendGrid ด้วย worker จำนวนคงที่ และคิวที่มีขนาดจำกัด
+    แทนการสร้าง Thread ใหม่ + SendGridAPIClient ใหม่ (TLS handshake ใหม่) ทุกครั้งที่ส่ง
+
+    - worker ทุกตัวใช้ requests.Session เดียวกัน จึงใช้ connection ซ้ำได้ (keep-alive)
+    - ถ้าคิวเต็ม ผู้เรียกจะรอ (backpressure) และถ้ายังเต็มเกินเวลาที่กำหนด จะส่งเองแบบ synchronous
+    - shutdown() รอให้ส่งอีเมลที่ค้างในคิวให้หมดก่อน (เรียกอัตโนมัติตอนปิด process)
     """
-    # app_context() จำเป็นเพื่อให้สามารถเข้าถึง current_app.config ได้ใน thread ใหม่
-    with app.app_context():
+
+    def __init__(self, api_url, workers=4, queue_size=1000, enqueue_timeout=5, http_timeout=10):
+        self.api_url = api_url
+        self.enqueue_timeout = enqueue_timeout
+        self.http_timeout = http_timeout
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._closed = False
+
+        # import ตอนสร้าง dispatcher (ครั้งแรกที่ส่งอีเมล) เพื่อลดเวลาเริ่มต้นของ create_app
+        import requests
+        from requests.adapters import HTTPAdapter
+        self._request_error = requests.RequestException
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self._workers = [
+            threading.Thread(target=self._run, name=f'email-worker-{i}', daemon=True)
+            for i in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, message):
+        """
+        ใส่คำขอส่งอีเมล (JSON จาก build_payload) เข้าคิว (รอได้ไม่เกิน enqueue_timeout ถ้าคิวเต็ม)
+        คืนค่า Future ที่จะได้ผลเป็น None เมื่อส่งสำเร็จ หรือ (ข้อความ error, ควร retry หรือไม่)
+        """
+        future = Future()
+        if self._closed:
+            future.set_result(self._deliver(message))
+            return future
         try:
-            # --- *** จุดที่แก้ไขสำคัญ: อ่านค่า API Key จาก os.environ โดยตรง *** ---
-            api_key = os.environ.get('SENDGRID_API_KEY')
-            
-            # ตรวจสอบว่ามี API Key อยู่จริงหรือไม่
-            if not api_key:
-                print("FATAL ERROR: SENDGRID_API_KEY environment variable not set on the server.")
-                return
-
-            # สร้าง client และส่งอีเมล
-            sendgrid_client = SendGridAPIClient(api_key)
-            response = sendgrid_client.send(message)
-            
-            # แสดง Log ผลลัพธ์การส่ง
-            print(f"SendGrid response status code: {response.status_code}")
-            if response.status_code >= 400:
-                print(f"SendGrid response body: {response.body}")
-
-        except Exception as e:
-            # แสดง Exception จริงๆ เพื่อให้ดีบักได้ง่ายขึ้น
+            self._queue.put((message, future), timeout=self.enqueue_timeout)
+        except queue.Full:
+            # คิวเต็มนานเกินไป: ให้ผู้เรียกส่งเอง เพื่อชะลอผู้ผลิตแทนที่จะทิ้งอีเมล
+            metrics.inc('email_backpressure_total')
+            print("EmailDispatcher: คิวเต็ม ส่งอีเมลแบบ synchronous แทน")
+            future.set_result(self._deliver(message))
+        metrics.set_gauge('email_queue_depth', self._queue.qsize())
+        return future
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def shutdown(self, timeout=30):
+        """หยุดรับงานใหม่ แล้วรอให้ worker ส่งอีเมลที่ค้างในคิวให้หมด (ไม่เกิน timeout วินาที)"""
+        if self._closed:
+            return
+        self._closed = True
+        deadline = monotonic() + timeout
+        for _ in self._workers:
+            try:
+                self._queue.put(_STOP, timeout=max(deadline - monotonic(), 0))
+            except queue.Full:
+                break
+        for worker in self._workers:
+            worker.join(timeout=max(deadline - monotonic(), 0))
+        remaining = self._queue.qsize()
+        if remaining:
+            print(f"EmailDispatcher: ปิดตัวขณะยังมีอีเมลค้างในคิว {remaining} ฉบับ")
+        self.session.close()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is _STOP:
+                    return
+                message, future = item
+                try:
+                    future.set_result(self._deliver(message))
+                except Exception as e:
+                    future.set_result((str(e), True))
+            finally:
+                self._queue.task_done()
+                metrics.set_gauge('email_queue_depth', self._queue.qsize())
+
+    def _deliver(self, message):
+        """ส่งคำขอ 1 ครั้งไปยัง SendGrid API (คืนค่า None ถ้าสำเร็จ หรือ (ข้อความ error, ควร retry หรือไม่))"""
+        # --- *** อ่านค่า API Key จาก os.environ โดยตรง *** ---
+        api_key = os.environ.get('SENDGRID_API_KEY')
+        if not api_key:
+            metrics.inc('email_send_failures_total', reason='no_api_key')
+            print("FATAL ERROR: SENDGRID_API_KEY environment variable not set on the server.")
+            return ('SENDGRID_API_KEY not set', True)
+
+        started = perf_counter()
+        try:
+            response = self.session.post(
+                self.api_url,
+                json=message,
+                headers={'Authorization': f'Bearer {api_key}'},
+                timeout=self.http_timeout
+            )
+        except self._request_error as e:
+            metrics.inc('email_send_failures_total', reason='network')
             print(f"An exception occurred while sending SendGrid email: {e}")
+            return (str(e), True)
+        finally:
+            metrics.observe('email_send_seconds', perf_counter() - started)
+
+        # แสดง Log ผลลัพธ์การส่ง
+        print(f"SendGrid response status code: {response.status_code}")
+        if response.status_code >= 400:
+            metrics.inc('email_send_failures_total', reason=str(response.status_code))
+            print(f"SendGrid response body: {response.text}")
+            # 4xx (ยกเว้น 408/429) คืออีเมลที่ผิดรูปแบบ ส่งซ้ำก็ไม่สำเร็จ
+            retryable = response.status_code >= 500 or response.status_code in (408, 429)
+            return (f"HTTP {response.status_code}: {response.text[:500]}", retryable)
+        emails = len(message['personalizations'])
+        metrics.inc('emails_sent_total', emails)
+        metrics.observe('email_batch_size', emails, buckets=BATCH_SIZE_BUCKETS)
+        return None
+
 
-def send_email(subject, recipients, text_body, html_body=None):
+def get_dispatcher(app=None):
+    """คืนค่า EmailDispatcher ของแอป (สร้างครั้งแรกเมื่อมีการส่งอีเมล หลัง fork ของ gunicorn แล้ว)"""
+    app = app or current_app._get_current_object()
+    dispatcher = app.extensions.get('email_dispatcher')
+    if dispatcher is None:
+        with _dispatcher_lock:
+            dispatcher = app.extensions.get('email_dispatcher')
+            if dispatcher is None:
+                dispatcher = EmailDispatcher(
+                    app.config.get('SENDGRID_API_URL', 'https://api.sendgrid.com/v3/mail/send'),
+                    workers=app.config.get('EMAIL_WORKERS', 4),
+                    queue_size=app.config.get('EMAIL_QUEUE_SIZE', 1000),
+                    enqueue_timeout=app.config.get('EMAIL_ENQUEUE_TIMEOUT_SECONDS', 5),
+                    http_timeout=app.config.get('EMAIL_HTTP_TIMEOUT_SECONDS', 10)
+                )
+                app.extensions['email_dispatcher'] = dispatcher
+                atexit.register(dispatcher.shutdown, app.config.get('EMAIL_DRAIN_TIMEOUT_SECONDS', 30))
+    return dispatcher
+
+
+def sender_address():
+    """ผู้ส่งจาก MAIL_DEFAULT_SENDER ในรูปแบบของ SendGrid API (คืนค่า None ถ้ายังไม่ได้ตั้งค่า)"""
+    sender_config = current_app.config.get('MAIL_DEFAULT_SENDER')
+    if not sender_config:
+        print("Error: MAIL_DEFAULT_SENDER is not configured.")
+        return None
+    # import ตอนใช้งาน (เฉพาะ drainer) เพื่อไม่ให้ create_app ต้อง import แพ็กเกจ sendgrid
+    from sendgrid.helpers.mail import From
+    # รองรับทั้ง 'email' และ ('email', 'ชื่อ') เหมือน sendgrid.helpers.mail.Mail
+    sender = From(*sender_config) if isinstance(sender_config, (tuple, list)) else From(sender_config)
+    return sender.get()
+
+
+def build_payload(sender, messages):
+    """
+    สร้าง JSON ของคำขอ /v3/mail/send จาก messages = [(subject, recipients, text_body, html_body), ...]
+    - ฉบับเดียว: ใส่เนื้อหาตรงๆ
+    - หลายฉบับ: 1 personalization ต่อฉบับ (ผู้รับและหัวข้อของตัวเอง) เนื้อหากลางเป็น token
+      และเนื้อหาของแต่ละฉบับถูกแทนค่าผ่าน substitutions (ทุกฉบับในคำขอต้องมี/ไม่มี HTML เหมือนกัน)
+    """
+    batched = len(messages) > 1
+    personalizations = []
+    for subject, recipients, text_body, html_body in messages:
+        personalization = {'to': [{'email': email} for email in recipients], 'subject': subject}
+        if batched:
+            personalization['substitutions'] = {TEXT_TOKEN: text_body}
+            if html_body:
+                personalization['substitutions'][HTML_TOKEN] = html_body
+        personalizations.append(personalization)
+
+    _, _, text_body, html_body = messages[0]
+    content = [{'type': 'text/plain', 'value': TEXT_TOKEN if batched else text_body}]
+    if html_body:
+        # สามารถใส่ HTML เพื่อทำอีเมลให้สวยงามได้
+        content.append({'type': 'text/html', 'value': HTML_TOKEN if batched else html_body})
+    return {'from': sender, 'personalizations': personalizations, 'content': content}
+
+
+def plan_batches(messages, max_recipients=1000, max_substitution_bytes=10000):
+    """
+    แบ่ง messages เป็นกลุ่ม (list ของ index) สำหรับส่งกลุ่มละ 1 คำขอ ตามขีดจำกัดของ SendGrid
+    - ผู้รับรวมทุก personalization ไม่เกิน max_recipients ต่อคำขอ
+    - substitutions ต่อ personalization ไม่เกิน max_substitution_bytes (ฉบับที่เนื้อหายาวกว่านี้ส่งแยก)
+    - ฉบับที่มี HTML และไม่มี HTML อยู่คนละกลุ่ม เพราะใช้เนื้อหากลางไม่เหมือนกัน
+    """
+    batches = []
+    open_batches = {}
+    for i, (_, recipients, text_body, html_body) in enumerate(messages):
+        size = len(text_body.encode('utf-8')) + len((html_body or '').encode('utf-8'))
+        if size > max_substitution_bytes or len(recipients) >= max_recipients:
+            batches.append([i])
+            continue
+        key = bool(html_body)
+        current = open_batches.get(key)
+        if current is None or current[1] + len(recipients) > max_recipients:
+            current = open_batches[key] = [[], 0]
+            batches.append(current[0])
+        current[0].append(i)
+        current[1] += len(recipients)
+    return batches
+
+
+def send_email(subject, recipients, text_body, html_body=None, urgent=False):
     """
-    ฟังก์ชันหลักสำหรับสร้างและส่งอีเมลโดยใช้ SendGrid
+    ฟังก์ชันหลักสำหรับส่งอีเมล
+    อีเมลจะถูกเขียนลงตาราง email_outbox ใน session ปัจจุบัน และถูกส่งจริงเมื่อผู้เรียก commit แล้ว
+    (ถ้า transaction ถูก rollback อีเมลก็จะไม่ถูกส่ง) โดย drainer ใน app/email_outbox.py
     """
     # ตรวจสอบว่า recipients เป็น list
     if not isinstance(recipients, list):
         recipients = [recipients]
-    
-    # ดึงชื่อและอีเมลผู้ส่งจาก config
-    sender_config = current_app.config.get('MAIL_DEFAULT_SENDER')
-    if not sender_config:
-        print("Error: MAIL_DEFAULT_SENDER is not configured.")
-        return
 
-    # สร้าง Message object ของ SendGrid
-    message = Mail(
-        from_email=sender_config,
-        to_emails=recipients,
+    db.session.add(EmailOutbox(
         subject=subject,
-        plain_text_content=text_body,
-        html_content=html_body) # สามารถใส่ HTML เพื่อทำอีเมลให้สวยงามได้
+        recipients=json.dumps(recipients),
+        text_body=text_body,
+        html_body=html_body,
+        priority=0 if urgent else 1
+    ))
+    print(f"Email queued in outbox for subject: '{subject}' to {recipients}")
+
+
+def send_template_email(template_id, recipients, params):
+    """
+    ส่งอีเมลจากแม่แบบใน app/email_templates.py
+    outbox เก็บเพียงชื่อแม่แบบกับ params แล้ว render ด้วยแม่แบบที่ compile ไว้ตอนส่งจริง
+    """
+    if not isinstance(recipients, list):
+        recipients = [recipients]
+    # ตรวจชื่อแม่แบบตั้งแต่ตอนเขียนลง outbox (ชื่อผิดเป็น bug ของผู้เรียก ไม่ใช่ความผิดพลาดชั่วคราว)
+    template = get_template(template_id)
 
-    # สร้าง Thread ใหม่เพื่อส่งอีเมลแบบ Asynchronous
-    app = current_app._get_current_object()
-    Thread(target=send_async_email, args=(app, message)).start()
-    print(f"Email task created for subject: '{subject}' to {recipients}")
+    db.session.add(EmailOutbox(
+        recipients=json.dumps(recipients),
+        template_id=template_id,
+        template_params=json.dumps(params, ensure_ascii=False),
+        priority=0 if template.urgent else 1
+    ))
+    print(f"Email queued in outbox for template: '{template_id}' to {recipients}")
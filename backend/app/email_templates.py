@@ -0,0 +1,185 @@
+# backend/app/email_templates.py
+"""
+ทะเบียนแม่แบบอีเมล (หัวข้อ, เนื้อหา, HTML ถ้ามี) ที่ถูก compile ด้วย Jinja ครั้งเดียวตอนใช้งานครั้งแรก
+(ไม่ compile ตอนโหลดโมดูล เพื่อไม่ให้ create_app และคำสั่ง CLI ต้องเสียเวลา compile แม่แบบทั้งหมด)
+
+ผู้ส่งระบุเพียงชื่อแม่แบบกับ params (dict ที่แปลงเป็น JSON ได้) จึงเก็บลง email_outbox / digest_item
+แทนข้อความที่ render แล้วได้ และการ render ทีละมากๆ (batch / digest) ใช้แม่แบบที่ compile ไว้แล้วซ้ำ
+แม่แบบที่มี digest_line สามารถถูกรวมเข้าอีเมลสรุป (digest) ได้ โดยแสดงเป็น 1 บรรทัดในหมวด digest_group
+แม่แบบ urgent (แจ้งเตือนที่ถึงเวลาแล้ว) ถูกส่งก่อนและได้ใช้โควตาที่สำรองไว้ของ rate limiter (app/rate_limit.py)
+"""
+import threading
+from jinja2 import Environment, StrictUndefined
+
+# เนื้อหาแบบข้อความไม่ต้อง escape ส่วน HTML escape ค่าที่ใส่ทุกครั้ง (params ไม่จำเป็นต้องครบ = error ทันที)
+_text_env = Environment(undefined=StrictUndefined, autoescape=False)
+_html_env = Environment(undefined=StrictUndefined, autoescape=True)
+
+
+class EmailTemplate:
+    """แม่แบบอีเมล 1 แบบที่ compile แล้ว"""
+
+    def __init__(self, subject, text, html=None, digest_group=None, digest_line=None, urgent=False):
+        self.subject = _text_env.from_string(subject)
+        self.text = _text_env.from_string(text)
+        self.html = _html_env.from_string(html) if html else None
+        self.digest_group = digest_group
+        self.digest_line = _text_env.from_string(digest_line) if digest_line else None
+        self.urgent = urgent
+
+    def render(self, params):
+        """คืนค่า (subject, text_body, html_body)"""
+        return (
+            self.subject.render(params),
+            self.text.render(params),
+            self.html.render(params) if self.html else None
+        )
+
+    def render_line(self, params):
+        """บรรทัดที่ใช้แสดงในอีเมลสรุป (digest)"""
+        return self.digest_line.render(params)
+
+
+# -----------------------------------------------------------------------------
+# แม่แบบทั้งหมด
+# -----------------------------------------------------------------------------
+TEMPLATE_SOURCES = {
+    # --- แจ้งเตือนการทานยา (scheduler.py) ---
+    'medicine_pre_reminder': dict(
+        subject="เตรียมตัวทานยาในอีก {{ minutes }} นาที",
+        text="สวัสดีคุณ {{ first_name }},\n\nในอีกประมาณ {{ minutes }} นาที จะถึงเวลาทานยา '{{ med_name }}' ({{ med_time }} น.) กรุณาเตรียมตัวให้พร้อมนะคะ",
+        digest_group="เตรียมตัวทานยา",
+        digest_line="'{{ med_name }}' เวลา {{ med_time }} น. (อีกประมาณ {{ minutes }} นาที)",
+    ),
+    'medicine_due_elder': dict(
+        subject="🔔 ได้เวลาทานยา: {{ med_name }}",
+        text="สวัสดีคุณ {{ first_name }},\n\nถึงเวลาทานยา '{{ med_name }}' แล้วค่ะ\nเวลา: {{ med_time }} น.",
+        digest_group="ถึงเวลาทานยา",
+        digest_line="'{{ med_name }}' เวลา {{ med_time }} น.",
+        urgent=True,
+    ),
+    'medicine_due_manager': dict(
+        subject="🔔 แจ้งเตือน: ถึงเวลาทานยาของ {{ elder_name }}",
+        text="ถึงเวลาที่คุณ {{ elder_name }} ต้องทานยา '{{ med_name }} ({{ med_time }})'\nกรุณาตรวจสอบและติดตามการทานยา",
+        digest_group="ถึงเวลาทานยา",
+        digest_line="คุณ {{ elder_name }}: '{{ med_name }}' ({{ med_time }} น.)",
+        urgent=True,
+    ),
+    'medicine_overdue_manager': dict(
+        subject="🚨 ยาขาด (เตือนซ้ำ)! : {{ elder_name }}",
+        text="แจ้งเตือน: คุณ {{ elder_name }} ยังไม่กดยืนยันการทานยา '{{ med_name }} ({{ med_time }})' ซึ่งเลยเวลามาแล้วประมาณ {{ time_passed }}",
+        digest_group="ยาขาด (เตือนซ้ำ)",
+        digest_line="คุณ {{ elder_name }}: '{{ med_name }}' ({{ med_time }} น.) เลยเวลามาแล้วประมาณ {{ time_passed }}",
+        urgent=True,
+    ),
+    'medicine_overdue_elder': dict(
+        subject="🚨 ลืมทานยา (เตือนซ้ำ): {{ med_name }}",
+        text="สวัสดีคุณ {{ first_name }},\n\nระบบตรวจพบว่าคุณอาจจะยังไม่ได้ทานยา '{{ med_name }}' ของเวลา {{ med_time }} น.\n\nกรุณาตรวจสอบและกดยืนยันในเว็บแอปพลิเคชันด้วยนะคะ",
+        digest_group="ลืมทานยา (เตือนซ้ำ)",
+        digest_line="'{{ med_name }}' ของเวลา {{ med_time }} น.",
+        urgent=True,
+    ),
+
+    # --- แจ้งเตือนนัดหมาย (scheduler.py) ---
+    'appointment_due_manager': dict(
+        subject="‼️ แจ้งเตือนนัดหมายวันนี้: {{ elder_name }}",
+        text="แจ้งเตือน: วันนี้คุณ {{ elder_name }} มีนัดหมายเรื่อง '{{ title }}' เวลา {{ time }} ที่ {{ location }}",
+        digest_group="นัดหมายวันนี้",
+        digest_line="คุณ {{ elder_name }}: '{{ title }}' เวลา {{ time }} ที่ {{ location }}",
+        urgent=True,
+    ),
+    'appointment_due_elder': dict(
+        subject="‼️ ได้เวลานัดหมาย: {{ title }}",
+        text="สวัสดีคุณ {{ first_name }},\n\nถึงเวลานัดหมายเรื่อง '{{ title }}' ของท่านแล้วค่ะ\nเวลา: {{ time }}\nสถานที่: {{ location }}",
+        digest_group="ถึงเวลานัดหมาย",
+        digest_line="'{{ title }}' เวลา {{ time }} ที่ {{ location }}",
+        urgent=True,
+    ),
+    'appointment_overdue_manager': dict(
+        subject="🚨 นัดหมายเลยเวลา (เตือนซ้ำ)! : {{ elder_name }}",
+        text="แจ้งเตือน: นัดหมายเรื่อง '{{ title }}' ของคุณ {{ elder_name }} ได้เลยเวลามาแล้วประมาณ {{ time_passed }} และยังไม่ได้รับการยืนยัน",
+        digest_group="นัดหมายเลยเวลา (เตือนซ้ำ)",
+        digest_line="คุณ {{ elder_name }}: '{{ title }}' เลยเวลามาแล้วประมาณ {{ time_passed }}",
+        urgent=True,
+    ),
+    'appointment_tomorrow_manager': dict(
+        subject="🗓️ แจ้งเตือนนัดหมายวันพรุ่งนี้ของ {{ elder_name }}",
+        text="แจ้งเตือน: คุณ {{ elder_name }} มีนัดหมายในวันพรุ่งนี้\n\nเรื่อง: {{ title }}\nเวลา: {{ time }}\nสถานที่: {{ location }}",
+    ),
+    'appointment_tomorrow_elder': dict(
+        subject="🗓️ แจ้งเตือนนัดหมายวันพรุ่งนี้: {{ title }}",
+        text="สวัสดีคุณ {{ first_name }},\n\nขอแจ้งเตือนว่าท่านมีนัดหมายในวันพรุ่งนี้ ({{ date }})\n\nเรื่อง: {{ title }}\nเวลา: {{ time }}\nสถานที่: {{ location }}\n\nกรุณาเตรียมตัวล่วงหน้าค่ะ",
+    ),
+
+    # --- นัดหมายใหม่ / แก้ไขนัดหมาย (appointments.py) ---
+    'appointment_created_elder': dict(
+        subject="🗓️ มีนัดหมายใหม่: {{ title }}",
+        text="สวัสดีคุณ {{ first_name }},\n\nผู้ดูแล {{ creator_name }} ได้เพิ่มนัดหมายใหม่ให้คุณ:\n\nเรื่อง: {{ title }}\nวันที่: {{ datetime }}\nสถานที่: {{ location }}\n\nกรุณาตรวจสอบและเตรียมตัวค่ะ",
+    ),
+    'appointment_created_manager': dict(
+        subject="🗓️ มีนัดหมายใหม่สำหรับ {{ elder_name }}",
+        text="แจ้งเตือน: {{ creator_name }} ได้เพิ่มนัดหมายใหม่ให้คุณ {{ elder_name }}:\n\nเรื่อง: {{ title }}\nวันที่: {{ datetime }}\nสถานที่: {{ location }}",
+    ),
+    'appointment_updated_manager': dict(
+        subject="🔄 อัปเดตการนัดหมายของ {{ elder_name }}",
+        text="การนัดหมายเรื่อง '{{ title }}' ของคุณ {{ elder_name }} มีการเปลี่ยนแปลง:\n\nจากเดิม: {{ old_datetime }}\nเป็น: {{ new_datetime }}\nสถานที่: {{ location }}",
+    ),
+    'appointment_updated_elder': dict(
+        subject="🔄 อัปเดตการนัดหมาย: {{ title }}",
+        text="สวัสดีคุณ {{ first_name }},\n\nการนัดหมายเรื่อง '{{ title }}' ของคุณมีการเปลี่ยนแปลง\nจากเดิมวันที่: {{ old_datetime }}\nเป็นวันที่ใหม่: {{ new_datetime }}\n\nสถานที่: {{ location }}",
+    ),
+
+    # --- ค่าสุขภาพผิดปกติ (health.py) ---
+    'health_alert_manager': dict(
+        subject="🚨 แจ้งเตือนสุขภาพผิดปกติ: {{ elder_name }}",
+        text="ตรวจพบค่าสุขภาพที่อาจผิดปกติของคุณ {{ elder_name }} ที่บันทึกเมื่อ {{ recorded_at }}:\n\n{% for alert in alerts %}- {{ alert }}\n{% endfor %}\nกรุณาตรวจสอบและให้คำแนะนำเพิ่มเติม",
+        urgent=True,
+    ),
+    'health_alert_elder': dict(
+        subject="🚨 แจ้งเตือนค่าสุขภาพของคุณ",
+        text="สวัสดีคุณ {{ first_name }},\n\nจากการบันทึกข้อมูลสุขภาพล่าสุด พบว่าท่านมีค่าบางอย่างที่ควรให้ความสนใจเป็นพิเศษ:\n\n{% for alert in alerts %}- {{ alert }}\n{% endfor %}\nแนะนำให้พักผ่อนและปรึกษาผู้ดูแลหรือแพทย์หากมีอาการผิดปกติค่ะ",
+        urgent=True,
+    ),
+
+    # --- อนุมัติบัญชี อสม. (admin_views.py) ---
+    'osm_account_approved': dict(
+        subject="✅ บัญชี อสม. ของคุณได้รับการอนุมัติแล้ว",
+        text="สวัสดีคุณ {{ first_name }},\n\nบัญชี อสม. ของคุณในแอปพลิเคชัน 'ยาไม่ลืม' ได้รับการอนุมัติเรียบร้อยแล้ว\nตอนนี้คุณสามารถเข้าสู่ระบบเพื่อเริ่มใช้งานได้ทันที",
+    ),
+
+    # --- รีเซ็ตรหัสผ่าน (auth.py) ---
+    'password_reset': dict(
+        subject="Password Reset Request",
+        text="To reset your password, visit the following link:\n{{ reset_url }}\n\nIf you did not make this request then simply ignore this email and no changes will be made.\n",
+        urgent=True,
+    ),
+
+    # --- อีเมลสรุปการแจ้งเตือน (reminder_digest.py) ---
+    # sections = [[หมวด, [บรรทัด, ...]], ...]
+    'reminder_digest': dict(
+        subject="🔔 สรุปการแจ้งเตือนจาก ยาไม่ลืม ({{ count }} รายการ)",
+        text="สรุปการแจ้งเตือนล่าสุดของคุณ:\n\n{% for group, lines in sections %}{{ group }} ({{ lines|length }} รายการ)\n{% for line in lines %}- {{ line }}\n{% endfor %}\n{% endfor %}กรุณาตรวจสอบรายละเอียดในเว็บแอปพลิเคชันค่ะ",
+        html="<p>สรุปการแจ้งเตือนล่าสุดของคุณ:</p>{% for group, lines in sections %}<h3>{{ group }} ({{ lines|length }} รายการ)</h3><ul>{% for line in lines %}<li>{{ line }}</li>{% endfor %}</ul>{% endfor %}<p>กรุณาตรวจสอบรายละเอียดในเว็บแอปพลิเคชันค่ะ</p>",
+        urgent=True,
+    ),
+}
+
+_compiled = {}
+_compile_lock = threading.Lock()
+
+
+def get_template(template_id):
+    """คืนค่าแม่แบบที่ compile แล้ว (KeyError ถ้าไม่มีแม่แบบชื่อนี้)"""
+    template = _compiled.get(template_id)
+    if template is None:
+        source = TEMPLATE_SOURCES[template_id]
+        with _compile_lock:
+            template = _compiled.get(template_id)
+            if template is None:
+                template = _compiled[template_id] = EmailTemplate(**source)
+    return template
+
+
+def render_email(template_id, params):
+    """render แม่แบบ คืนค่า (subject, text_body, html_body)"""
+    return get_template(template_id).render(params)
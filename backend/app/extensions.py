@@ -5,8 +5,10 @@ from flask_jwt_extended import JWTManager
 from flask_admin import Admin
 from flask_cors import CORS
 from flask_mail import Mail
+from .db_routing import RoutingSession
 
-db = SQLAlchemy()
+# RoutingSession ส่ง query ของ endpoint ที่ติด @read_replica ไปยังฐานข้อมูลสำเนา (app/db_routing.py)
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 migrate = Migrate()
 jwt = JWTManager()
 admin = Admin(name='ยาไม่ลืม Admin Panel', template_mode='bootstrap4')
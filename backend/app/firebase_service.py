@@ -0,0 +1,50 @@
+# backend/app/firebase_service.py
+"""
+เริ่มต้น Firebase Admin SDK แบบ lazy
+
+การ import firebase_admin (และ google-auth / requests ที่มันดึงมาด้วย) กับการอ่านไฟล์ Service Account
+ใช้เวลาหลายร้อยมิลลิวินาที จึงไม่ทำใน create_app (ซึ่งทุก worker ของ gunicorn และทุกคำสั่ง `flask ...` ต้องเรียก)
+แต่ทำครั้งแรกที่มีงานต้องใช้ Firebase จริงผ่าน ensure_firebase()
+"""
+import os
+import threading
+from time import perf_counter
+
+from . import metrics
+
+_lock = threading.Lock()
+
+
+def ensure_firebase(app):
+    """
+    เริ่มต้น Firebase Admin SDK (ครั้งเดียวต่อ process)
+    คืนค่า True ถ้าพร้อมใช้งาน หรือ False ถ้ายังไม่ได้ตั้งค่า/เริ่มต้นไม่สำเร็จ (ไม่ลองใหม่จนกว่าจะเริ่ม process ใหม่)
+    """
+    ready = app.extensions.get('firebase_ready')
+    if ready is not None:
+        return ready
+    with _lock:
+        ready = app.extensions.get('firebase_ready')
+        if ready is not None:
+            return ready
+
+        started = perf_counter()
+        import firebase_admin
+        from firebase_admin import credentials
+
+        ready = bool(firebase_admin._apps)
+        if not ready:
+            try:
+                service_account_key_path = app.config.get('FIREBASE_SERVICE_ACCOUNT_KEY')
+                if service_account_key_path and os.path.exists(service_account_key_path):
+                    cred = credentials.Certificate(service_account_key_path)
+                    firebase_admin.initialize_app(cred, {'databaseURL': app.config.get('FIREBASE_DATABASE_URL')})
+                    print("Firebase Admin SDK initialized successfully.")
+                    ready = True
+                else:
+                    print(f"Firebase Service Account Key not found or not configured.")
+            except Exception as e:
+                print(f"Failed to initialize Firebase Admin SDK: {e}")
+        metrics.observe('firebase_init_seconds', perf_counter() - started)
+        app.extensions['firebase_ready'] = ready
+    return ready
@@ -4,14 +4,28 @@ from .models import User, HealthRecord, Notification
 from .extensions import db
 from flask_jwt_extended import jwt_required, get_jwt, get_jwt_identity
 from datetime import datetime
-from calendar import monthrange
 
 # Import ฟังก์ชันส่งอีเมล
-from .email_service import send_email
+from .email_service import send_template_email
+from .recipients import get_manager_emails, get_manager_ids
+from .date_ranges import month_range, within
+from .db_routing import read_replica
+from .pagination import PageArgumentError, parse_page_args, keyset_paginate, page_meta
+from .elder_access import can_manage_elder
+from .current_user import current_identity
 
 health_bp = Blueprint('health', __name__, url_prefix='/api/health')
 
 
+# --- Query ของ Endpoint (ใช้ร่วมกับ `flask admin explain-check`) ---
+def health_records_query(elder_id, year=None, month=None):
+    """ข้อมูลสุขภาพของผู้สูงอายุ (เฉพาะเดือนที่ระบุถ้ามี) ใช้ index (user_id, record_date, id)"""
+    query = HealthRecord.query.filter_by(user_id=elder_id)
+    if month and year:
+        query = query.filter(within(HealthRecord.record_date, month_range(year, month)))
+    return query
+
+
 # -----------------------------------------------------------------------------
 # Endpoint สำหรับ อสม. เพื่อบันทึกข้อมูลสุขภาพของผู้สูงอายุ
 # -----------------------------------------------------------------------------
@@ -31,7 +45,7 @@ def add_health_record():
     if not elder_id:
         return jsonify(msg="กรุณาระบุรหัสผู้สูงอายุ"), 400
 
-    osm_user = User.query.get(current_user_id)
+    osm_user = current_identity()
     elder = User.query.filter_by(id=elder_id, role='elder').first()
 
     # ตรวจสอบว่า osm_user และ elder มีตัวตนในระบบหรือไม่
@@ -69,34 +83,23 @@ def add_health_record():
     # ถ้ามีค่าผิดปกติ ให้ส่งอีเมลแจ้งเตือน
     if alerts:
         elder_name = f"{elder.first_name} {elder.last_name}"
-        alert_details = "\n".join([f"- {a}" for a in alerts])
 
         # ก. ส่งอีเมลหาผู้ดูแลและ อสม. ทุกคน
-        manager_emails = [manager.email for manager in elder.managers if manager.email]
+        manager_emails = get_manager_emails(elder.id)
         if manager_emails:
-            subject = f"🚨 แจ้งเตือนสุขภาพผิดปกติ: {elder_name}"
-            body = (
-                f"ตรวจพบค่าสุขภาพที่อาจผิดปกติของคุณ {elder_name} ที่บันทึกเมื่อ {datetime.now().strftime('%d/%m/%Y %H:%M')}:\n\n"
-                f"{alert_details}\n\n"
-                f"กรุณาตรวจสอบและให้คำแนะนำเพิ่มเติม"
-            )
-            send_email(subject, manager_emails, body)
+            send_template_email('health_alert_manager', manager_emails, {
+                'elder_name': elder_name, 'alerts': alerts,
+                'recorded_at': datetime.now().strftime('%d/%m/%Y %H:%M')
+            })
 
         # ข. ส่งอีเมลหาผู้สูงอายุ (ถ้ามีอีเมล)
         if elder.email:
-            subject = f"🚨 แจ้งเตือนค่าสุขภาพของคุณ"
-            body = (
-                f"สวัสดีคุณ {elder.first_name},\n\n"
-                f"จากการบันทึกข้อมูลสุขภาพล่าสุด พบว่าท่านมีค่าบางอย่างที่ควรให้ความสนใจเป็นพิเศษ:\n\n"
-                f"{alert_details}\n\n"
-                f"แนะนำให้พักผ่อนและปรึกษาผู้ดูแลหรือแพทย์หากมีอาการผิดปกติค่ะ"
-            )
-            send_email(subject, [elder.email], body)
+            send_template_email('health_alert_elder', [elder.email], {'first_name': elder.first_name, 'alerts': alerts})
 
         # (สร้าง Notification log ในระบบ)
         alert_message_log = f"แจ้งเตือนสุขภาพ ({elder_name}): {', '.join(alerts)}"
-        for manager in elder.managers:
-            notif = Notification(user_id=manager.id, message=alert_message_log)
+        for manager_id in get_manager_ids(elder.id):
+            notif = Notification(user_id=manager_id, message=alert_message_log)
             db.session.add(notif)
             
     db.session.commit()
@@ -108,6 +111,7 @@ def add_health_record():
 # -----------------------------------------------------------------------------
 @health_bp.route('/records/elder/<int:elder_id>', methods=['GET'])
 @jwt_required()
+@read_replica
 def get_health_records_for_elder(elder_id):
     current_user_id = get_jwt_identity()
     claims = get_jwt()
@@ -115,28 +119,26 @@ def get_health_records_for_elder(elder_id):
     if claims.get('role') not in ['caregiver', 'osm', 'elder']:
         return jsonify(msg="สิทธิ์ไม่เพียงพอ"), 403
 
-    viewer = User.query.get(current_user_id)
+    viewer = current_identity()
     elder_to_view = User.query.filter_by(id=elder_id, role='elder').first()
     
     if claims.get('role') == 'elder':
         if elder_id != current_user_id:
             return jsonify(msg="ไม่ได้รับอนุญาตให้เข้าถึงข้อมูลสุขภาพของผู้อื่น"), 403
     elif claims.get('role') == 'caregiver':
-        if not viewer or not elder_to_view or elder_to_view not in viewer.managed_elders:
+        if not viewer or not elder_to_view or not can_manage_elder(viewer.id, elder_to_view.id):
             return jsonify(msg="ไม่ได้รับอนุญาตให้เข้าถึงข้อมูลสุขภาพของผู้สูงอายุรายนี้"), 403
     # ถ้าเป็น 'osm' จะสามารถเข้าถึงได้ทุกคน (ตาม Logic ที่แก้ไขไปก่อนหน้า)
 
     month = request.args.get('month', type=int)
     year = request.args.get('year', type=int)
+    try:
+        limit, before, after = parse_page_args(request.args)
+    except PageArgumentError as e:
+        return jsonify(msg=str(e)), 400
 
-    query = HealthRecord.query.filter_by(user_id=elder_id)
-    if month and year:
-        start_date = datetime(year, month, 1)
-        end_day = monthrange(year, month)[1]
-        end_date = datetime(year, month, end_day, 23, 59, 59)
-        query = query.filter(HealthRecord.record_date >= start_date, HealthRecord.record_date <= end_date)
-
-    records = query.order_by(HealthRecord.record_date.desc()).all()
+    query = health_records_query(elder_id, year, month)
+    page = keyset_paginate(query, HealthRecord.record_date, HealthRecord.id, limit, before, after)
     result = [
         {
             'id': rec.id, 
@@ -146,6 +148,6 @@ def get_health_records_for_elder(elder_id):
             'pulse': rec.pulse,
             'notes': rec.notes, 
             'recorded_at': rec.record_date.strftime('%Y-%m-%d %H:%M')
-        } for rec in records
+        } for rec in page.items
     ]
-    return jsonify(records=result), 200
\ No newline at end of file
+    return jsonify(records=result, page=page_meta(page)), 200
\ No newline at end of file
@@ -0,0 +1,115 @@
+# backend/app/leader.py
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy import update, or_, case
+from sqlalchemy.exc import IntegrityError
+
+from .models import SchedulerLease
+from .extensions import db
+
+
+class LeaderLease:
+    """
+    การเลือกผู้นำด้วยแถวในตาราง scheduler_lease (ใช้ได้ทั้ง SQLite และ PostgreSQL)
+
+    - รับ lease: UPDATE แถวที่ (ผู้ถือคือเรา หรือ หมดอายุแล้ว) ถ้าไม่มีแถวให้ INSERT
+      ถ้ามี process อื่น INSERT ตัดหน้า จะได้ IntegrityError และถือว่าไม่ได้เป็นผู้นำ
+    - heartbeat(): เรียกเป็นระยะเพื่อต่ออายุ หรือพยายามรับช่วงต่อ (takeover) เมื่อผู้นำเดิมหยุดต่ออายุ
+    - is_leader: เชื่อถือได้จนถึงเวลาหมดอายุตามนาฬิกาของเครื่องเอง (หักเผื่อไว้เล็กน้อย)
+    """
+
+    def __init__(self, app, name='scheduler', ttl_seconds=60, on_acquire=None, on_lose=None):
+        self.app = app
+        self.name = name
+        self.ttl = timedelta(seconds=ttl_seconds)
+        self.holder = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.on_acquire = on_acquire
+        self.on_lose = on_lose
+        self._expires_at = None
+        self._was_leader = False
+
+    @property
+    def is_leader(self):
+        # เผื่อเวลาไว้ 10% ของ TTL เพื่อไม่ให้ทำงานซ้อนกับผู้นำคนใหม่ช่วงรอยต่อ
+        return self._expires_at is not None and datetime.utcnow() < self._expires_at - self.ttl / 10
+
+    def _try_acquire(self):
+        now = datetime.utcnow()
+        expires_at = now + self.ttl
+        result = db.session.execute(
+            update(SchedulerLease)
+            .where(
+                SchedulerLease.name == self.name,
+                or_(SchedulerLease.holder == self.holder, SchedulerLease.expires_at < now)
+            )
+            .values(
+                holder=self.holder, heartbeat_at=now, expires_at=expires_at,
+                acquired_at=case((SchedulerLease.holder == self.holder, SchedulerLease.acquired_at), else_=now)
+            )
+        )
+        if result.rowcount == 1:
+            db.session.commit()
+            return expires_at
+
+        db.session.rollback()
+        if db.session.get(SchedulerLease, self.name) is not None:
+            return None
+        try:
+            db.session.add(SchedulerLease(
+                name=self.name, holder=self.holder,
+                acquired_at=now, heartbeat_at=now, expires_at=expires_at
+            ))
+            db.session.commit()
+            return expires_at
+        except IntegrityError:
+            db.session.rollback()
+            return None
+
+    def heartbeat(self):
+        """ต่ออายุ/พยายามรับ lease แล้วเรียก callback เมื่อสถานะผู้นำเปลี่ยน (คืนค่า True ถ้าเป็นผู้นำ)"""
+        with self.app.app_context():
+            try:
+                expires_at = self._try_acquire()
+            except Exception as e:
+                db.session.rollback()
+                print(f"LeaderLease: ไม่สามารถต่ออายุ lease '{self.name}' ได้: {e}")
+                expires_at = None
+            finally:
+                db.session.remove()
+
+        if expires_at is not None:
+            self._expires_at = expires_at
+        elif not self.is_leader:
+            self._expires_at = None
+
+        if self.is_leader and not self._was_leader:
+            self._was_leader = True
+            print(f"LeaderLease: {self.holder} ได้เป็นผู้นำของ '{self.name}'")
+            if self.on_acquire:
+                self.on_acquire()
+        elif not self.is_leader and self._was_leader:
+            self._was_leader = False
+            print(f"LeaderLease: {self.holder} เสียสถานะผู้นำของ '{self.name}'")
+            if self.on_lose:
+                self.on_lose()
+        return self.is_leader
+
+    def release(self):
+        """คืน lease ทันที (ตอนปิด process) เพื่อให้ process อื่นรับช่วงได้โดยไม่ต้องรอหมดอายุ"""
+        with self.app.app_context():
+            try:
+                db.session.execute(
+                    update(SchedulerLease)
+                    .where(SchedulerLease.name == self.name, SchedulerLease.holder == self.holder)
+                    .values(expires_at=datetime.utcnow())
+                )
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                print(f"LeaderLease: ไม่สามารถคืน lease '{self.name}' ได้: {e}")
+            finally:
+                db.session.remove()
+        self._expires_at = None
+        self._was_leader = False
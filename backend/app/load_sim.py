@@ -0,0 +1,174 @@
+# backend/app/load_sim.py
+"""
+ชุดจำลองโหลดของ Scheduler (ใช้ผ่านคำสั่ง `flask admin load-sim`)
+
+สร้างประชากรสังเคราะห์ลงฐานข้อมูล SQLite ชั่วคราว แล้วรัน Job ของ Scheduler ตามนาฬิกาจำลองตลอดทั้งวัน
+โดยแทน send_template_email ด้วยตัวนับ เพื่อวัดเวลาต่อ tick, หน่วยความจำสูงสุด และจำนวนอีเมลต่อ tick
+"""
+import contextlib
+import os
+import random
+import tracemalloc
+from datetime import datetime, time, timedelta
+from time import perf_counter
+from sqlalchemy import insert
+from werkzeug.security import generate_password_hash
+
+from .extensions import db
+from .models import User, Medication, Appointment, manager_elder_link
+from . import scheduler
+
+# เวลาทานยาที่พบบ่อย (ส่วนที่เหลือสุ่มเป็นรายนาที)
+COMMON_MED_TIMES = ['07:00', '08:00', '12:00', '13:00', '18:00', '19:00', '21:00']
+SEED_BATCH_SIZE = 5000
+
+
+class CountingEmailSink:
+    """ใช้แทน send_template_email: นับจำนวนอีเมลและผู้รับโดยไม่ส่งจริง"""
+
+    def __init__(self):
+        self.emails = 0
+        self.recipients = 0
+
+    def __call__(self, template_id, recipients, params):
+        self.emails += 1
+        self.recipients += len(recipients) if isinstance(recipients, list) else 1
+
+
+def _bulk_insert(table, rows):
+    for i in range(0, len(rows), SEED_BATCH_SIZE):
+        db.session.execute(insert(table), rows[i:i + SEED_BATCH_SIZE])
+
+
+def seed_population(sim_date, elders, meds_per_elder, managers_per_elder, appointments_per_elder, seed=0):
+    """
+    สร้างผู้สูงอายุ ผู้ดูแล ยา และนัดหมายสังเคราะห์ด้วย bulk INSERT
+    ผู้ดูแลแต่ละคนดูแลผู้สูงอายุ 1 คน (ผู้สูงอายุ 1 คนมีผู้ดูแล managers_per_elder คน)
+    นัดหมายกระจายอยู่ในวันที่จำลองและวันถัดไป (สำหรับ Job แจ้งเตือนวันพรุ่งนี้)
+    """
+    rng = random.Random(seed)
+    password_hash = generate_password_hash('load-sim')
+
+    def user_row(username, role):
+        return {
+            'username': username, 'email': f'{username}@load-sim.invalid', 'password_hash': password_hash,
+            'first_name': username, 'last_name': 'Sim', 'role': role, 'status': 'active'
+        }
+
+    elder_rows = [user_row(f'elder{i}', 'elder') for i in range(elders)]
+    manager_rows = [user_row(f'manager{i}', 'caregiver') for i in range(elders * managers_per_elder)]
+    _bulk_insert(User, elder_rows + manager_rows)
+    db.session.flush()
+
+    ids = dict(db.session.query(User.username, User.id))
+    elder_ids = [ids[f'elder{i}'] for i in range(elders)]
+    manager_ids = [ids[f'manager{i}'] for i in range(elders * managers_per_elder)]
+
+    links = []
+    medications = []
+    appointments = []
+    for i, elder_id in enumerate(elder_ids):
+        managers = manager_ids[i * managers_per_elder:(i + 1) * managers_per_elder]
+        links += [{'manager_id': manager_id, 'elder_id': elder_id} for manager_id in managers]
+        added_by = managers[0] if managers else elder_id
+
+        for m in range(meds_per_elder):
+            if rng.random() < 0.7:
+                time_to_take = rng.choice(COMMON_MED_TIMES)
+            else:
+                time_to_take = f'{rng.randrange(6, 23):02d}:{rng.randrange(60):02d}'
+            medications.append({
+                'user_id': elder_id, 'added_by_id': added_by, 'name': f'ยาจำลอง {m + 1}',
+                'time_to_take': time_to_take, 'start_date': sim_date - timedelta(days=30)
+            })
+
+        # appointments_per_elder อาจเป็นเศษส่วน เช่น 0.2 = ผู้สูงอายุ 20% มีนัด
+        count = int(appointments_per_elder) + (rng.random() < appointments_per_elder % 1)
+        for _ in range(count):
+            appointment_date = sim_date + timedelta(days=rng.randrange(2))
+            appointments.append({
+                'user_id': elder_id, 'added_by_id': added_by, 'title': 'นัดจำลอง', 'location': 'โรงพยาบาลจำลอง',
+                'appointment_datetime': datetime.combine(appointment_date, time(rng.randrange(8, 17), rng.choice([0, 15, 30, 45]))),
+                'status': 'pending'
+            })
+
+    _bulk_insert(manager_elder_link, links)
+    _bulk_insert(Medication, medications)
+    _bulk_insert(Appointment, appointments)
+    db.session.commit()
+    return {'elders': len(elder_ids), 'managers': len(manager_ids), 'medications': len(medications), 'appointments': len(appointments)}
+
+
+def _measure(func, sink, trace_memory):
+    """รัน func 1 ครั้ง คืนค่า (วินาที, หน่วยความจำสูงสุดเป็นไบต์, จำนวนอีเมล)"""
+    emails_before = sink.emails
+    if trace_memory:
+        tracemalloc.reset_peak()
+    started = perf_counter()
+    # ปิด log ของ tick ระหว่างจำลอง (มีหลายพันบรรทัด)
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        func()
+    duration = perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1] if trace_memory else 0
+    return duration, peak, sink.emails - emails_before
+
+
+def run_simulated_day(app, sim_date, start_minute=0, end_minute=24 * 60, step_minutes=1, trace_memory=True):
+    """
+    เดินนาฬิกาจำลองทีละ step_minutes ตลอดช่วงเวลาที่กำหนดของ sim_date แล้วเรียก Job เหมือนที่ APScheduler เรียก
+    คืนค่า list ของผลการวัดต่อ tick: (job, เวลาจำลอง, วินาที, หน่วยความจำสูงสุด, จำนวนอีเมล)
+    """
+    day_start = datetime.combine(sim_date, time.min)
+    sink = CountingEmailSink()
+    original_send_email = scheduler.send_template_email
+    scheduler.send_template_email = sink
+    results = []
+    if trace_memory:
+        tracemalloc.start()
+    try:
+        scheduler.materialize_dose_occurrences(app, target_date=sim_date)
+        for minute in range(start_minute, end_minute, step_minutes):
+            # เรียกช่วงกลางนาทีเหมือน interval job ที่ไม่ได้ตรงวินาทีที่ 0 พอดี
+            now = day_start + timedelta(minutes=minute, seconds=30)
+            jobs = [
+                ('check_medicine_schedule', lambda: scheduler.check_medicine_schedule(app, now=now)),
+                ('check_today_appointments', lambda: scheduler.check_today_appointments(app, now=now)),
+            ]
+            if minute == 7 * 60:
+                jobs.append(('check_tomorrow_appointments', lambda: scheduler.check_tomorrow_appointments(app, now=now)))
+            if minute == 23 * 60 + 30:
+                jobs.append((
+                    'materialize_dose_occurrences',
+                    lambda: scheduler.materialize_dose_occurrences(app, target_date=sim_date + timedelta(days=1))
+                ))
+            for job, func in jobs:
+                results.append((job, now) + _measure(func, sink, trace_memory))
+    finally:
+        scheduler.send_template_email = original_send_email
+        if trace_memory:
+            tracemalloc.stop()
+    return results
+
+
+def summarize(results):
+    """สรุปผลต่อ Job: จำนวน tick, เวลา p50/p95/สูงสุด/รวม, หน่วยความจำสูงสุด, อีเมลรวม/สูงสุดต่อ tick"""
+    by_job = {}
+    for job, now, duration, peak, emails in results:
+        by_job.setdefault(job, []).append((duration, peak, emails, now))
+
+    summary = {}
+    for job, rows in by_job.items():
+        durations = sorted(row[0] for row in rows)
+        slowest = max(rows, key=lambda row: row[0])
+        summary[job] = {
+            'ticks': len(rows),
+            'p50': durations[len(durations) // 2],
+            'p95': durations[min(int(len(durations) * 0.95), len(durations) - 1)],
+            'max': slowest[0],
+            'slowest_at': slowest[3],
+            'total': sum(durations),
+            'peak_memory': max(row[1] for row in rows),
+            'emails': sum(row[2] for row in rows),
+            'max_emails': max(row[2] for row in rows),
+        }
+    return summary
@@ -0,0 +1,56 @@
+# backend/app/medication_status.py
+"""
+สถานะ "ทานแล้ววันนี้" ของยาหลายตัวพร้อมกัน
+
+ใช้แทนการ query MedicationLog ทีละยา (N+1) ใน endpoint รายการยา, dashboard ของผู้ดูแล และ Scheduler
+- active_on(day): เงื่อนไขยาที่อยู่ในช่วงรับประทานของวันนั้น (กรองใน SQL แทนการวนเช็คใน Python)
+- taken_on(ids, day): 1 query แบบ GROUP BY ต่อยาไม่เกิน IN_CHUNK ตัว ใช้ index (medication_id, taken_at)
+"""
+from datetime import date
+
+from sqlalchemy import func
+
+from .extensions import db
+from .models import Medication, MedicationLog
+from .date_ranges import day_range, within
+
+# จำนวน id สูงสุดใน IN (...) ต่อ 1 query (SQLite รุ่นเก่าจำกัด bind parameter ไว้ที่ 999)
+IN_CHUNK = 500
+
+
+def active_on(day):
+    """เงื่อนไข Medication ที่ต้องทานในวัน day (start_date <= day และยังไม่สิ้นสุด)"""
+    return (Medication.start_date <= day) & (Medication.end_date.is_(None) | (Medication.end_date >= day))
+
+
+def taken_on_query(day, medication_ids=None):
+    """query (medication_id, เวลาที่บันทึกล่าสุด) ของยาที่ถูกบันทึกในวัน day (medication_ids ไม่ควรเกิน IN_CHUNK ตัว)"""
+    query = db.session.query(
+        MedicationLog.medication_id, func.max(MedicationLog.taken_at)
+    ).filter(
+        within(MedicationLog.taken_at, day_range(day))
+    ).group_by(MedicationLog.medication_id)
+    if medication_ids is not None:
+        query = query.filter(MedicationLog.medication_id.in_(medication_ids))
+    return query
+
+
+def taken_on(medication_ids=None, day=None):
+    """
+    คืนค่า dict {medication_id: เวลาที่บันทึกล่าสุดในวัน day} ของยาที่ถูกบันทึกว่าทานแล้ว
+    (medication_ids=None คือยาทุกตัว ใช้กับงานของ Scheduler ที่ดูทั้งระบบ)
+    """
+    day = day or date.today()
+    if medication_ids is None:
+        return dict(taken_on_query(day).all())
+
+    ids = sorted(set(medication_ids))
+    taken = {}
+    for i in range(0, len(ids), IN_CHUNK):
+        taken.update(taken_on_query(day, ids[i:i + IN_CHUNK]).all())
+    return taken
+
+
+def taken_ids_on(medication_ids=None, day=None):
+    """เหมือน taken_on แต่คืนค่าเฉพาะ set ของ medication_id"""
+    return set(taken_on(medication_ids, day))
@@ -4,11 +4,17 @@ import time
 from werkzeug.utils import secure_filename
 from flask import current_app
 from flask import Blueprint, request, jsonify
-from .models import User, Medication, MedicationLog, MasterMedicine
+from .models import User, Medication, MedicationLog, MasterMedicine, DoseOccurrence
 from .extensions import db
+from .scheduler import materialize_medication_occurrence
+from .rtdb_sync import queue_med_status
+from .medication_status import active_on, taken_on
+from .pagination import PageArgumentError, parse_page_args, keyset_paginate, page_meta
+from .elder_access import can_manage_elder
+from .current_user import current_identity, current_role
+from . import reminder_engine
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from datetime import datetime, date
-from firebase_admin import db as firebase_db
+from datetime import datetime, date, timedelta
 
 
 medicines_bp = Blueprint('medicines', __name__, url_prefix='/api/medicines')
@@ -20,6 +26,13 @@ def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+# --- Query ของ Endpoint (ใช้ร่วมกับ `flask admin explain-check`) ---
+def medication_logs_query(elder_id):
+    """ประวัติการทานยาของผู้สูงอายุพร้อมข้อมูลยา (index (user_id, taken_at, id))"""
+    return db.session.query(MedicationLog, Medication).join(
+        Medication, MedicationLog.medication_id == Medication.id
+    ).filter(MedicationLog.user_id == elder_id)
+
 # -----------------------------------------------------------------------------
 # Endpoint สำหรับผู้ดูแล (Caregiver) เพื่อเพิ่มยาให้ผู้สูงอายุ
 # -----------------------------------------------------------------------------
@@ -27,7 +40,7 @@ def allowed_file(filename):
 @jwt_required()
 def add_medication():
     current_user_id = get_jwt_identity()
-    caregiver = User.query.get(current_user_id)
+    caregiver = current_identity()
 
     if not caregiver or caregiver.role != 'caregiver':
         return jsonify(msg="การอนุญาตถูกปฏิเสธ"), 403
@@ -42,7 +55,7 @@ def add_medication():
     if not elder:
         return jsonify(msg=f"ไม่พบผู้สูงอายุที่มีรหัส {elder_id}"), 404
 
-    if elder not in caregiver.managed_elders:
+    if not can_manage_elder(caregiver.id, elder.id):
         return jsonify(msg=f"คุณไม่ได้รับสิทธิ์ในการจัดการผู้สูงอายุรหัส {elder_id}"), 403
     
     # --- *** ส่วนที่แก้ไขทั้งหมด *** ---
@@ -62,6 +75,7 @@ def add_medication():
         return jsonify(msg="รูปแบบวันที่ไม่ถูกต้อง (ต้องการ YYYY-MM-DD)"), 400
 
     # วน Loop สร้างยาใหม่สำหรับ **แต่ละเวลาที่เลือก**
+    new_meds = []
     for time_str in times_list:
         # ตรวจสอบ Format ของเวลา "HH:MM"
         try:
@@ -86,7 +100,20 @@ def add_medication():
             image_url=data.get('image_url')
         )
         db.session.add(new_med)
-    
+        new_meds.append(new_med)
+
+    # สร้างรอบการทานยาของวันนี้และพรุ่งนี้ทันที (Job รายคืนสร้างของพรุ่งนี้ตอน 23:30
+    # ยาที่เพิ่มหลังจากนั้นจึงต้องสร้างเอง ไม่เช่นนั้นจะไม่มีการแจ้งเตือนทั้งวันพรุ่งนี้)
+    db.session.flush()
+    today = date.today()
+    new_occurrences = [
+        materialize_medication_occurrence(new_med, day)
+        for new_med in new_meds
+        for day in (today, today + timedelta(days=1))
+    ]
+    db.session.flush()
+    reminder_engine.notify_occurrences([occ.id for occ in new_occurrences if occ is not None])
+
     db.session.commit()
     
     return jsonify(msg=f"เพิ่มยา '{name}' สำเร็จแล้ว"), 201
@@ -98,33 +125,30 @@ def add_medication():
 @jwt_required()
 def get_my_medications():
     current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
-
-    if not user or user.role != 'elder':
+    # ใช้ role จาก token (ไม่ต้อง query ผู้ใช้)
+    if current_role() != 'elder':
         return jsonify(msg="สิทธิ์ในการดูข้อมูลยาเป็นของผู้สูงอายุแต่ละคนเท่านั้น"), 403
 
-    meds = Medication.query.filter_by(user_id=current_user_id).order_by(Medication.time_to_take).all()
     today = date.today()
+    # กรองเฉพาะยาที่ต้องทานวันนี้ใน SQL แล้วโหลดสถานะ "ทานแล้ว" ของทุกตัวใน query เดียว
+    meds = Medication.query.filter(
+        Medication.user_id == current_user_id, active_on(today)
+    ).order_by(Medication.time_to_take).all()
+    taken = taken_on([med.id for med in meds], today)
+
     med_list = []
     for med in meds:
-        if med.start_date <= today and (med.end_date is None or med.end_date >= today):
-            # ตรวจสอบว่ามียาตัวนี้ถูก log ไว้ใน "วันนี้" หรือไม่
-            log_today = MedicationLog.query.filter(
-                MedicationLog.medication_id == med.id,
-                db.func.date(MedicationLog.taken_at) == today
-            ).first()
-            
-            med_list.append({
-                'id': med.id, 
-                'name': med.name, 
-                # --- *** จุดที่แก้ไข *** ---
-                'time_to_take': med.time_to_take,  # เอา .strftime('%H:%M') ออก
-                # -------------------------
-                'is_taken_today': log_today is not None,
-                'dosage': med.dosage,
-                'meal_instruction': med.meal_instruction,
-                'image_url': med.image_url
-            })
+        med_list.append({
+            'id': med.id, 
+            'name': med.name, 
+            # --- *** จุดที่แก้ไข *** ---
+            'time_to_take': med.time_to_take,  # เอา .strftime('%H:%M') ออก
+            # -------------------------
+            'is_taken_today': med.id in taken,
+            'dosage': med.dosage,
+            'meal_instruction': med.meal_instruction,
+            'image_url': med.image_url
+        })
             
     return jsonify(medications=med_list), 200
 
@@ -135,27 +159,23 @@ def get_my_medications():
 @jwt_required()
 def get_medicines_for_elder_by_manager(elder_id):
     current_user_id = get_jwt_identity()
-    manager = User.query.get(current_user_id)
+    manager = current_identity()
     elder = User.query.filter_by(id=elder_id, role='elder').first()
 
     if not manager or manager.role not in ['caregiver', 'osm']:
         return jsonify(msg="Permission denied."), 403
     
-    if not elder or elder not in manager.managed_elders:
+    if not elder or not can_manage_elder(manager.id, elder.id):
         return jsonify(msg="Elder not found or you do not manage this elder."), 404
 
     meds = Medication.query.filter_by(user_id=elder_id).order_by(Medication.time_to_take).all()
     today = date.today()
+    # --- *** 1. เพิ่ม Logic การตรวจสอบสถานะ *** ---
+    # สถานะ "ทานแล้ววันนี้" ของยาทุกตัวใน query เดียว
+    taken = taken_on([med.id for med in meds], today)
     
     med_list = []
     for med in meds:
-        # --- *** 1. เพิ่ม Logic การตรวจสอบสถานะ *** ---
-        # ตรวจสอบว่ามียาตัวนี้ถูก log ไว้ใน "วันนี้" หรือไม่
-        log_today = MedicationLog.query.filter(
-            MedicationLog.medication_id == med.id,
-            db.func.date(MedicationLog.taken_at) == today
-        ).first()
-
         med_list.append({
             'id': med.id,
             'name': med.name,
@@ -165,7 +185,7 @@ def get_medicines_for_elder_by_manager(elder_id):
             'start_date': med.start_date.isoformat(),
             'end_date': med.end_date.isoformat() if med.end_date else None,
             'image_url': med.image_url,
-            'is_taken_today': log_today is not None # <-- 2. ส่งสถานะไปด้วย
+            'is_taken_today': med.id in taken # <-- 2. ส่งสถานะไปด้วย
         })
 
     return jsonify(medicines=med_list), 200
@@ -177,7 +197,7 @@ def get_medicines_for_elder_by_manager(elder_id):
 @jwt_required()
 def delete_medication(medication_id):
     current_user_id = get_jwt_identity()
-    manager = User.query.get(current_user_id)
+    manager = current_identity()
     
     if not manager or manager.role not in ['caregiver', 'osm']:
         return jsonify(msg="Permission denied."), 403
@@ -190,11 +210,13 @@ def delete_medication(medication_id):
 
     # ตรวจสอบสิทธิ์: manager ต้องเป็นคนดูแลผู้สูงอายุที่เป็นเจ้าของยานี้
     elder = User.query.get(med_to_delete.user_id)
-    if not elder or elder not in manager.managed_elders:
+    if not elder or not can_manage_elder(manager.id, elder.id):
         return jsonify(msg="You are not authorized to delete this medication."), 403
 
     # ทำการลบข้อมูล
+    occurrence_ids = [occ.id for occ in med_to_delete.occurrences]
     db.session.delete(med_to_delete)
+    reminder_engine.notify_occurrences(occurrence_ids)
     db.session.commit()
     
     return jsonify(msg="Medication deleted successfully."), 200
@@ -206,9 +228,8 @@ def delete_medication(medication_id):
 @jwt_required()
 def log_medication_taken():
     current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
-
-    if not user or user.role != 'elder':
+    # ใช้ role จาก token (ไม่ต้อง query ผู้ใช้)
+    if current_role() != 'elder':
         return jsonify(msg="สิทธิ์ในการบันทึกการทานยามีเฉพาะผู้สูงอายุเท่านั้น"), 403
 
     data = request.json
@@ -219,14 +240,23 @@ def log_medication_taken():
 
     log = MedicationLog(medication_id=medication_id, user_id=current_user_id, status='taken')
     db.session.add(log)
+
+    # ปิดรอบการทานยาของวันนี้ เพื่อให้ Scheduler ไม่ต้องแจ้งเตือนยานี้อีก
+    occurrences_today = DoseOccurrence.query.filter(
+        DoseOccurrence.medication_id == med_to_log.id,
+        DoseOccurrence.occurrence_date == date.today(),
+        DoseOccurrence.status == 'pending'
+    ).all()
+    for occurrence in occurrences_today:
+        occurrence.status = 'taken'
+        occurrence.taken_at = datetime.utcnow()
+    reminder_engine.notify_occurrences([occ.id for occ in occurrences_today])
     db.session.commit()
 
-    try:
-        today_str = date.today().isoformat()
-        ref = firebase_db.reference(f'med_status/{log.user_id}/{today_str}/{log.medication_id}')
-        ref.set({'taken': True, 'name': med_to_log.name, 'time': med_to_log.time_to_take.strftime('%H:%M'), 'timestamp': datetime.utcnow().isoformat()})
-    except Exception as e:
-        print(f"เกิดข้อผิดพลาดในการบันทึกข้อมูลไปยัง Firebase RTDB: {e}")
+    # ซิงก์สถานะไปยัง Firebase RTDB แบบ write-behind (ไม่รอ Firebase ใน request)
+    # time_to_take เก็บเป็น String "HH:MM" อยู่แล้ว
+    queue_med_status(current_app._get_current_object(), log.user_id, log.medication_id,
+                     med_to_log.name, med_to_log.time_to_take)
 
     return jsonify(msg=f"การรับประทานยา '{med_to_log.name}' ได้ถูกบันทึกแล้ว"), 200
 
@@ -237,15 +267,21 @@ def log_medication_taken():
 @jwt_required()
 def get_medication_logs_for_elder(elder_id):
     current_user_id = get_jwt_identity()
-    viewer = User.query.get(current_user_id)
+    viewer = current_identity()
     elder = User.query.filter_by(id=elder_id, role='elder').first()
 
-    if not elder or elder not in viewer.managed_elders:
+    if not elder or not can_manage_elder(viewer.id, elder.id):
         return jsonify(msg="ไม่พบข้อมูลผู้สูงอายุ หรือคุณไม่ได้รับอนุญาตให้เข้าถึงข้อมูลนี้"), 404
 
-    logs = db.session.query(MedicationLog, Medication).join(Medication, MedicationLog.medication_id == Medication.id).filter(MedicationLog.user_id == elder_id).order_by(MedicationLog.taken_at.desc()).limit(50).all()
-    log_list = [{'log_id': log.id, 'medication_name': med.name, 'status': log.status, 'logged_at': log.taken_at.strftime('%Y-%m-%d %H:%M:%S')} for log, med in logs]
-    return jsonify(logs=log_list), 200
+    try:
+        limit, before, after = parse_page_args(request.args)
+    except PageArgumentError as e:
+        return jsonify(msg=str(e)), 400
+
+    page = keyset_paginate(medication_logs_query(elder_id), MedicationLog.taken_at, MedicationLog.id, limit, before, after,
+                           key=lambda row: (row[0].taken_at, row[0].id))
+    log_list = [{'log_id': log.id, 'medication_name': med.name, 'status': log.status, 'logged_at': log.taken_at.strftime('%Y-%m-%d %H:%M:%S')} for log, med in page.items]
+    return jsonify(logs=log_list, page=page_meta(page)), 200
 
 @medicines_bp.route('/upload_image', methods=['POST'])
 @jwt_required()
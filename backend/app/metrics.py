@@ -0,0 +1,129 @@
+# backend/app/metrics.py
+import json
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from time import perf_counter
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# ขอบบน (วินาที) ของแต่ละช่องใน histogram ค่าเริ่มต้น
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_lock = threading.Lock()
+_counters = defaultdict(float)
+_gauges = {}
+_histograms = {}
+# tick ที่กำลังทำงานอยู่ใน thread นี้ (ใช้นับ SQL/อีเมล/การแจ้งเตือนของ tick นั้นๆ)
+_tick_local = threading.local()
+
+
+def _key(name, labels):
+    return (name, tuple(sorted(labels.items())))
+
+
+def inc(name, value=1, **labels):
+    """เพิ่มค่า counter (ค่าสะสมตั้งแต่ process เริ่มทำงาน)"""
+    with _lock:
+        _counters[_key(name, labels)] += value
+
+
+def set_gauge(name, value, **labels):
+    """ตั้งค่า gauge (ค่าล่าสุด)"""
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def observe(name, value, buckets=DEFAULT_BUCKETS, **labels):
+    """บันทึกค่าลง histogram (นับจำนวนในแต่ละช่อง พร้อมผลรวม ค่าสูงสุด และจำนวนครั้ง)"""
+    with _lock:
+        hist = _histograms.get(_key(name, labels))
+        if hist is None:
+            hist = {'buckets': {le: 0 for le in buckets}, 'count': 0, 'sum': 0.0, 'max': 0.0}
+            _histograms[_key(name, labels)] = hist
+        for le in hist['buckets']:
+            if value <= le:
+                hist['buckets'][le] += 1
+        hist['count'] += 1
+        hist['sum'] += value
+        hist['max'] = max(hist['max'], value)
+
+
+def snapshot():
+    """คืนค่าสำเนาของ metric ทั้งหมดในรูปแบบที่แปลงเป็น JSON ได้"""
+    def entry(key, value):
+        name, labels = key
+        return {'name': name, 'labels': dict(labels), 'value': value}
+
+    with _lock:
+        return {
+            'counters': [entry(k, v) for k, v in sorted(_counters.items())],
+            'gauges': [entry(k, v) for k, v in sorted(_gauges.items())],
+            'histograms': [
+                entry(k, {
+                    'buckets': {str(le): n for le, n in h['buckets'].items()},
+                    'count': h['count'], 'sum': h['sum'], 'max': h['max']
+                })
+                for k, h in sorted(_histograms.items())
+            ],
+        }
+
+
+def reset():
+    """ล้าง metric ทั้งหมด (ใช้กับคำสั่ง CLI ที่วัดผลเป็นรอบๆ)"""
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _histograms.clear()
+
+
+# -----------------------------------------------------------------------------
+# การวัดผลของ Job แบบ tick ใน Scheduler
+# -----------------------------------------------------------------------------
+@contextmanager
+def tick(job, interval_seconds=60):
+    """
+    ครอบการทำงานของ tick 1 รอบ: นับจำนวน SQL และค่าที่ส่งผ่าน count() ระหว่าง tick
+    เมื่อจบจะบันทึก histogram ของเวลาที่ใช้, counter สะสม, นับ overrun และพิมพ์ log 1 บรรทัดแบบ JSON
+    """
+    counts = defaultdict(int)
+    previous = getattr(_tick_local, 'counts', None)
+    _tick_local.counts = counts
+    started_at = datetime.now()
+    started = perf_counter()
+    status = 'ok'
+    try:
+        yield counts
+    except Exception:
+        status = 'error'
+        raise
+    finally:
+        _tick_local.counts = previous
+        duration = perf_counter() - started
+        observe('scheduler_tick_duration_seconds', duration, job=job)
+        set_gauge('scheduler_tick_last_duration_seconds', duration, job=job)
+        inc('scheduler_ticks_total', job=job, status=status)
+        for name, value in counts.items():
+            inc(f'scheduler_{name}_total', value, job=job)
+        if duration > interval_seconds:
+            inc('scheduler_tick_overruns_total', job=job)
+        print(json.dumps({
+            'event': 'scheduler_tick', 'job': job, 'status': status,
+            'started_at': started_at.isoformat(timespec='seconds'),
+            'duration_ms': round(duration * 1000, 1),
+            'overrun': duration > interval_seconds,
+            **counts
+        }, ensure_ascii=False))
+
+
+def count(name, value=1):
+    """นับค่าให้ tick ที่กำลังทำงานอยู่ใน thread นี้ (ไม่ทำอะไรถ้าไม่ได้อยู่ใน tick)"""
+    counts = getattr(_tick_local, 'counts', None)
+    if counts is not None:
+        counts[name] += value
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _count_sql_statement(conn, cursor, statement, parameters, context, executemany):
+    count('sql_statements')
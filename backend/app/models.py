@@ -5,7 +5,9 @@ from datetime import datetime
 
 manager_elder_link = db.Table('manager_elder_link',
     db.Column('manager_id', db.Integer, db.ForeignKey('user.id'), primary_key=True),
-    db.Column('elder_id', db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    db.Column('elder_id', db.Integer, db.ForeignKey('user.id'), primary_key=True),
+    # primary key ขึ้นต้นด้วย manager_id จึงต้องมี index แยกสำหรับค้นหาผู้ดูแลจาก elder_id
+    db.Index('ix_manager_elder_link_elder_id', 'elder_id')
 )
 
 class User(db.Model):
@@ -47,6 +49,7 @@ class Medication(db.Model):
     image_url = db.Column(db.String(255), nullable=True)
     patient = db.relationship('User', backref=db.backref('medications', cascade="all, delete-orphan"), foreign_keys=[user_id])
     logs = db.relationship('MedicationLog', backref='medication_info', lazy='dynamic', cascade="all, delete-orphan")
+    occurrences = db.relationship('DoseOccurrence', backref='medication', lazy='dynamic', cascade="all, delete-orphan")
 
 class MasterMedicine(db.Model):
     __tablename__ = 'master_medicine'
@@ -62,6 +65,10 @@ class MasterMedicine(db.Model):
 
 class MedicationLog(db.Model):
     __tablename__ = 'medication_log'
+    __table_args__ = (
+        db.Index('ix_medication_log_medication_id_taken_at', 'medication_id', 'taken_at'),
+        db.Index('ix_medication_log_user_id_taken_at_id', 'user_id', 'taken_at', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     medication_id = db.Column(db.Integer, db.ForeignKey('medication.id'), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -71,8 +78,33 @@ class MedicationLog(db.Model):
     # --- *** เพิ่ม relationship นี้เข้าไป *** ---
     # สร้าง relationship ชื่อ "patient" กลับไปยัง User ที่เป็นเจ้าของ log นี้
     patient = db.relationship('User', foreign_keys=[user_id])
+
+class DoseOccurrence(db.Model):
+    """
+    รอบการทานยาที่ถูกสร้างล่วงหน้า (1 แถวต่อ ยา/วันที่/เวลา)
+    Job รายคืนจะเป็นคนเติมข้อมูล และ Scheduler รายนาทีจะเลือกเฉพาะแถวที่อยู่ในช่วงเวลาแจ้งเตือน
+    """
+    __tablename__ = 'dose_occurrence'
+    __table_args__ = (
+        db.UniqueConstraint('medication_id', 'occurrence_date', 'due_time', name='uq_dose_occurrence_slot'),
+        # Scheduler และ ReminderEngine เลือกเฉพาะรอบที่ยังไม่ทาน (status = 'pending') ตามช่วง due_at เสมอ
+        db.Index('ix_dose_occurrence_status_due_at', 'status', 'due_at'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    medication_id = db.Column(db.Integer, db.ForeignKey('medication.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    occurrence_date = db.Column(db.Date, nullable=False)
+    due_time = db.Column(db.String(5), nullable=False)
+    due_at = db.Column(db.DateTime, nullable=False)
+    # 'pending' = ยังไม่ทาน, 'taken' = ทานแล้ว
+    status = db.Column(db.String(20), nullable=False, default='pending')
+    taken_at = db.Column(db.DateTime, nullable=True)
+
 class HealthRecord(db.Model):
     __tablename__ = 'health_record'
+    __table_args__ = (
+        db.Index('ix_health_record_user_id_record_date_id', 'user_id', 'record_date', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     recorded_by_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -86,6 +118,10 @@ class HealthRecord(db.Model):
 
 class Notification(db.Model):
     __tablename__ = 'notification'
+    __table_args__ = (
+        db.Index('ix_notification_user_id_is_read_created_at', 'user_id', 'is_read', 'created_at'),
+        db.Index('ix_notification_user_id_created_at_id', 'user_id', 'created_at', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     message = db.Column(db.String(255), nullable=False)
@@ -102,6 +138,10 @@ class Notification(db.Model):
 
 class Appointment(db.Model):
     __tablename__ = 'appointment'
+    __table_args__ = (
+        db.Index('ix_appointment_user_id_appointment_datetime_id', 'user_id', 'appointment_datetime', 'id'),
+        db.Index('ix_appointment_status_appointment_datetime', 'status', 'appointment_datetime'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     added_by_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -130,4 +170,130 @@ class SystemSetting(db.Model):
     # ใช้ key เป็น Primary Key เพื่อให้มีแค่ค่าเดียว
     key = db.Column(db.String(50), primary_key=True) 
     value = db.Column(db.Text, nullable=False)
-    description = db.Column(db.String(255), nullable=True)
\ No newline at end of file
+    description = db.Column(db.String(255), nullable=True)
+
+class SchedulerLease(db.Model):
+    """
+    สัญญาเช่า (lease) สำหรับเลือก "ผู้นำ" ของ Scheduler ให้มีเพียง process เดียวที่รัน Job
+    process ที่ถือ lease ต้องต่ออายุ (heartbeat) เป็นระยะ ถ้าหมดอายุ process อื่นจะรับช่วงต่อได้
+    """
+    __tablename__ = 'scheduler_lease'
+    name = db.Column(db.String(50), primary_key=True)
+    holder = db.Column(db.String(120), nullable=False)
+    acquired_at = db.Column(db.DateTime, nullable=False)
+    heartbeat_at = db.Column(db.DateTime, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+
+class ReminderDispatch(db.Model):
+    """
+    สมุดบันทึกการส่งแจ้งเตือน ใช้กันส่งซ้ำด้วย unique key (kind, entity_id, occurrence_date, slot)
+    การส่งแต่ละครั้งต้อง "จอง" key ก่อนด้วย insert-if-absent จึงปลอดภัยแม้มี Scheduler มากกว่า 1 ตัว
+    """
+    __tablename__ = 'reminder_dispatch'
+    __table_args__ = (
+        db.UniqueConstraint('kind', 'entity_id', 'occurrence_date', 'slot', name='uq_reminder_dispatch_key'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    # 'medicine' (entity_id = DoseOccurrence.id) หรือ 'appointment' (entity_id = Appointment.id)
+    kind = db.Column(db.String(30), nullable=False)
+    entity_id = db.Column(db.Integer, nullable=False)
+    occurrence_date = db.Column(db.Date, nullable=False)
+    # 'pre', 'due', 'overdue:<ครั้งที่>', 'tomorrow'
+    slot = db.Column(db.String(30), nullable=False)
+    dispatched_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class ReminderChange(db.Model):
+    """
+    บันทึกว่ารอบการทานยา/นัดหมายใดเพิ่งถูกแก้ไข (Endpoint เขียนใน transaction เดียวกับการแก้ไข)
+    ReminderEngine ที่อยู่ใน process ผู้นำของ Scheduler อ่านทุก REMINDER_ENGINE_POLL_SECONDS
+    แล้วโหลดเฉพาะรายการนั้นใหม่ (web worker ส่งการเปลี่ยนแปลงเข้า engine ใน process อื่นโดยตรงไม่ได้)
+    """
+    __tablename__ = 'reminder_change'
+    id = db.Column(db.Integer, primary_key=True)
+    # 'occurrence' (entity_id = DoseOccurrence.id) หรือ 'appointment' (entity_id = Appointment.id)
+    kind = db.Column(db.String(20), nullable=False)
+    entity_id = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, index=True)
+
+
+class RecipientCacheVersion(db.Model):
+    """
+    เลขรุ่นของรายชื่อผู้ดูแลของผู้สูงอายุ (มีแถวเดียว id = 1) เพิ่มขึ้นทุกครั้งที่ invalidate_elders() ถูกเรียก
+    cache ใน app/recipients.py เป็นของแต่ละ process ทุก process (web worker และ Scheduler) จึงอ่านค่านี้ก่อนใช้ cache
+    และใช้เฉพาะรายการที่โหลดมาในรุ่นเดียวกัน
+    """
+    __tablename__ = 'recipient_cache_version'
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+
+class SchedulerWatermark(db.Model):
+    """
+    จุดที่ Job แบบ tick ประมวลผลเสร็จแล้ว (processed_until) แยกตามชื่อ Job
+    tick ถัดไปจะประมวลผลทุกเหตุการณ์ในช่วง [processed_until, ตอนนี้) จึงไม่พลาดแม้ tick จะช้าหรือถูกข้าม
+    """
+    __tablename__ = 'scheduler_watermark'
+    name = db.Column(db.String(50), primary_key=True)
+    processed_until = db.Column(db.DateTime, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class SchedulerMetricsSnapshot(db.Model):
+    """
+    metric ล่าสุดของ process Scheduler แต่ละตัว (app/metrics.py เก็บค่าไว้ในหน่วยความจำของ process)
+    process Scheduler บันทึกทุก SCHEDULER_METRICS_PUBLISH_SECONDS เพื่อให้ web worker อ่านไปแสดงผลได้
+    """
+    __tablename__ = 'scheduler_metrics_snapshot'
+    holder = db.Column(db.String(120), primary_key=True)
+    is_leader = db.Column(db.Boolean, nullable=False, default=False)
+    metrics = db.Column(db.Text, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False, index=True)
+
+
+class EmailOutbox(db.Model):
+    """
+    กล่องอีเมลขาออก: ผู้เรียกเขียนอีเมลลงตารางนี้ใน transaction เดียวกับการเปลี่ยนแปลงข้อมูล
+    แล้ว drainer (app/email_outbox.py) จะดึงไปส่งทีละ batch พร้อม retry แบบ exponential backoff
+    สถานะ: 'pending' -> 'sending' -> 'sent' หรือ 'dead' (ส่งไม่สำเร็จเกินจำนวนครั้งที่กำหนด)
+    """
+    __tablename__ = 'email_outbox'
+    __table_args__ = (
+        db.Index('ix_email_outbox_status_next_attempt_at', 'status', 'next_attempt_at'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    # list ของอีเมลผู้รับ เก็บเป็น JSON
+    recipients = db.Column(db.Text, nullable=False)
+    # อีเมลที่ render แล้ว หรือชื่อแม่แบบ (app/email_templates.py) + params แบบ JSON ที่จะ render ตอนส่ง
+    subject = db.Column(db.String(255), nullable=True)
+    text_body = db.Column(db.Text, nullable=True)
+    html_body = db.Column(db.Text, nullable=True)
+    template_id = db.Column(db.String(64), nullable=True)
+    template_params = db.Column(db.Text, nullable=True)
+    # 0 = เร่งด่วน (ถึงเวลาแล้ว) ถูกดึงไปส่งก่อน, 1 = ปกติ
+    priority = db.Column(db.SmallInteger, nullable=False, default=1)
+    status = db.Column(db.String(20), nullable=False, default='pending')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    # drainer ที่จองแถวนี้อยู่ และเวลาที่การจองหมดอายุ (ถ้า drainer ตายระหว่างส่ง แถวจะถูกจองใหม่ได้)
+    locked_by = db.Column(db.String(64), nullable=True)
+    locked_until = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+
+class DigestItem(db.Model):
+    """
+    รายการแจ้งเตือนที่รอรวมเป็นอีเมลสรุป (digest) ฉบับเดียวต่อผู้รับ
+    ถูกเขียนใน transaction เดียวกับการจอง reminder_dispatch และถูกลบเมื่อส่ง digest แล้ว
+    """
+    __tablename__ = 'digest_item'
+    id = db.Column(db.Integer, primary_key=True)
+    recipient = db.Column(db.String(120), nullable=False, index=True)
+    # แม่แบบอีเมลและ params (JSON): ใช้ส่งอีเมลเดี่ยวเมื่อผู้รับมีแจ้งเตือนเพียงรายการเดียว
+    # หรือ render เป็น 1 บรรทัดในหมวดของแม่แบบเมื่อรวมเป็น digest
+    template_id = db.Column(db.String(64), nullable=False)
+    params = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, index=True)
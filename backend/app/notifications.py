@@ -2,25 +2,47 @@
 from flask import Blueprint, jsonify, request
 from .models import Notification, User
 from .extensions import db
+from .pagination import PageArgumentError, parse_page_args, keyset_paginate, page_meta
 from flask_jwt_extended import jwt_required, get_jwt_identity # type: ignore
 
 notifications_bp = Blueprint('notifications', __name__, url_prefix='/api/notifications')
 
+
+# --- Query ของ Endpoint (ใช้ร่วมกับ `flask admin explain-check`) ---
+def notifications_query(user_id):
+    """แจ้งเตือนทั้งหมดของผู้ใช้ (แบ่งหน้าด้วย keyset บน index (user_id, created_at, id))"""
+    return Notification.query.filter_by(user_id=user_id)
+
+
+def unread_notifications_query(user_id):
+    """แจ้งเตือนที่ยังไม่อ่านของผู้ใช้ (index (user_id, is_read, created_at))"""
+    return Notification.query.filter_by(user_id=user_id, is_read=False)
+
+
 @notifications_bp.route('/my_notifications', methods=['GET'])
 @jwt_required()
 def get_my_notifications():
     current_user_identity = get_jwt_identity()
     user_id = current_user_identity
-    notifications = Notification.query.filter_by(user_id=user_id).order_by(Notification.created_at.desc()).all()
-    result = [{'id': n.id, 'message': n.message, 'is_read': n.is_read, 'link_to': n.link_to, 'created_at': n.created_at.strftime('%Y-%m-%d %H:%M')} for n in notifications]
-    return jsonify(notifications=result), 200
+    try:
+        limit, before, after = parse_page_args(request.args)
+    except PageArgumentError as e:
+        return jsonify(msg=str(e)), 400
+
+    # แบ่งหน้าแบบ cursor ใหม่ไปเก่า (Scheduler สร้างแจ้งเตือนใหม่ตลอด จึงไม่ส่งทั้งประวัติในครั้งเดียว)
+    page = keyset_paginate(
+        notifications_query(user_id),
+        Notification.created_at, Notification.id, limit, before, after
+    )
+    result = [{'id': n.id, 'message': n.message, 'is_read': n.is_read, 'link_to': n.link_to, 'created_at': n.created_at.strftime('%Y-%m-%d %H:%M')} for n in page.items]
+    return jsonify(notifications=result, page=page_meta(page)), 200
 
 @notifications_bp.route('/unread_count', methods=['GET'])
 @jwt_required()
 def get_unread_count():
     current_user_identity = get_jwt_identity()
     user_id = current_user_identity
-    count = Notification.query.filter_by(user_id=user_id, is_read=False).count()
+    count = unread_notifications_query(user_id).count()
     return jsonify(unread_count=count), 200
 
 @notifications_bp.route('/mark_read', methods=['POST'])
@@ -33,7 +55,7 @@ def mark_notifications_as_read():
     notification_ids = data.get('ids', [])
 
     if not notification_ids:
-        notifications_to_update = Notification.query.filter_by(user_id=user_id, is_read=False)
+        notifications_to_update = unread_notifications_query(user_id)
     else:
         notifications_to_update = Notification.query.filter(
             Notification.id.in_(notification_ids),
@@ -0,0 +1,128 @@
+# backend/app/pagination.py
+"""
+แบ่งหน้าแบบ keyset (cursor) สำหรับรายการที่โตขึ้นเรื่อยๆ (แจ้งเตือน, ประวัติการทานยา, ข้อมูลสุขภาพ, นัดหมาย)
+
+เรียงตาม (เวลา, id) และ cursor คือ (เวลา, id) ของรายการที่ขอบของหน้า
+หน้าถัดไปจึงเป็น WHERE (เวลา, id) < cursor ที่ใช้ index (user_id, เวลา, id) ได้ตรงๆ
+ไม่ต้องใช้ OFFSET ที่ฐานข้อมูลต้องอ่านทุกแถวก่อนหน้าทิ้ง และไม่ข้าม/ซ้ำเมื่อมีรายการใหม่เข้ามาระหว่างเลื่อน
+
+พารามิเตอร์ของ request:
+- limit: จำนวนต่อหน้า (ค่าเริ่มต้น PAGE_SIZE_DEFAULT, ไม่เกิน PAGE_SIZE_MAX)
+- before=<cursor>: รายการที่มาก่อน cursor ตามลำดับ (เวลา, id)
+- after=<cursor>: รายการที่มาหลัง cursor ตามลำดับ (เวลา, id)
+ผลลัพธ์มี page = {limit, has_more, next_cursor, prev_cursor}
+- รายการเรียงใหม่ไปเก่า (แจ้งเตือน, log, ข้อมูลสุขภาพ): หน้าถัดไปใช้ before=next_cursor
+  และดึงรายการใหม่กว่าที่เห็นล่าสุดด้วย after=prev_cursor
+- รายการเรียงเก่าไปใหม่ (นัดหมายที่จะมาถึง): หน้าถัดไปใช้ after=next_cursor
+"""
+import base64
+from collections import namedtuple
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import tuple_
+
+
+class PageArgumentError(ValueError):
+    """พารามิเตอร์ limit/before/after ไม่ถูกต้อง (endpoint ตอบ 400)"""
+
+
+Page = namedtuple('Page', ['items', 'limit', 'has_more', 'next_cursor', 'prev_cursor'])
+
+
+def encode_cursor(timestamp, row_id):
+    raw = f"{timestamp.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """cursor -> (datetime, id)"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        timestamp, row_id = raw.split('|')
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise PageArgumentError(f"Invalid cursor: {cursor}") from e
+
+
+def parse_page_args(args):
+    """อ่าน limit/before/after จาก request.args คืนค่า (limit, before, after)"""
+    default_limit = current_app.config.get('PAGE_SIZE_DEFAULT', 50)
+    max_limit = current_app.config.get('PAGE_SIZE_MAX', 200)
+    try:
+        limit = int(args.get('limit', default_limit))
+    except ValueError:
+        raise PageArgumentError("limit must be an integer")
+    if limit < 1:
+        raise PageArgumentError("limit must be at least 1")
+
+    before, after = args.get('before'), args.get('after')
+    if before and after:
+        raise PageArgumentError("Use either before or after, not both")
+    return (
+        min(limit, max_limit),
+        decode_cursor(before) if before else None,
+        decode_cursor(after) if after else None,
+    )
+
+
+def _towards_list_start(before, after, descending):
+    """cursor ชี้ย้อนขึ้นไปทางต้นรายการหรือไม่ (after ของรายการใหม่ไปเก่า / before ของรายการเก่าไปใหม่)"""
+    return (after is not None) if descending else (before is not None)
+
+
+def keyset_query(query, time_column, id_column, limit, before=None, after=None, descending=True):
+    """
+    query ที่อ่าน 1 หน้า (limit + 1 แถว เพื่อดูว่ายังมีหน้าถัดไปหรือไม่) จาก query ตามลำดับ (time_column, id_column)
+    (ใช้โดย keyset_paginate และ `flask admin explain-check`)
+    """
+    sort_key = tuple_(time_column, id_column)
+
+    if before is not None:
+        query = query.filter(sort_key < tuple_(*before))
+    if after is not None:
+        query = query.filter(sort_key > tuple_(*after))
+
+    # อ่านจากฝั่งของ cursor เสมอ (ให้ index ถูกอ่านต่อเนื่องจากจุดนั้น) แล้วค่อยกลับลำดับเป็นลำดับของรายการ
+    ascending_scan = descending == _towards_list_start(before, after, descending)
+    if ascending_scan:
+        query = query.order_by(time_column.asc(), id_column.asc())
+    else:
+        query = query.order_by(time_column.desc(), id_column.desc())
+    return query.limit(limit + 1)
+
+
+def keyset_paginate(query, time_column, id_column, limit, before=None, after=None, descending=True, key=None):
+    """
+    ดึง 1 หน้าจาก query ตามลำดับ (time_column, id_column) (descending=True คือใหม่ไปเก่า)
+    key(item) -> (เวลา, id) ของแต่ละรายการ (ค่าเริ่มต้นอ่านจาก attribute ชื่อเดียวกับคอลัมน์)
+    """
+    if key is None:
+        key = lambda item: (getattr(item, time_column.key), getattr(item, id_column.key))
+    towards_list_start = _towards_list_start(before, after, descending)
+
+    rows = keyset_query(query, time_column, id_column, limit, before, after, descending).all()
+    more = len(rows) > limit
+    items = rows[:limit]
+    if towards_list_start:
+        items.reverse()
+
+    # has_more: ยังมีรายการต่อจากหน้านี้ตามลำดับของรายการ (ถ้าย้อนขึ้นไปหา cursor ตัว cursor เองยังอยู่ถัดไปเสมอ)
+    has_more = True if towards_list_start else more
+    next_cursor = encode_cursor(*key(items[-1])) if items and has_more else None
+    if items:
+        prev_cursor = encode_cursor(*key(items[0]))
+    else:
+        cursor = after if descending else before
+        prev_cursor = encode_cursor(*cursor) if cursor else None
+    return Page(items, limit, has_more, next_cursor, prev_cursor)
+
+
+def page_meta(page):
+    """ข้อมูลการแบ่งหน้าสำหรับใส่ใน response (เพิ่มจาก field เดิม)"""
+    return {
+        'limit': page.limit,
+        'has_more': page.has_more,
+        'next_cursor': page.next_cursor,
+        'prev_cursor': page.prev_cursor,
+    }
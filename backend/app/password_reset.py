@@ -0,0 +1,106 @@
+# backend/app/password_reset.py
+"""
+ประมวลผลคำขอรีเซ็ตรหัสผ่านนอก request
+
+/api/auth/request_reset_password แค่ใส่อีเมลเข้าคิวในหน่วยความจำแล้วตอบกลับทันที
+งานใน request จึงเท่ากันทุกครั้งไม่ว่าอีเมลจะมีในระบบหรือไม่ (เดาอีเมลจากเวลาตอบกลับไม่ได้)
+โดยไม่ต้อง sleep เติมเวลา ซึ่งจะบล็อก thread ของ `flask run` ที่ไม่ได้ monkey-patch ด้วย gevent
+- worker 1 ตัวต่อ process ค้นหาผู้ใช้ เขียนอีเมลลง outbox แล้ว commit (drainer ส่งต่อตามปกติ)
+- เวลาที่ใช้และผลลัพธ์ (queued / unknown_email / failed / dropped) ถูกบันทึกลง metric
+- คิวมีขนาดจำกัด PASSWORD_RESET_QUEUE_SIZE คำขอที่เกินถูกทิ้ง (ผู้ใช้ขอใหม่ได้)
+  คำขอที่ค้างตอนปิด process จะถูกประมวลผลก่อนปิด (ไม่เกิน timeout)
+"""
+import atexit
+import queue
+import threading
+from time import perf_counter
+
+from .models import User
+from .extensions import db
+from .email_service import send_template_email
+from . import metrics
+
+_queue_lock = threading.Lock()
+
+
+class PasswordResetQueue:
+    """คิวคำขอรีเซ็ตรหัสผ่านพร้อม worker 1 ตัว (ดูคำอธิบายด้านบน)"""
+
+    def __init__(self, app, queue_size=1000):
+        self.app = app
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, name='password-reset', daemon=True)
+        self._worker.start()
+
+    def put(self, email):
+        """ใส่คำขอเข้าคิว (ไม่รอ) คืนค่า False ถ้าคิวเต็มและคำขอนี้ถูกทิ้ง"""
+        try:
+            self._queue.put_nowait(email)
+        except queue.Full:
+            metrics.inc('password_reset_requests_total', result='dropped')
+            return False
+        metrics.set_gauge('password_reset_queue_depth', self._queue.qsize())
+        return True
+
+    def shutdown(self, timeout=10):
+        """หยุด worker หลังประมวลผลคำขอที่ค้างในคิว (ไม่เกิน timeout วินาที)"""
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            pass
+        self._worker.join(timeout=timeout)
+        if self._queue.qsize():
+            print(f"PasswordResetQueue: ปิดตัวขณะยังมีคำขอค้าง {self._queue.qsize()} รายการ")
+
+    def _run(self):
+        while True:
+            email = self._queue.get()
+            if email is None:
+                return
+            started = perf_counter()
+            try:
+                metrics.inc('password_reset_requests_total', result=self._process(email))
+            except Exception as e:
+                # worker ต้องไม่ตาย ไม่ว่าจะเกิดอะไรขึ้น
+                metrics.inc('password_reset_requests_total', result='failed')
+                print(f"PasswordResetQueue: ประมวลผลคำขอรีเซ็ตรหัสผ่านไม่สำเร็จ: {e}")
+            finally:
+                metrics.observe('password_reset_request_seconds', perf_counter() - started)
+                metrics.set_gauge('password_reset_queue_depth', self._queue.qsize())
+
+    def _process(self, email):
+        from .auth import generate_reset_token
+
+        with self.app.app_context():
+            try:
+                user = User.query.filter_by(email=email).first()
+                if not user or not user.email:
+                    return 'unknown_email'
+                token = generate_reset_token(user.id)
+                reset_url = self.app.config['PASSWORD_RESET_URL'].format(token=token)
+                send_template_email('password_reset', [user.email], {'reset_url': reset_url})
+                db.session.commit()
+                return 'queued'
+            except Exception:
+                db.session.rollback()
+                raise
+            finally:
+                db.session.remove()
+
+
+def get_password_reset_queue(app):
+    """คืนค่า PasswordResetQueue ของแอป (สร้างครั้งแรกเมื่อใช้งาน หลัง fork ของ gunicorn แล้ว)"""
+    reset_queue = app.extensions.get('password_reset_queue')
+    if reset_queue is not None:
+        return reset_queue
+    with _queue_lock:
+        reset_queue = app.extensions.get('password_reset_queue')
+        if reset_queue is None:
+            reset_queue = PasswordResetQueue(app, queue_size=app.config.get('PASSWORD_RESET_QUEUE_SIZE', 1000))
+            atexit.register(reset_queue.shutdown)
+            app.extensions['password_reset_queue'] = reset_queue
+    return reset_queue
@@ -0,0 +1,131 @@
+# backend/app/query_plans.py
+"""
+ตรวจแผนการทำงาน (EXPLAIN) ของ query ที่ถูกเรียกบ่อย ว่าใช้ composite index ที่ออกแบบไว้จริง
+(ใช้โดยคำสั่ง `flask admin explain-check`)
+
+แต่ละรายการสร้าง statement ด้วยฟังก์ชันเดียวกับที่ Endpoint/Scheduler ใช้จริง (ไม่ได้คัดลอกรูปแบบ query มาเขียนใหม่)
+ถ้ามีคนเผลอครอบคอลัมน์ด้วยฟังก์ชัน (func.date, extract, strftime) หรือ index หายไป การตรวจจะไม่ผ่าน
+"""
+from datetime import date, datetime, time, timedelta
+
+from flask import current_app
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
+
+from .extensions import db
+from .models import manager_elder_link, MedicationLog, Notification, Appointment, HealthRecord, DoseOccurrence
+from .medication_status import taken_on_query
+from .pagination import keyset_query
+from .elder_access import access_query
+from .recipients import manager_contacts_query
+from .notifications import notifications_query, unread_notifications_query
+from .appointments import upcoming_appointments_query
+from .health import health_records_query
+from .medicines import medication_logs_query
+from .stats import weekly_log_counts_query, monthly_health_records_query
+from .scheduler import (
+    chunk_query, medicine_tick_windows, medicine_tick_query,
+    appointment_tick_windows, appointment_tick_query, tomorrow_appointments_query
+)
+
+
+class explain(Executable, ClauseElement):
+    """ห่อ statement ด้วย EXPLAIN ของฐานข้อมูลที่ใช้อยู่ (bind parameter ยังทำงานตามปกติ)"""
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(explain)
+def _compile_explain(element, compiler, **kw):
+    prefix = 'EXPLAIN QUERY PLAN ' if compiler.dialect.name == 'sqlite' else 'EXPLAIN '
+    return prefix + compiler.process(element.statement, **kw)
+
+
+def primary_key_index(table):
+    """ชื่อ index ของ primary key ที่ฐานข้อมูลตั้งให้เอง (SQLite: sqlite_autoindex_<table>_1, PostgreSQL: <table>_pkey)"""
+    if db.session.get_bind().dialect.name == 'sqlite':
+        return f'sqlite_autoindex_{table.name}_1'
+    return f'{table.name}_pkey'
+
+
+def hot_queries(today=None):
+    """รายการ (ชื่อ, statement, ชื่อ index ที่ต้องถูกใช้)"""
+    today = today or date.today()
+    now = datetime.combine(today, time(9, 0))
+    limit = current_app.config.get('PAGE_SIZE_DEFAULT', 50)
+    # tick ของ Scheduler ที่ตามเก็บย้อนหลัง 5 นาที (มีหลายช่วงเวลาใน OR)
+    window_start, window_end = now - timedelta(minutes=5), now
+    return [
+        ('medications taken today (medication_status.taken_on)',
+         taken_on_query(today, [1, 2, 3]),
+         'ix_medication_log_medication_id_taken_at'),
+        ('elder medication logs, last 7 days (stats)',
+         weekly_log_counts_query(1, today - timedelta(days=6)),
+         'ix_medication_log_user_id_taken_at_id'),
+        ('unread notifications (notifications)',
+         unread_notifications_query(1),
+         'ix_notification_user_id_is_read_created_at'),
+        ('notifications page (notifications, keyset pagination)',
+         keyset_query(notifications_query(1), Notification.created_at, Notification.id,
+                      limit, before=(now, 1)),
+         'ix_notification_user_id_created_at_id'),
+        ('medication logs page (medicines, keyset pagination)',
+         keyset_query(medication_logs_query(1), MedicationLog.taken_at, MedicationLog.id,
+                      limit, before=(now, 1)),
+         'ix_medication_log_user_id_taken_at_id'),
+        ('upcoming appointments page (appointments, keyset pagination)',
+         keyset_query(upcoming_appointments_query(1, now), Appointment.appointment_datetime, Appointment.id,
+                      limit, after=(now, 1), descending=False),
+         'ix_appointment_user_id_appointment_datetime_id'),
+        ('health records page of a month (health, keyset pagination)',
+         keyset_query(health_records_query(1, today.year, today.month), HealthRecord.record_date, HealthRecord.id,
+                      limit, before=(now, 1)),
+         'ix_health_record_user_id_record_date_id'),
+        ('health records of a month (stats)',
+         monthly_health_records_query([1, 2, 3], today.year, today.month),
+         'ix_health_record_user_id_record_date_id'),
+        ('can a manager access an elder (elder_access.can_manage_elder)',
+         access_query(1, 1),
+         primary_key_index(manager_elder_link)),
+        ('managers of elders (recipients)',
+         manager_contacts_query([1, 2, 3]),
+         'ix_manager_elder_link_elder_id'),
+        ('medicine events of a tick (scheduler)',
+         chunk_query(medicine_tick_query(medicine_tick_windows(window_start, window_end, 15, 15)),
+                     DoseOccurrence.id, 0),
+         'ix_dose_occurrence_status_due_at'),
+        ('appointment events of a tick (scheduler)',
+         chunk_query(appointment_tick_query(appointment_tick_windows(window_start, window_end)),
+                     Appointment.id, 0),
+         'ix_appointment_status_appointment_datetime'),
+        ('pending appointments tomorrow (scheduler)',
+         tomorrow_appointments_query(today + timedelta(days=1)),
+         'ix_appointment_status_appointment_datetime'),
+    ]
+
+
+def explain_plan(statement):
+    """คืนค่าแผนการทำงานของ statement เป็นข้อความ"""
+    connection = db.session.connection()
+    if connection.dialect.name == 'postgresql':
+        # ตารางที่มีข้อมูลน้อย planner จะเลือก seq scan เสมอ จึงปิดไว้เพื่อดูว่า index "ใช้ได้" หรือไม่
+        connection.exec_driver_sql('SET LOCAL enable_seqscan = off')
+    if hasattr(statement, 'statement'):
+        # Query ของ ORM (db.session.query / Model.query) -> SELECT statement
+        statement = statement.statement
+    rows = connection.execute(explain(statement)).all()
+    return '\n'.join(' '.join(str(value) for value in row) for row in rows)
+
+
+def check_hot_queries(today=None):
+    """ตรวจ query ทั้งหมด คืนค่า list ของ (ชื่อ, index ที่ต้องใช้, ผ่านหรือไม่, แผนการทำงาน)"""
+    results = []
+    try:
+        for name, statement, index_name in hot_queries(today):
+            plan = explain_plan(statement)
+            results.append((name, index_name, index_name in plan, plan))
+    finally:
+        db.session.rollback()
+    return results
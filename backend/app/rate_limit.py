@@ -0,0 +1,120 @@
+# backend/app/rate_limit.py
+"""
+จำกัดอัตราการส่งอีเมลด้วย token bucket ก่อนส่งถึง SendGrid (ใช้โดย drainer ใน app/email_outbox.py)
+
+- bucket ของผู้ให้บริการ 1 ใบ และ bucket ของโดเมนผู้รับเฉพาะโดเมนที่ตั้งค่าไว้ใน EMAIL_DOMAIN_RATE_LIMITS
+  (เช่น gmail.com ถ้าปลายทางจำกัดอัตรา) โดเมนอื่นถูกจำกัดด้วย bucket ของผู้ให้บริการเท่านั้น
+- 1 token = ผู้รับ 1 คน
+- อีเมลไม่เร่งด่วน (แจ้งเตือนล่วงหน้า, นัดวันพรุ่งนี้ ฯลฯ) ใช้ token ได้เฉพาะส่วนที่เกินสำรอง (reserve)
+  token ส่วนที่สำรองไว้จึงเหลือให้อีเมลเร่งด่วน (ถึงเวลาทานยา/ยาขาด) เสมอ
+  และอีเมลไม่เร่งด่วนที่ส่งไม่ทันจะถูกเลื่อนไปกระจายในช่วงเวลาถัดไปตามอัตราที่ bucket เติม
+ค่าที่จำกัดเป็นของแต่ละ process (drainer หลายตัว = อัตรารวมคูณจำนวน drainer)
+"""
+import threading
+from time import monotonic
+
+from . import metrics
+
+
+class TokenBucket:
+    """token bucket มาตรฐาน: เติม rate token ต่อวินาที เก็บได้ไม่เกิน capacity"""
+
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated = monotonic()
+
+    def refill(self, now=None):
+        now = monotonic() if now is None else now
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def available(self, reserve=0.0):
+        return self.tokens - reserve
+
+    def wait_time(self, amount, reserve=0.0):
+        """จำนวนวินาทีจนกว่าจะมี token พอ (0 = ใช้ได้ทันที)"""
+        missing = amount + reserve - self.tokens
+        return max(missing, 0.0) / self.rate
+
+    def take(self, amount):
+        self.tokens -= amount
+
+
+class SendRateLimiter:
+    """
+    รวม bucket ของผู้ให้บริการและของโดเมนผู้รับ
+    acquire() จะหัก token จากทุก bucket ที่เกี่ยวข้องพร้อมกัน หรือไม่หักเลยถ้ามีใบใดไม่พอ
+    """
+
+    def __init__(self, rate, burst, domain_limits=None, urgent_reserve=0.2):
+        self.provider = TokenBucket(rate, burst)
+        # bucket เฉพาะโดเมนที่ตั้งค่าไว้ {'gmail.com': (rate, burst)}
+        self._domains = {
+            domain.lower(): TokenBucket(rate, burst)
+            for domain, (rate, burst) in (domain_limits or {}).items() if rate
+        }
+        # สัดส่วนของ capacity ที่สำรองไว้ให้อีเมลเร่งด่วน
+        self.urgent_reserve = urgent_reserve
+        self._lock = threading.Lock()
+
+    def available(self, urgent=False):
+        """จำนวนผู้รับที่ส่งได้ทันทีตาม bucket ของผู้ให้บริการ (ใช้กำหนดขนาด batch ที่จะดึงจาก outbox)"""
+        with self._lock:
+            self.provider.refill()
+            reserve = 0.0 if urgent else self.provider.capacity * self.urgent_reserve
+            return max(int(self.provider.available(reserve)), 0)
+
+    def acquire(self, recipients, urgent=False):
+        """
+        ขอ token สำหรับส่งอีเมล 1 ฉบับถึง recipients
+        คืนค่า (0, None) ถ้าได้ token แล้ว หรือ (จำนวนวินาทีที่ควรรอก่อนลองใหม่, 'provider' หรือ 'domain')
+        ถ้าถูกจำกัดอัตรา ('provider' ถ้า bucket ของผู้ให้บริการไม่พอ ไม่ว่าโดเมนจะพอหรือไม่)
+        """
+        per_domain = {}
+        for email in recipients:
+            domain = email.rsplit('@', 1)[-1].lower()
+            per_domain[domain] = per_domain.get(domain, 0) + 1
+
+        with self._lock:
+            now = monotonic()
+            checks = [('provider', self.provider, len(recipients))]
+            for domain, count in per_domain.items():
+                bucket = self._domains.get(domain)
+                if bucket is not None:
+                    checks.append(('domain', bucket, count))
+
+            wait = 0.0
+            limited_by = None
+            for scope, bucket, amount in checks:
+                bucket.refill(now)
+                reserve = 0.0 if urgent else bucket.capacity * self.urgent_reserve
+                # อีเมลที่มีผู้รับมากกว่า capacity จะไม่มีวันได้ token ครบ ให้รอจน bucket เต็มแล้วส่ง
+                amount = min(amount, bucket.capacity - reserve)
+                bucket_wait = bucket.wait_time(amount, reserve)
+                if bucket_wait > 0:
+                    metrics.inc('email_throttled_total', scope=scope)
+                    wait = max(wait, bucket_wait)
+                    limited_by = limited_by or scope
+            if wait > 0:
+                return wait, limited_by
+
+            for _, bucket, amount in checks:
+                bucket.take(amount)
+            metrics.set_gauge('email_rate_tokens', self.provider.tokens)
+            return 0, None
+
+
+def get_rate_limiter(app):
+    """คืนค่า SendRateLimiter ของแอป (None ถ้าปิดการจำกัดอัตราด้วย EMAIL_RATE_LIMIT_PER_SECOND = 0)"""
+    if 'email_rate_limiter' not in app.extensions:
+        config = app.config
+        rate = config.get('EMAIL_RATE_LIMIT_PER_SECOND', 0)
+        app.extensions['email_rate_limiter'] = SendRateLimiter(
+            rate,
+            config.get('EMAIL_RATE_LIMIT_BURST', rate),
+            domain_limits=config.get('EMAIL_DOMAIN_RATE_LIMITS'),
+            urgent_reserve=config.get('EMAIL_RATE_URGENT_RESERVE', 0.2)
+        ) if rate else None
+    return app.extensions['email_rate_limiter']
@@ -0,0 +1,134 @@
+# backend/app/recipients.py
+"""
+ค้นหาผู้ดูแล/อสม. ของผู้สูงอายุ (ผู้รับการแจ้งเตือน) พร้อม cache แบบ LRU ที่มีขนาดจำกัด
+
+ใช้แทน `[m.email for m in elder.managers if m.email]` ซึ่ง query ความสัมพันธ์แบบ dynamic ใหม่ทุกครั้ง
+load_manager_contacts() รับ elder_id ได้ทีละหลายคน และ query เฉพาะคนที่ไม่อยู่ใน cache ในครั้งเดียว
+Endpoint ที่เปลี่ยนการเชื่อมโยงต้องเรียก invalidate_elders() หลัง commit
+
+cache เป็นของแต่ละ process แต่ผู้ที่เปลี่ยนการเชื่อมโยงคือ web worker ส่วนผู้ส่งแจ้งเตือนส่วนใหญ่คือ Scheduler
+invalidate_elders() จึงเพิ่มเลขรุ่นในตาราง recipient_cache_version ด้วย และทุกรายการใน cache ถูกเก็บพร้อมเลขรุ่นที่โหลดมา
+load_manager_contacts() อ่านเลขรุ่นปัจจุบัน (query ตาม primary key 1 ครั้ง) และใช้เฉพาะรายการที่ตรงรุ่น
+ผู้ดูแลที่ถูกยกเลิกการเชื่อมโยงจึงไม่ได้รับแจ้งเตือนจาก process ใดอีกหลังจากนั้น
+(RECIPIENT_CACHE_TTL_SECONDS เป็นเพียงตัวสำรองกรณีเพิ่มเลขรุ่นไม่สำเร็จ)
+"""
+import threading
+from cachetools import TTLCache
+from flask import current_app
+
+from sqlalchemy import update
+
+from .models import manager_elder_link, User, RecipientCacheVersion
+from .extensions import db
+from . import metrics
+
+_lock = threading.Lock()
+
+
+def _cache():
+    """cache ของแอปปัจจุบัน (สร้างครั้งแรกตามค่าใน config)"""
+    app = current_app._get_current_object()
+    cache = app.extensions.get('recipient_cache')
+    if cache is None:
+        with _lock:
+            cache = app.extensions.get('recipient_cache')
+            if cache is None:
+                cache = app.extensions['recipient_cache'] = TTLCache(
+                    maxsize=app.config.get('RECIPIENT_CACHE_SIZE', 10000),
+                    ttl=app.config.get('RECIPIENT_CACHE_TTL_SECONDS', 300)
+                )
+    return cache
+
+
+def _current_version():
+    return db.session.query(RecipientCacheVersion.version).filter(RecipientCacheVersion.id == 1).scalar() or 0
+
+
+def _bump_version():
+    bumped = db.session.execute(
+        update(RecipientCacheVersion).where(RecipientCacheVersion.id == 1).values(
+            version=RecipientCacheVersion.version + 1
+        )
+    ).rowcount
+    if not bumped:
+        db.session.add(RecipientCacheVersion(id=1, version=1))
+    db.session.commit()
+
+
+def manager_contacts_query(elder_ids):
+    """query (elder_id, manager_id, manager_email) ของผู้ดูแลทุกคนของผู้สูงอายุใน elder_ids"""
+    return db.session.query(
+        manager_elder_link.c.elder_id, User.id, User.email
+    ).join(
+        User, User.id == manager_elder_link.c.manager_id
+    ).filter(
+        manager_elder_link.c.elder_id.in_(elder_ids)
+    )
+
+
+def load_manager_contacts(elder_ids):
+    """
+    ดึงรายชื่อผู้ดูแลของผู้สูงอายุหลายคนในครั้งเดียว
+    คืนค่าเป็น dict: elder_id -> [(manager_id, manager_email), ...] (ห้ามแก้ไข list ที่ได้ เพราะใช้ร่วมกับ cache)
+    """
+    cache = _cache()
+    # อ่านเลขรุ่นก่อน query รายชื่อ: รายการที่โหลดหลังจากนี้จึงใหม่อย่างน้อยเท่ากับรุ่นที่บันทึกไว้คู่กัน
+    version = _current_version()
+    contacts = {}
+    missing = []
+    with _lock:
+        for elder_id in set(elder_ids):
+            cached = cache.get(elder_id)
+            if cached is None or cached[0] != version:
+                missing.append(elder_id)
+            else:
+                contacts[elder_id] = cached[1]
+    metrics.inc('recipient_cache_hits_total', len(contacts))
+    if not missing:
+        return contacts
+
+    metrics.inc('recipient_cache_misses_total', len(missing))
+    loaded = {elder_id: [] for elder_id in missing}
+    rows = manager_contacts_query(missing).all()
+    for elder_id, manager_id, manager_email in rows:
+        loaded[elder_id].append((manager_id, manager_email))
+
+    with _lock:
+        for elder_id, elder_contacts in loaded.items():
+            cache[elder_id] = (version, elder_contacts)
+    contacts.update(loaded)
+    return contacts
+
+
+def get_manager_ids(elder_id):
+    """id ของผู้ดูแลทุกคนของผู้สูงอายุ 1 คน"""
+    return [manager_id for manager_id, _ in load_manager_contacts([elder_id])[elder_id]]
+
+
+def get_manager_emails(elder_id, exclude_id=None):
+    """อีเมลของผู้ดูแลทุกคน (ที่มีอีเมล) ของผู้สูงอายุ 1 คน"""
+    return [
+        email for manager_id, email in load_manager_contacts([elder_id])[elder_id]
+        if email and manager_id != exclude_id
+    ]
+
+
+def invalidate_elders(*elder_ids):
+    """
+    ล้าง cache ของผู้สูงอายุที่การเชื่อมโยงหรือข้อมูลผู้ดูแลเปลี่ยน (เรียกหลัง commit)
+    process นี้ล้างทันที ส่วน process อื่นเห็นเลขรุ่นใหม่ (commit ในฟังก์ชันนี้) และโหลดรายชื่อใหม่ในการใช้ครั้งถัดไป
+    """
+    cache = _cache()
+    with _lock:
+        for elder_id in elder_ids:
+            cache.pop(elder_id, None)
+    _bump_version()
+
+
+def invalidate_user(user):
+    """ล้าง cache ที่เกี่ยวกับผู้ใช้ 1 คน: ตัวเขาเอง (ถ้าเป็นผู้สูงอายุ) และผู้สูงอายุทุกคนที่เขาดูแล"""
+    elder_ids = [user.id]
+    elder_ids += [elder_id for (elder_id,) in db.session.query(manager_elder_link.c.elder_id).filter(
+        manager_elder_link.c.manager_id == user.id
+    )]
+    invalidate_elders(*elder_ids)
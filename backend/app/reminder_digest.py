@@ -0,0 +1,123 @@
+# backend/app/reminder_digest.py
+import json
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import timedelta
+from sqlalchemy import insert, delete, select, func
+
+from .models import DigestItem, SystemSetting
+from .extensions import db
+from .email_templates import get_template
+
+# จำนวน id ต่อคำสั่ง DELETE (SQLite จำกัดจำนวน parameter ต่อ statement)
+DELETE_BATCH_SIZE = 500
+
+# digest ที่กำลังเก็บรายการอยู่ใน thread นี้ (ระหว่าง tick ของ Scheduler)
+_local = threading.local()
+
+
+class DigestCollector:
+    """เก็บแจ้งเตือนของ tick แยกตามผู้รับ แล้วเขียนลง digest_item ทีละ chunk"""
+
+    def __init__(self, now):
+        self.now = now
+        self.rows = []
+
+    def add(self, recipients, template_id, params):
+        params = json.dumps(params, ensure_ascii=False, sort_keys=True)
+        for recipient in recipients:
+            self.rows.append({
+                'recipient': recipient, 'template_id': template_id, 'params': params, 'created_at': self.now
+            })
+
+    def write(self):
+        """เขียนรายการที่เก็บไว้ลง session ปัจจุบัน (ผู้เรียกเป็นคน commit พร้อมกับงานของ chunk)"""
+        if self.rows:
+            db.session.execute(insert(DigestItem), self.rows)
+            self.rows = []
+
+
+@contextmanager
+def collect_digest(now):
+    """ระหว่างอยู่ใน block นี้ อีเมลแจ้งเตือนที่ส่งผ่าน add_to_digest() จะถูกเก็บเข้า digest แทนการส่งทันที"""
+    collector = DigestCollector(now)
+    previous = getattr(_local, 'collector', None)
+    _local.collector = collector
+    try:
+        yield collector
+    finally:
+        _local.collector = previous
+
+
+def add_to_digest(recipients, template_id, params):
+    """
+    เก็บแจ้งเตือนเข้า digest ที่กำลังทำงานอยู่ (เฉพาะแม่แบบที่มี digest_line)
+    คืนค่า False ถ้าไม่ได้อยู่ใน collect_digest หรือแม่แบบรวม digest ไม่ได้ ให้ผู้เรียกส่งเอง
+    """
+    collector = getattr(_local, 'collector', None)
+    if collector is None or get_template(template_id).digest_line is None:
+        return False
+    collector.add(recipients, template_id, params)
+    return True
+
+
+def load_digest_window():
+    """อ่านช่วงเวลารวม digest (นาที) จาก SystemSetting 'DIGEST_WINDOW_MINUTES' (0 = รวมเฉพาะภายใน tick เดียวกัน)"""
+    value = db.session.query(SystemSetting.value).filter(SystemSetting.key == 'DIGEST_WINDOW_MINUTES').scalar()
+    try:
+        return max(int(value), 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def render_digest(items):
+    """params ของแม่แบบ 'reminder_digest' จากรายการ (template_id, params JSON) โดยจัดกลุ่มตามหมวดของแม่แบบ"""
+    sections = defaultdict(list)
+    for template_id, params in items:
+        template = get_template(template_id)
+        sections[template.digest_group].append(template.render_line(json.loads(params)))
+    return {'count': len(items), 'sections': [[group, lines] for group, lines in sections.items()]}
+
+
+def flush_digests(now, window_minutes, send):
+    """
+    ส่ง digest ของผู้รับที่มีรายการค้างนานครบ window_minutes แล้ว (window 0 = ส่งทั้งหมดทันที)
+    ผู้รับที่มีรายการเพียงรายการเดียวจะได้อีเมลเดี่ยวตามแม่แบบเดิม และผู้รับที่มีรายการเหมือนกันทุกประการ
+    (เช่น ผู้ดูแล 2 คนของผู้สูงอายุคนเดียวกัน) จะถูกรวมเป็นอีเมลฉบับเดียวหลายผู้รับ
+    send(template_id, recipients, params) คือฟังก์ชันที่ใช้ส่งจริง คืนค่าจำนวนรายการที่ส่ง
+    (ผู้เรียกเป็นคน commit การลบรายการพร้อมกับอีเมลที่ส่ง)
+    """
+    cutoff = now - timedelta(minutes=window_minutes)
+    due_recipients = select(DigestItem.recipient).group_by(DigestItem.recipient).having(
+        func.min(DigestItem.created_at) <= cutoff
+    )
+    items = DigestItem.query.filter(DigestItem.recipient.in_(due_recipients)).order_by(DigestItem.id).all()
+    if not items:
+        return 0
+
+    # จองรายการด้วยการลบ (DELETE ... RETURNING) ก่อนส่ง ถ้า tick อื่นลบไปก่อนแล้วจะไม่ได้ id นั้นคืนมา
+    claimed_ids = set()
+    ids = [item.id for item in items]
+    for i in range(0, len(ids), DELETE_BATCH_SIZE):
+        claimed_ids.update(db.session.execute(
+            delete(DigestItem).where(DigestItem.id.in_(ids[i:i + DELETE_BATCH_SIZE])).returning(DigestItem.id)
+            .execution_options(synchronize_session=False)
+        ).scalars())
+    items = [item for item in items if item.id in claimed_ids]
+
+    by_recipient = defaultdict(list)
+    for item in items:
+        by_recipient[item.recipient].append((item.template_id, item.params))
+
+    messages = defaultdict(list)
+    for recipient, recipient_items in by_recipient.items():
+        messages[tuple(recipient_items)].append(recipient)
+
+    for recipient_items, recipients in messages.items():
+        if len(recipient_items) == 1:
+            template_id, params = recipient_items[0]
+            send(template_id, recipients, json.loads(params))
+        else:
+            send('reminder_digest', recipients, render_digest(recipient_items))
+    return len(items)
@@ -0,0 +1,337 @@
+# backend/app/reminder_engine.py
+import heapq
+import itertools
+import threading
+from datetime import datetime, time, timedelta
+from flask import current_app
+from sqlalchemy import insert
+
+from .models import DoseOccurrence, Appointment, ReminderChange
+from .extensions import db
+from .reminder_ledger import claim_dispatch
+from .reminder_digest import collect_digest, load_digest_window, flush_digests
+from . import metrics
+
+# ย้อนดู reminder_change กี่วินาทีทุกครั้งที่ poll (เผื่อ transaction ที่ commit ช้ากว่า id ที่ได้ และนาฬิกาที่ต่างกันระหว่างเครื่อง)
+CHANGE_LOOKBACK = timedelta(seconds=60)
+
+
+class ReminderEngine:
+    """
+    ตัวจัดการแจ้งเตือนแบบ in-memory (priority queue เรียงตามเวลาที่ต้องส่ง)
+    แทนการ poll ฐานข้อมูลทุกนาที: แต่ละเหตุการณ์ (แจ้งเตือนล่วงหน้า, ถึงเวลา, ยาขาด, นัดหมาย)
+    จะถูกปลุกตรงเวลาพอดี และในนาทีที่ไม่มีเหตุการณ์ thread จะหลับอยู่เฉยๆ
+
+    Engine อยู่เฉพาะใน process ผู้นำของ Scheduler ส่วน Endpoint ที่แก้ไขยา/นัดหมายทำงานใน web worker
+    จึงส่งการเปลี่ยนแปลงผ่านตาราง reminder_change (notify_* ท้ายไฟล์ เขียนใน transaction เดียวกับการแก้ไข)
+    engine อ่านตารางนี้ทุก REMINDER_ENGINE_POLL_SECONDS แล้วโหลดใหม่เฉพาะรายการที่เปลี่ยน (apply_changes)
+    และโหลดทั้งหมดใหม่ทุก REMINDER_ENGINE_RESYNC_MINUTES เป็นตัวสำรอง
+    เหตุการณ์ pre/due ที่เลยเวลาไปก่อนถูกโหลด (ภายในช่วงก่อนการเตือนครั้งถัดไป) จะถูกส่งทันที
+    และ reminder_dispatch กันไม่ให้ส่งซ้ำกับที่เคยส่งไปแล้ว
+    การยกเลิกใช้ "generation" ต่อ entity: รายการเก่าที่ค้างอยู่ใน heap จะถูกข้ามเมื่อถึงเวลา
+
+    เหตุการณ์ที่ถึงเวลาพร้อมกันถูกส่งเป็นชุดเดียว (เหมือน tick ของโหมด polling): แจ้งเตือนถูกรวมเป็น digest
+    ต่อผู้รับตาม DIGEST_WINDOW_MINUTES และ metric ถูกบันทึกในชื่อ Job 'reminder_engine'
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._heap = []
+        self._seq = itertools.count()
+        self._generations = {}
+        self._cond = threading.Condition()
+        self._thread = None
+        self._running = False
+        self.reminder_before_min = 15
+        self.alert_after_min = 15
+        # id ของ reminder_change ที่ apply_changes ประมวลผลแล้ว (เฉพาะที่ยังอยู่ในช่วง CHANGE_LOOKBACK)
+        self._seen_changes = set()
+
+    # --- การเริ่ม/หยุดทำงาน ---
+
+    def start(self):
+        self.rebuild()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='reminder-engine', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+
+    def rebuild(self):
+        """โหลดเหตุการณ์ทั้งหมดของวันนี้และพรุ่งนี้ใหม่จากฐานข้อมูล"""
+        from .scheduler import load_reminder_settings
+
+        with self.app.app_context():
+            now = datetime.now()
+            day_start = datetime.combine(now.date(), time.min)
+            horizon = day_start + timedelta(days=2)
+            self.reminder_before_min, self.alert_after_min = load_reminder_settings()
+
+            occurrences = self._occurrence_query(day_start, horizon).all()
+            appointments = self._appointment_query(day_start, horizon).all()
+            db.session.remove()
+
+        with self._cond:
+            self._heap = []
+            self._generations = {}
+            for occurrence_id, due_at in occurrences:
+                self._schedule_occurrence(occurrence_id, due_at, now)
+            for appointment_id, appointment_datetime in appointments:
+                self._schedule_appointment(appointment_id, appointment_datetime, now)
+            # เหตุการณ์พิเศษ: โหลดข้อมูลใหม่ทุกเที่ยงคืน
+            self._push(day_start + timedelta(days=1), 'engine', 0, 'rollover', self._bump('engine', 0))
+            self._cond.notify_all()
+        print(f"ReminderEngine: โหลดรอบยา {len(occurrences)} รายการ และนัดหมาย {len(appointments)} รายการ")
+
+    def apply_changes(self):
+        """
+        โหลดใหม่เฉพาะรอบการทานยา/นัดหมายที่ Endpoint บันทึกไว้ใน reminder_change และยังไม่เคยประมวลผล
+        รายการที่ไม่อยู่ในสถานะ pending แล้ว (ทานแล้ว/ยืนยันแล้ว/ถูกลบ) จะถูกยกเลิกจากคิว
+        คืนค่าจำนวนการเปลี่ยนแปลงที่ประมวลผล
+        """
+        with self.app.app_context():
+            try:
+                changes = db.session.query(ReminderChange.id, ReminderChange.kind, ReminderChange.entity_id).filter(
+                    ReminderChange.created_at >= datetime.utcnow() - CHANGE_LOOKBACK
+                ).all()
+                fresh = [change for change in changes if change.id not in self._seen_changes]
+                occurrence_ids = {change.entity_id for change in fresh if change.kind == 'occurrence'}
+                appointment_ids = {change.entity_id for change in fresh if change.kind == 'appointment'}
+
+                now = datetime.now()
+                day_start = datetime.combine(now.date(), time.min)
+                horizon = day_start + timedelta(days=2)
+                occurrences = dict(self._occurrence_query(day_start, horizon).filter(
+                    DoseOccurrence.id.in_(occurrence_ids)
+                ).all()) if occurrence_ids else {}
+                appointments = dict(self._appointment_query(day_start, horizon).filter(
+                    Appointment.id.in_(appointment_ids)
+                ).all()) if appointment_ids else {}
+            finally:
+                db.session.remove()
+
+        with self._cond:
+            for occurrence_id in occurrence_ids:
+                if occurrence_id in occurrences:
+                    self._schedule_occurrence(occurrence_id, occurrences[occurrence_id], now)
+                else:
+                    self._bump('occurrence', occurrence_id)
+            for appointment_id in appointment_ids:
+                if appointment_id in appointments:
+                    self._schedule_appointment(appointment_id, appointments[appointment_id], now)
+                else:
+                    self._bump('appointment', appointment_id)
+            self._cond.notify_all()
+        self._seen_changes = {change.id for change in changes}
+        return len(fresh)
+
+    def pending_count(self):
+        with self._cond:
+            return sum(1 for entry in self._heap if not self._is_stale(entry))
+
+    # --- ภายใน ---
+
+    @staticmethod
+    def _occurrence_query(day_start, horizon):
+        return db.session.query(DoseOccurrence.id, DoseOccurrence.due_at).filter(
+            DoseOccurrence.status == 'pending',
+            DoseOccurrence.due_at >= day_start,
+            DoseOccurrence.due_at < horizon
+        )
+
+    @staticmethod
+    def _appointment_query(day_start, horizon):
+        return db.session.query(Appointment.id, Appointment.appointment_datetime).filter(
+            Appointment.status == 'pending',
+            Appointment.appointment_datetime >= day_start,
+            Appointment.appointment_datetime < horizon
+        )
+
+    def _bump(self, kind, entity_id):
+        generation = self._generations.get((kind, entity_id), 0) + 1
+        self._generations[(kind, entity_id)] = generation
+        return generation
+
+    def _is_stale(self, entry):
+        _, _, kind, entity_id, _, generation = entry
+        return self._generations.get((kind, entity_id)) != generation
+
+    def _push(self, fire_at, kind, entity_id, slot, generation):
+        heapq.heappush(self._heap, (fire_at, next(self._seq), kind, entity_id, slot, generation))
+
+    def _schedule_occurrence(self, occurrence_id, due_at, now):
+        generation = self._bump('occurrence', occurrence_id)
+        pre_at = due_at - timedelta(minutes=self.reminder_before_min)
+        if pre_at > now:
+            self._push(pre_at, 'occurrence', occurrence_id, 'pre', generation)
+        elif due_at > now:
+            # เลยเวลาเตือนล่วงหน้าแล้วแต่ยังไม่ถึงเวลาทาน (เช่น ยาที่เพิ่งเพิ่มจาก web worker และเพิ่งโหลดตอน resync)
+            self._push(now, 'occurrence', occurrence_id, 'pre', generation)
+        if due_at > now:
+            self._push(due_at, 'occurrence', occurrence_id, 'due', generation)
+        elif now < due_at + timedelta(minutes=self.alert_after_min):
+            # ถึงเวลาไปแล้วแต่ยังไม่ถึงการแจ้งยาขาดครั้งแรก: ส่งทันที (reminder_dispatch กันส่งซ้ำถ้าเคยส่งไปแล้ว)
+            self._push(now, 'occurrence', occurrence_id, 'due', generation)
+        next_overdue = self._next_repeat(due_at, timedelta(minutes=self.alert_after_min), now)
+        if next_overdue:
+            self._push(next_overdue, 'occurrence', occurrence_id, 'overdue', generation)
+
+    def _schedule_appointment(self, appointment_id, appointment_datetime, now):
+        generation = self._bump('appointment', appointment_id)
+        if appointment_datetime > now:
+            self._push(appointment_datetime, 'appointment', appointment_id, 'due', generation)
+        elif now < appointment_datetime + timedelta(hours=1):
+            self._push(now, 'appointment', appointment_id, 'due', generation)
+        next_overdue = self._next_repeat(appointment_datetime, timedelta(hours=1), now)
+        if next_overdue:
+            self._push(next_overdue, 'appointment', appointment_id, 'overdue', generation)
+
+    @staticmethod
+    def _next_repeat(start, interval, now):
+        """เวลาเตือนซ้ำครั้งถัดไป (start + k * interval, k >= 1) ที่ยังไม่ผ่านไปและยังอยู่ในวันเดียวกัน"""
+        fire_at = start + interval
+        while fire_at <= now:
+            fire_at += interval
+        return fire_at if fire_at.date() == start.date() else None
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._running:
+                    return
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+                now = datetime.now()
+                delay = (self._heap[0][0] - now).total_seconds()
+                if delay > 0:
+                    self._cond.wait(timeout=delay)
+                    continue
+                # เหตุการณ์ทั้งหมดที่ถึงเวลาแล้วถูกส่งเป็นชุดเดียวกัน (รวม digest ต่อผู้รับได้)
+                batch = []
+                while self._heap and self._heap[0][0] <= now:
+                    entry = heapq.heappop(self._heap)
+                    if not self._is_stale(entry):
+                        batch.append(entry)
+            if batch:
+                try:
+                    self._fire_batch(batch)
+                except Exception as e:
+                    print(f"ReminderEngine: เกิดข้อผิดพลาดขณะส่งแจ้งเตือน {len(batch)} รายการ: {e}")
+
+    def _fire_batch(self, entries):
+        if any(entry[2] == 'engine' for entry in entries):
+            # เที่ยงคืน: โหลดใหม่ทั้งหมด (รายการอื่นในชุดนี้จะถูกโหลดกลับเข้าคิวพร้อมกัน)
+            self.rebuild()
+            return
+
+        from . import scheduler
+
+        now = datetime.now()
+        continued = []
+        with self.app.app_context(), metrics.tick('reminder_engine'):
+            try:
+                with collect_digest(now) as digest:
+                    for entry in entries:
+                        try:
+                            if self._fire(entry, scheduler):
+                                continued.append(entry)
+                            digest.write()
+                            db.session.commit()
+                        except Exception as e:
+                            db.session.rollback()
+                            digest.rows = []
+                            print(f"ReminderEngine: เกิดข้อผิดพลาดขณะส่งแจ้งเตือน {entry[2:5]}: {e}")
+
+                flushed = flush_digests(now, load_digest_window(), scheduler.dispatch_email)
+                metrics.count('digest_items_flushed', flushed)
+                db.session.commit()
+            finally:
+                db.session.remove()
+
+        # ต่อคิวการเตือนซ้ำครั้งถัดไป
+        with self._cond:
+            for fire_at, _, kind, entity_id, slot, generation in continued:
+                if slot != 'overdue':
+                    continue
+                interval = timedelta(minutes=self.alert_after_min) if kind == 'occurrence' else timedelta(hours=1)
+                next_at = fire_at + interval
+                if self._generations.get((kind, entity_id)) == generation and next_at.date() == fire_at.date():
+                    self._push(next_at, kind, entity_id, 'overdue', generation)
+            self._cond.notify_all()
+
+    def _fire(self, entry, scheduler):
+        """ส่งแจ้งเตือนของ 1 รายการ (ผู้เรียกเป็นคน commit) คืนค่า False ถ้าไม่ต้องเตือนรายการนี้อีก"""
+        fire_at, _, kind, entity_id, slot, generation = entry
+        if kind == 'occurrence':
+            event = scheduler.medicine_event_query().filter(DoseOccurrence.id == entity_id).first()
+        else:
+            event = scheduler.appointment_event_query().filter(Appointment.id == entity_id).first()
+        # ถูกทานยา/ยืนยันนัด/ลบไปแล้ว ไม่ต้องแจ้งเตือนอีก
+        if event is None:
+            return False
+
+        # จองใน reminder_dispatch ก่อนส่ง (กันส่งซ้ำกับ rebuild หรือ process อื่น)
+        if kind == 'occurrence':
+            minutes_passed = int((fire_at - event.due_at).total_seconds() // 60)
+            slot_key = f'overdue:{minutes_passed // self.alert_after_min}' if slot == 'overdue' else slot
+            key = scheduler.medicine_dispatch_key(event, slot_key)
+        else:
+            minutes_passed = int((fire_at - event.appointment_datetime).total_seconds() // 60)
+            slot_key = f'overdue:{minutes_passed // 60}' if slot == 'overdue' else slot
+            key = scheduler.appointment_dispatch_key(event, slot_key)
+        if not claim_dispatch(*key):
+            return False
+
+        metrics.count('medications_examined' if kind == 'occurrence' else 'appointments_examined')
+        managers = scheduler.load_manager_contacts([event.elder_id]).get(event.elder_id, [])
+        notifications = []
+        if kind == 'occurrence':
+            if slot == 'pre':
+                notifications = scheduler.send_medicine_pre_reminder(event, self.reminder_before_min)
+            elif slot == 'due':
+                scheduler.send_medicine_due_alert(event, managers)
+            else:
+                notifications = scheduler.send_medicine_overdue_alert(event, managers, minutes_passed)
+        else:
+            if slot == 'due':
+                scheduler.send_appointment_due_alert(event, managers)
+            else:
+                notifications = scheduler.send_appointment_overdue_alert(event, managers, minutes_passed)
+
+        scheduler.add_internal_notifications(notifications, datetime.now())
+        return True
+
+
+# -----------------------------------------------------------------------------
+# ฟังก์ชันสำหรับ Endpoint (เรียกก่อน commit เพื่อให้อยู่ใน transaction เดียวกับการแก้ไข)
+# ไม่ทำอะไรถ้าไม่ได้ใช้โหมด REMINDER_ENGINE = 'timing_wheel'
+# -----------------------------------------------------------------------------
+def get_engine(app=None):
+    app = app or current_app
+    return app.extensions.get('reminder_engine')
+
+
+def _record_changes(kind, entity_ids):
+    if current_app.config.get('REMINDER_ENGINE') != 'timing_wheel':
+        return
+    now = datetime.utcnow()
+    rows = [
+        {'kind': kind, 'entity_id': entity_id, 'created_at': now}
+        for entity_id in dict.fromkeys(entity_ids) if entity_id is not None
+    ]
+    if rows:
+        db.session.execute(insert(ReminderChange), rows)
+
+
+def notify_occurrences(occurrence_ids):
+    """รอบการทานยาเหล่านี้ถูกเพิ่ม/ปิด/ลบ (engine จะโหลดสถานะล่าสุดจากฐานข้อมูลเอง)"""
+    _record_changes('occurrence', occurrence_ids)
+
+
+def notify_appointment(appointment_id):
+    """นัดหมายนี้ถูกเพิ่ม/แก้ไข/ยืนยัน/ลบ (engine จะโหลดสถานะล่าสุดจากฐานข้อมูลเอง)"""
+    _record_changes('appointment', [appointment_id])
@@ -0,0 +1,79 @@
+# backend/app/reminder_ledger.py
+from datetime import date, timedelta
+from sqlalchemy import insert, delete
+from sqlalchemy.exc import IntegrityError
+
+from .models import ReminderDispatch
+from .extensions import db
+
+# จำนวน key สูงสุดต่อ INSERT 1 ครั้ง (SQLite จำกัดจำนวน parameter ต่อ statement)
+CLAIM_BATCH_SIZE = 500
+
+
+def _dialect_insert():
+    """คืนค่า insert() ของ dialect ที่รองรับ ON CONFLICT DO NOTHING (หรือ None ถ้าไม่รองรับ)"""
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as pg_insert
+        return pg_insert
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+        return sqlite_insert
+    return None
+
+
+def claim_dispatch(kind, entity_id, occurrence_date, slot):
+    """
+    จอง key การส่งแจ้งเตือน 1 รายการ (insert-if-absent)
+    คืนค่า True ถ้าเราเป็นคนแรกที่จอง (ควรส่ง), False ถ้ามีคนส่งไปแล้ว
+    """
+    return (kind, entity_id, occurrence_date, slot) in claim_dispatches([(kind, entity_id, occurrence_date, slot)])
+
+
+def claim_dispatches(keys):
+    """
+    จอง key การส่งแจ้งเตือนหลายรายการในครั้งเดียว
+    keys คือ list ของ (kind, entity_id, occurrence_date, slot)
+    คืนค่า set ของ key ที่จองสำเร็จ (key ที่มีอยู่แล้วจะไม่ถูกคืน)
+
+    การจองจะอยู่ใน transaction เดียวกับงานที่เหลือของผู้เรียก และมีผลเมื่อ commit
+    """
+    keys = list(dict.fromkeys(keys))
+    if not keys:
+        return set()
+
+    dialect_insert = _dialect_insert()
+    claimed = set()
+    for i in range(0, len(keys), CLAIM_BATCH_SIZE):
+        batch = keys[i:i + CLAIM_BATCH_SIZE]
+        rows = [
+            {'kind': kind, 'entity_id': entity_id, 'occurrence_date': occurrence_date, 'slot': slot}
+            for kind, entity_id, occurrence_date, slot in batch
+        ]
+        if dialect_insert is not None:
+            stmt = dialect_insert(ReminderDispatch).values(rows).on_conflict_do_nothing(
+                index_elements=['kind', 'entity_id', 'occurrence_date', 'slot']
+            ).returning(
+                ReminderDispatch.kind, ReminderDispatch.entity_id,
+                ReminderDispatch.occurrence_date, ReminderDispatch.slot
+            )
+            claimed.update(tuple(row) for row in db.session.execute(stmt))
+        else:
+            # dialect อื่น: ใช้ savepoint ต่อ key แล้วดู IntegrityError แทน
+            for key, row in zip(batch, rows):
+                try:
+                    with db.session.begin_nested():
+                        db.session.execute(insert(ReminderDispatch).values(**row))
+                    claimed.add(key)
+                except IntegrityError:
+                    pass
+    return claimed
+
+
+def prune_dispatch_ledger(app, keep_days=7):
+    """Job รายวัน: ลบบันทึกการส่งที่เก่ากว่า keep_days วัน เพื่อไม่ให้ตารางโตไม่สิ้นสุด"""
+    with app.app_context():
+        cutoff = date.today() - timedelta(days=keep_days)
+        result = db.session.execute(delete(ReminderDispatch).where(ReminderDispatch.occurrence_date < cutoff))
+        db.session.commit()
+        print(f"ลบบันทึกการส่งแจ้งเตือนที่เก่ากว่า {cutoff.isoformat()} จำนวน {result.rowcount} รายการ")
@@ -0,0 +1,233 @@
+# backend/app/rtdb_sync.py
+"""
+ซิงก์สถานะการทานยาไปยัง Firebase Realtime Database แบบ write-behind
+
+แทนการเรียก reference(...).set(...) ทีละครั้งใน request (ผู้ใช้ต้องรอ Firebase ทุกครั้งที่กด "ทานยาแล้ว")
+- put() แค่เก็บค่าไว้ในหน่วยความจำ แล้วตอบกลับทันที
+- worker 1 ตัวรวมค่าที่ค้างเป็นคำสั่ง update() แบบหลาย path ครั้งเดียว ทุก RTDB_SYNC_FLUSH_MS
+  หรือทันทีที่ค้างครบ RTDB_SYNC_MAX_BATCH path
+- path เดียวกันที่ถูกเขียนซ้ำก่อน flush จะเหลือเฉพาะค่าล่าสุด
+- ถ้า Firebase ล่ม จะเก็บค่าไว้แล้วลองใหม่แบบ exponential backoff (ค่าที่ใหม่กว่าทับค่าที่ค้าง)
+  ค้างได้ไม่เกิน RTDB_SYNC_MAX_PENDING path เกินนั้นจะทิ้งค่าใหม่ (RTDB เป็นเพียงสำเนาแสดงผล ข้อมูลจริงอยู่ใน MedicationLog)
+
+ตั้ง RTDB_SYNC_CLIENT = 'memory' เพื่อใช้ InMemoryRtdbClient แทน Firebase (ทดสอบ/พัฒนาโดยไม่ต้องมี credentials)
+"""
+import atexit
+import threading
+from datetime import date, datetime
+from time import monotonic, perf_counter
+
+from . import metrics
+from .firebase_service import ensure_firebase
+
+_sync_lock = threading.Lock()
+
+
+class FirebaseRtdbClient:
+    """ส่ง update แบบหลาย path ไปยัง root ของ Firebase RTDB"""
+
+    def update(self, updates):
+        from firebase_admin import db as firebase_db
+        firebase_db.reference('/').update(updates)
+
+
+class InMemoryRtdbClient:
+    """
+    RTDB จำลองในหน่วยความจำ (รองรับ update แบบหลาย path เหมือนของจริง)
+    fail_next = จำนวนครั้งถัดไปที่ update() จะล้มเหลว (จำลอง Firebase ล่ม)
+    """
+
+    def __init__(self):
+        self.data = {}
+        self.updates = []
+        self.fail_next = 0
+        self._lock = threading.Lock()
+
+    def update(self, updates):
+        with self._lock:
+            if self.fail_next:
+                self.fail_next -= 1
+                raise ConnectionError('in-memory RTDB: simulated outage')
+            self.updates.append(dict(updates))
+            for path, value in updates.items():
+                *parents, leaf = [part for part in path.split('/') if part]
+                node = self.data
+                for part in parents:
+                    node = node.setdefault(part, {})
+                if value is None:
+                    node.pop(leaf, None)
+                else:
+                    node[leaf] = value
+
+    def get(self, path):
+        node = self.data
+        for part in [part for part in path.split('/') if part]:
+            if not isinstance(node, dict) or part not in node:
+                return None
+            node = node[part]
+        return node
+
+
+class RtdbSyncQueue:
+    """คิว write-behind ที่รวมการเขียนหลาย path เป็น update() ครั้งเดียว (ดูคำอธิบายด้านบน)"""
+
+    def __init__(self, client, flush_interval=0.2, max_batch=500, max_pending=10000,
+                 retry_backoff=1, retry_backoff_max=60):
+        self.client = client
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.max_pending = max_pending
+        self.retry_backoff = retry_backoff
+        self.retry_backoff_max = retry_backoff_max
+        self._pending = {}
+        self._failures = 0
+        self._retry_at = 0.0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._worker = threading.Thread(target=self._run, name='rtdb-sync', daemon=True)
+        self._worker.start()
+
+    def put(self, path, value):
+        """บันทึกค่าที่จะเขียนไปยัง path (ไม่รอ Firebase) คืนค่า False ถ้าคิวเต็มและค่านี้ถูกทิ้ง"""
+        with self._cond:
+            if path not in self._pending and len(self._pending) >= self.max_pending:
+                metrics.inc('rtdb_sync_dropped_total')
+                return False
+            self._pending[path] = value
+            metrics.set_gauge('rtdb_sync_pending', len(self._pending))
+            if len(self._pending) >= self.max_batch:
+                self._cond.notify()
+        return True
+
+    def pending(self):
+        with self._cond:
+            return len(self._pending)
+
+    def flush(self):
+        """ส่งค่าที่ค้างทั้งหมดทันที (คืนค่า True ถ้าสำเร็จหรือไม่มีค่าค้าง)"""
+        while True:
+            with self._cond:
+                if not self._pending:
+                    return True
+            if not self._flush_once():
+                return False
+
+    def shutdown(self, timeout=10):
+        """หยุด worker แล้วพยายามส่งค่าที่ค้างเป็นครั้งสุดท้าย"""
+        if self._closed:
+            return
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._worker.join(timeout=timeout)
+        if not self.flush():
+            print(f"RtdbSyncQueue: ปิดตัวขณะยังมีสถานะค้างส่ง {self.pending()} รายการ")
+
+    def _take_batch(self):
+        """ดึงค่าที่ค้างออกมาไม่เกิน max_batch path (ตามลำดับที่ถูกเพิ่ม)"""
+        if len(self._pending) <= self.max_batch:
+            batch, self._pending = self._pending, {}
+        else:
+            paths = list(self._pending)[:self.max_batch]
+            batch = {path: self._pending.pop(path) for path in paths}
+        return batch
+
+    def _flush_once(self):
+        with self._cond:
+            batch = self._take_batch()
+        if not batch:
+            return True
+
+        started = perf_counter()
+        try:
+            self.client.update(batch)
+        except Exception as e:
+            metrics.inc('rtdb_sync_failures_total')
+            with self._cond:
+                # ค่าที่ถูกเขียนใหม่ระหว่างนี้ใหม่กว่า จึงทับค่าที่ส่งไม่สำเร็จ
+                batch.update(self._pending)
+                self._pending = batch
+                self._failures += 1
+                delay = min(self.retry_backoff * 2 ** (self._failures - 1), self.retry_backoff_max)
+                self._retry_at = monotonic() + delay
+            print(f"RtdbSyncQueue: ส่งไปยัง Firebase RTDB ไม่สำเร็จ ({len(batch)} path) จะลองใหม่ใน {delay:.0f} วินาที: {e}")
+            return False
+        finally:
+            metrics.observe('rtdb_sync_seconds', perf_counter() - started)
+
+        metrics.inc('rtdb_sync_writes_total', len(batch))
+        metrics.inc('rtdb_sync_updates_total')
+        with self._cond:
+            self._failures = 0
+            self._retry_at = 0.0
+            metrics.set_gauge('rtdb_sync_pending', len(self._pending))
+        return True
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if self._closed:
+                    return
+                timeout = max(self._retry_at - monotonic(), self.flush_interval)
+                if len(self._pending) < self.max_batch or self._retry_at > monotonic():
+                    self._cond.wait(timeout)
+                if self._closed:
+                    return
+                if not self._pending or self._retry_at > monotonic():
+                    continue
+            try:
+                self._flush_once()
+            except Exception as e:
+                # worker ต้องไม่ตาย ไม่ว่าจะเกิดอะไรขึ้น
+                print(f"RtdbSyncQueue: เกิดข้อผิดพลาดที่ไม่คาดคิด: {e}")
+
+
+def get_rtdb_sync(app):
+    """
+    คืนค่า RtdbSyncQueue ของแอป (สร้างครั้งแรกเมื่อใช้งาน หลัง fork ของ gunicorn แล้ว)
+    คืนค่า None ถ้าใช้ Firebase แต่ยังไม่ได้ตั้งค่า Firebase Admin SDK
+    """
+    sync = app.extensions.get('rtdb_sync', False)
+    if sync is not False:
+        return sync
+    with _sync_lock:
+        sync = app.extensions.get('rtdb_sync', False)
+        if sync is not False:
+            return sync
+        client = app.extensions.get('rtdb_client')
+        if client is None:
+            if app.config.get('RTDB_SYNC_CLIENT', 'firebase') == 'memory':
+                client = InMemoryRtdbClient()
+            else:
+                client = FirebaseRtdbClient() if ensure_firebase(app) else None
+            app.extensions['rtdb_client'] = client
+
+        if client is None:
+            print("RtdbSyncQueue: ไม่ได้ตั้งค่า Firebase Admin SDK จึงไม่ซิงก์สถานะการทานยา")
+            sync = None
+        else:
+            sync = RtdbSyncQueue(
+                client,
+                flush_interval=app.config.get('RTDB_SYNC_FLUSH_MS', 200) / 1000,
+                max_batch=app.config.get('RTDB_SYNC_MAX_BATCH', 500),
+                max_pending=app.config.get('RTDB_SYNC_MAX_PENDING', 10000),
+                retry_backoff=app.config.get('RTDB_SYNC_RETRY_BACKOFF_SECONDS', 1),
+                retry_backoff_max=app.config.get('RTDB_SYNC_RETRY_MAX_SECONDS', 60)
+            )
+            atexit.register(sync.shutdown)
+        app.extensions['rtdb_sync'] = sync
+    return sync
+
+
+def queue_med_status(app, user_id, medication_id, name, time_to_take, day=None):
+    """เพิ่มสถานะ "ทานยาแล้ว" ของยา 1 รายการเข้าคิว (path: med_status/<user_id>/<วันที่>/<medication_id>)"""
+    sync = get_rtdb_sync(app)
+    if sync is None:
+        return False
+    day = (day or date.today()).isoformat()
+    return sync.put(f'med_status/{user_id}/{day}/{medication_id}', {
+        'taken': True,
+        'name': name,
+        'time': time_to_take,
+        'timestamp': datetime.utcnow().isoformat()
+    })
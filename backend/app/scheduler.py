@@ -1,13 +1,36 @@
 # backend/app/scheduler.py
+import json
 import os
-from apscheduler.schedulers.background import BackgroundScheduler
-from datetime import datetime, date, timedelta
-from sqlalchemy import func
+from functools import wraps
+from datetime import datetime, date, time, timedelta
+from sqlalchemy import insert, or_, and_
+from sqlalchemy.orm import joinedload
 from flask import current_app
 
-from .models import User, Medication, MedicationLog, Notification, SystemSetting, Appointment
+from .models import User, Medication, Notification, SystemSetting, Appointment, DoseOccurrence, SchedulerWatermark, SchedulerMetricsSnapshot, ReminderChange
 from .extensions import db
-from .email_service import send_email
+from . import metrics
+from .email_service import send_template_email
+from .reminder_engine import ReminderEngine, get_engine
+from .leader import LeaderLease
+from .recipients import load_manager_contacts
+from .date_ranges import day_range, within
+from .medication_status import active_on, taken_ids_on
+from .reminder_ledger import claim_dispatches, prune_dispatch_ledger
+from .email_outbox import drain_outbox, prune_outbox
+from .reminder_digest import collect_digest, add_to_digest, load_digest_window, flush_digests
+
+
+def dispatch_email(template_id, recipients, params):
+    """
+    ส่งอีเมลจากแม่แบบ (app/email_templates.py) ใน Job ของ Scheduler (นับจำนวนให้ tick ที่กำลังทำงานอยู่)
+    ถ้า tick กำลังรวม digest อยู่และแม่แบบรวม digest ได้ จะเก็บเข้า digest แทนการส่งทันที
+    """
+    if add_to_digest(recipients, template_id, params):
+        metrics.count('digest_items', len(recipients))
+        return
+    metrics.count('emails_dispatched')
+    send_template_email(template_id, recipients, params)
 
 
 def create_internal_notification(user_id, message, link_to=None):
@@ -34,242 +57,803 @@ def format_minutes_to_readable_time(minutes):
     return f"{hours} ชั่วโมง {remaining_minutes} นาที"
 
 
-def check_medicine_schedule(app):
+def parse_due_time(time_str):
+    """แปลง "HH:MM" เป็น time object (คืนค่า None ถ้ารูปแบบไม่ถูกต้อง)"""
+    try:
+        return datetime.strptime(time_str, '%H:%M').time()
+    except (TypeError, ValueError):
+        return None
+
+
+def build_occurrence_row(med_id, user_id, time_str, target_date):
+    """สร้าง dict ของ DoseOccurrence 1 แถว สำหรับใช้กับ bulk insert"""
+    due_time = parse_due_time(time_str)
+    if due_time is None:
+        return None
+    return {
+        'medication_id': med_id,
+        'user_id': user_id,
+        'occurrence_date': target_date,
+        'due_time': due_time.strftime('%H:%M'),
+        'due_at': datetime.combine(target_date, due_time),
+        'status': 'pending',
+    }
+
+
+def materialize_medication_occurrence(med, target_date):
     """
-    Job ที่ทำงานทุกนาทีเพื่อส่งการแจ้งเตือนการทานยาผ่าน "อีเมล"
+    สร้าง DoseOccurrence ของยา 1 รายการสำหรับวันที่กำหนด (ถ้ายังไม่มี)
+    ใช้ตอนเพิ่มยาใหม่ เพื่อให้ไม่ต้องรอ Job รายคืน
+    """
+    if med.start_date > target_date or (med.end_date is not None and med.end_date < target_date):
+        return None
+    row = build_occurrence_row(med.id, med.user_id, med.time_to_take, target_date)
+    if row is None:
+        return None
+    exists = DoseOccurrence.query.filter_by(
+        medication_id=med.id, occurrence_date=target_date, due_time=row['due_time']
+    ).first()
+    if exists:
+        return exists
+    occurrence = DoseOccurrence(**row)
+    db.session.add(occurrence)
+    return occurrence
+
+
+def materialize_dose_occurrences(app, target_date=None, days_ahead=0):
+    """
+    Job รายคืน: เติมตาราง dose_occurrence ให้มี 1 แถวต่อ (ยา, วันที่, เวลา) ของวันที่กำหนด
+    ทำงานซ้ำได้อย่างปลอดภัย (แถวที่มีอยู่แล้วจะถูกข้าม)
     """
     with app.app_context():
-        now = datetime.now()
-        today = now.date()
-
-        try:
-            reminder_before_min = int(SystemSetting.query.filter_by(key='REMINDER_BEFORE_MINUTES').first().value)
-            alert_after_min = int(SystemSetting.query.filter_by(key='ALERT_AFTER_MINUTES').first().value)
-        except (AttributeError, ValueError):
-            reminder_before_min = 15
-            alert_after_min = 15
-        
-        meds_for_today = Medication.query.filter(
-            Medication.start_date <= today,
-            (Medication.end_date.is_(None)) | (Medication.end_date >= today)
-        ).all()
-
-        for med in meds_for_today:
-            try:
-                med_time_obj = datetime.strptime(med.time_to_take, '%H:%M').time()
-                med_datetime_today = datetime.combine(today, med_time_obj)
-            except ValueError:
-                continue
+        target_date = target_date or (date.today() + timedelta(days=days_ahead))
 
-            log_exists_today = MedicationLog.query.filter(
-                MedicationLog.medication_id == med.id, 
-                db.func.date(MedicationLog.taken_at) == today
-            ).first()
+        active_meds = db.session.query(
+            Medication.id, Medication.user_id, Medication.time_to_take
+        ).filter(active_on(target_date)).all()
 
-            if log_exists_today:
-                continue
+        existing = {
+            (med_id, due_time) for med_id, due_time in db.session.query(
+                DoseOccurrence.medication_id, DoseOccurrence.due_time
+            ).filter(DoseOccurrence.occurrence_date == target_date)
+        }
+
+        # ยาที่ถูกบันทึกว่าทานแล้วในวันนั้น (กรณีสร้างย้อนหลังของวันนี้)
+        taken_ids = taken_ids_on(day=target_date)
 
-            elder = med.patient
-            elder_name = f"{elder.first_name} {elder.last_name}"
-            med_info_str = f"{med.name} ({med.time_to_take})"
-
-            # A. แจ้งเตือนล่วงหน้า
-            time_until_med = (med_datetime_today - now).total_seconds() / 60
-            if reminder_before_min - 1 < time_until_med <= reminder_before_min:
-                pre_reminder_log = f"แจ้งเตือนล่วงหน้า: {med_info_str}"
-                notif_sent_today = Notification.query.filter(
-                    Notification.message == pre_reminder_log,
-                    db.func.date(Notification.created_at) == today,
-                    (Notification.user_id == elder.id)
-                ).first()
-
-                if not notif_sent_today and elder.email:
-                    send_email(
-                        subject=f"เตรียมตัวทานยาในอีก {reminder_before_min} นาที",
-                        recipients=[elder.email],
-                        text_body=f"สวัสดีคุณ {elder.first_name},\n\nในอีกประมาณ {reminder_before_min} นาที จะถึงเวลาทานยา '{med.name}' ({med.time_to_take} น.) กรุณาเตรียมตัวให้พร้อมนะคะ"
-                    )
-                    create_internal_notification(elder.id, pre_reminder_log)
-
-            # B. แจ้งเตือนเมื่อ "ถึงเวลาพอดี"
-            if now.hour == med_datetime_today.hour and now.minute == med_datetime_today.minute:
-                if elder.email:
-                    send_email(
-                        subject=f"🔔 ได้เวลาทานยา: {med.name}",
-                        recipients=[elder.email],
-                        text_body=f"สวัสดีคุณ {elder.first_name},\n\nถึงเวลาทานยา '{med.name}' แล้วค่ะ\nเวลา: {med.time_to_take} น."
-                    )
-                manager_emails = [manager.email for manager in elder.managers if manager.email]
-                if manager_emails:
-                    send_email(
-                        subject=f"🔔 แจ้งเตือน: ถึงเวลาทานยาของ {elder_name}",
-                        recipients=manager_emails,
-                        text_body=f"ถึงเวลาที่คุณ {elder_name} ต้องทานยา '{med_info_str}'\nกรุณาตรวจสอบและติดตามการทานยา"
-                    )
-
-            # C. แจ้งเตือนซ้ำ (ยาขาด)
-            minutes_passed = (now - med_datetime_today).total_seconds() / 60
-            if minutes_passed > 0 and (int(minutes_passed) % alert_after_min == 0):
-                last_minute_start = now.replace(second=0, microsecond=0) - timedelta(minutes=1)
-                reminder_message_log = f"ยาขาด (เตือนซ้ำ): {med_info_str} ของ {elder_name}"
-                
-                notif_sent_recently = Notification.query.filter(
-                    Notification.message.like(f"%{reminder_message_log}%"),
-                    Notification.created_at >= last_minute_start
-                ).first()
-
-                if not notif_sent_recently:
-                    readable_time_passed = format_minutes_to_readable_time(int(minutes_passed))
-                    manager_emails = [manager.email for manager in elder.managers if manager.email]
-                    if manager_emails:
-                        send_email(
-                            subject=f"🚨 ยาขาด (เตือนซ้ำ)! : {elder_name}",
-                            recipients=manager_emails,
-                            text_body=f"แจ้งเตือน: คุณ {elder_name} ยังไม่กดยืนยันการทานยา '{med_info_str}' ซึ่งเลยเวลามาแล้วประมาณ {readable_time_passed}"
-                        )
-                    if elder.email:
-                        send_email(
-                            subject=f"🚨 ลืมทานยา (เตือนซ้ำ): {med.name}",
-                            recipients=[elder.email],
-                            text_body=f"สวัสดีคุณ {elder.first_name},\n\nระบบตรวจพบว่าคุณอาจจะยังไม่ได้ทานยา '{med.name}' ของเวลา {med.time_to_take} น.\n\nกรุณาตรวจสอบและกดยืนยันในเว็บแอปพลิเคชันด้วยนะคะ"
-                        )
-                    for manager in elder.managers:
-                        create_internal_notification(manager.id, reminder_message_log)
+        rows = []
+        for med_id, user_id, time_str in active_meds:
+            row = build_occurrence_row(med_id, user_id, time_str, target_date)
+            if row is None or (med_id, row['due_time']) in existing:
+                continue
+            if med_id in taken_ids:
+                row['status'] = 'taken'
+            rows.append(row)
 
+        if rows:
+            db.session.execute(insert(DoseOccurrence), rows)
         db.session.commit()
+        print(f"สร้างรอบการทานยาของวันที่ {target_date.isoformat()} จำนวน {len(rows)} รายการ")
+
+    # ให้ ReminderEngine (ถ้าเปิดใช้) โหลดรอบยาที่เพิ่งสร้างเข้าไปในคิว
+    engine = get_engine(app)
+    if engine and rows:
+        engine.rebuild()
+    return len(rows)
+
+
+# จำนวนแถวที่ประมวลผลต่อ 1 รอบ (commit ทุกครั้งที่จบ chunk)
+TICK_CHUNK_SIZE = 500
 
 
-def check_today_appointments(app):
+def add_internal_notifications(rows, created_at):
+    """บันทึก Notification หลายรายการด้วย INSERT ครั้งเดียว (rows คือ list ของ (user_id, message))"""
+    metrics.count('notifications_created', len(rows))
+    if rows:
+        db.session.execute(insert(Notification), [
+            {'user_id': user_id, 'message': message, 'created_at': created_at, 'is_read': False}
+            for user_id, message in rows
+        ])
+
+
+def load_reminder_settings():
+    """อ่านค่าการแจ้งเตือนจาก SystemSetting ด้วย query เดียว"""
+    settings = dict(db.session.query(SystemSetting.key, SystemSetting.value).filter(
+        SystemSetting.key.in_(['REMINDER_BEFORE_MINUTES', 'ALERT_AFTER_MINUTES'])
+    ).all())
+    try:
+        reminder_before_min = int(settings['REMINDER_BEFORE_MINUTES'])
+        alert_after_min = int(settings['ALERT_AFTER_MINUTES'])
+    except (KeyError, ValueError):
+        reminder_before_min = 15
+        alert_after_min = 15
+    return reminder_before_min, max(alert_after_min, 1)
+
+
+def range_windows(column, ranges):
     """
-    Job ที่ทำงานทุก "นาที" เพื่อส่งการแจ้งเตือนสำหรับนัดหมายใน "วันนี้"
+    สร้างเงื่อนไข OR ของช่วงเวลาแบบ half-open [start, end) บนคอลัมน์ที่มี index
+    ช่วงที่ซ้อนหรือต่อกันจะถูกรวมเป็นช่วงเดียวก่อน เพื่อให้ SQL สั้นที่สุด
     """
-    with app.app_context():
-        now = datetime.now()
-        today = now.date()
-        
-        appointments_today = Appointment.query.filter(
-            func.date(Appointment.appointment_datetime) == today,
-            Appointment.status == 'pending'
-        ).all()
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return or_(*[and_(column >= start, column < end) for start, end in merged])
+
+
+def repeat_windows(window_start, window_end, interval, floor):
+    """
+    ช่วงของเวลาเริ่มต้นที่การเตือนซ้ำครั้งที่ k (start + k * interval, k >= 1) ตกอยู่ใน [window_start, window_end)
+    โดยเวลาเริ่มต้นต้องไม่ก่อน floor (เช่น ต้นวัน)
+    """
+    ranges = []
+    k = 1
+    while window_end - k * interval > floor:
+        ranges.append((max(window_start - k * interval, floor), window_end - k * interval))
+        k += 1
+    return ranges
 
-        for appt in appointments_today:
-            elder = appt.patient
-            elder_name = f"{elder.first_name} {elder.last_name}"
-            appt_datetime = appt.appointment_datetime
-            appt_time_str = appt_datetime.strftime('%H:%M น.')
-
-            # A. แจ้งเตือนเมื่อ "ถึงเวลาพอดี"
-            if now.hour == appt_datetime.hour and now.minute == appt_datetime.minute:
-                manager_emails = [m.email for m in elder.managers if m.email]
-                if manager_emails:
-                    send_email(
-                        subject=f"‼️ แจ้งเตือนนัดหมายวันนี้: {elder_name}",
-                        recipients=manager_emails,
-                        text_body=f"แจ้งเตือน: วันนี้คุณ {elder_name} มีนัดหมายเรื่อง '{appt.title}' เวลา {appt_time_str} ที่ {appt.location}"
-                    )
-                if elder.email:
-                    send_email(
-                        subject=f'‼️ ได้เวลานัดหมาย: {appt.title}',
-                        recipients=[elder.email],
-                        text_body=f"สวัสดีคุณ {elder.first_name},\n\nถึงเวลานัดหมายเรื่อง '{appt.title}' ของท่านแล้วค่ะ\nเวลา: {appt_time_str}\nสถานที่: {appt.location}"
-                    )
-
-            # B. แจ้งเตือนซ้ำ "ทุกๆ 1 ชั่วโมงหลังจากเลยเวลา"
-            minutes_passed = (now - appt_datetime).total_seconds() / 60
-            if minutes_passed > 0 and (int(minutes_passed) > 0) and (int(minutes_passed) % 60 == 0):
-                last_hour_start = now - timedelta(minutes=60)
-                reminder_log_missed = f"นัดหมายเลยเวลา (เตือนซ้ำ): {appt.title}"
-
-                notif_sent_recently = Notification.query.filter(
-                    Notification.message.like(f"%{reminder_log_missed}%"),
-                    Notification.created_at >= last_hour_start
-                ).first()
-
-                if not notif_sent_recently:
-                    readable_time_passed = format_minutes_to_readable_time(int(minutes_passed))
-                    manager_emails = [m.email for m in elder.managers if m.email]
-                    if manager_emails:
-                        send_email(
-                            subject=f"🚨 นัดหมายเลยเวลา (เตือนซ้ำ)! : {elder_name}",
-                            recipients=manager_emails,
-                            text_body=f"แจ้งเตือน: นัดหมายเรื่อง '{appt.title}' ของคุณ {elder_name} ได้เลยเวลามาแล้วประมาณ {readable_time_passed} และยังไม่ได้รับการยืนยัน"
-                        )
-                    for manager in elder.managers:
-                        create_internal_notification(manager.id, reminder_log_missed)
-        
-        db.session.commit()
 
+def open_tick_window(name, now):
+    """
+    คืนค่าช่วงเวลา [window_start, window_end) ที่ tick นี้ต้องประมวลผล
+    เริ่มจาก watermark ที่ commit ไว้ล่าสุด ถึงสิ้นนาทีปัจจุบัน (ย้อนหลังได้ไม่เกิน SCHEDULER_MAX_CATCHUP_MINUTES)
+    ถ้ายังไม่มี watermark จะเริ่มที่นาทีปัจจุบัน
+    """
+    window_end = now.replace(second=0, microsecond=0) + timedelta(minutes=1)
+    watermark = db.session.get(SchedulerWatermark, name)
+    window_start = watermark.processed_until if watermark else window_end - timedelta(minutes=1)
 
-def check_tomorrow_appointments(app):
+    max_catchup = timedelta(minutes=current_app.config.get('SCHEDULER_MAX_CATCHUP_MINUTES', 60))
+    if window_start < window_end - max_catchup:
+        skipped = window_end - max_catchup - window_start
+        metrics.inc('scheduler_catchup_skipped_minutes_total', skipped.total_seconds() // 60, job=name)
+        print(f"{name}: ข้ามเหตุการณ์ที่ค้างเกิน {max_catchup} ({window_start} ถึง {window_end - max_catchup})")
+        window_start = window_end - max_catchup
+
+    if window_end - window_start > timedelta(minutes=1):
+        metrics.inc('scheduler_catchup_ticks_total', job=name)
+    metrics.set_gauge('scheduler_catchup_window_minutes', max((window_end - window_start).total_seconds() / 60, 0), job=name)
+    return window_start, window_end
+
+
+def commit_tick_window(name, window_end):
+    """เลื่อน watermark ไปที่ window_end (เดินหน้าอย่างเดียว) แล้ว commit"""
+    watermark = db.session.get(SchedulerWatermark, name)
+    if watermark is None:
+        db.session.add(SchedulerWatermark(name=name, processed_until=window_end))
+    elif watermark.processed_until < window_end:
+        watermark.processed_until = window_end
+    db.session.commit()
+
+
+def chunk_query(base_query, id_column, last_id, chunk_size=TICK_CHUNK_SIZE):
+    """query ของ chunk ถัดจาก last_id (ใช้โดย iter_chunks และ `flask admin explain-check`)"""
+    return base_query.filter(id_column > last_id).order_by(id_column).limit(chunk_size)
+
+
+def iter_chunks(base_query, id_column, chunk_size=TICK_CHUNK_SIZE):
+    """
+    วนอ่านผลลัพธ์ทีละ chunk แบบ keyset (id > id ล่าสุด)
+    ใช้แทน yield_per เพราะเรา commit ทุก chunk ซึ่งจะทำให้ cursor ที่เปิดค้างไว้ใช้ไม่ได้
+    """
+    last_id = 0
+    while True:
+        rows = chunk_query(base_query, id_column, last_id, chunk_size).all()
+        if not rows:
+            break
+        yield rows
+        last_id = rows[-1][0]
+
+
+def medicine_event_query():
+    """Query พื้นฐานของรอบการทานยาที่ยังไม่ทาน พร้อมข้อมูลยาและผู้สูงอายุ (ใช้ร่วมกันระหว่าง tick และ ReminderEngine)"""
+    return db.session.query(
+        DoseOccurrence.id.label('occurrence_id'), DoseOccurrence.medication_id, DoseOccurrence.due_at,
+        Medication.name.label('med_name'), Medication.time_to_take.label('med_time'),
+        User.id.label('elder_id'), User.first_name.label('elder_first_name'),
+        User.last_name.label('elder_last_name'), User.email.label('elder_email')
+    ).join(
+        Medication, Medication.id == DoseOccurrence.medication_id
+    ).join(
+        User, User.id == DoseOccurrence.user_id
+    ).filter(
+        DoseOccurrence.status == 'pending'
+    )
+
+
+def appointment_event_query():
+    """Query พื้นฐานของนัดหมายที่ยังรอยืนยัน พร้อมข้อมูลผู้สูงอายุ (ใช้ร่วมกันระหว่าง tick และ ReminderEngine)"""
+    return db.session.query(
+        Appointment.id.label('appointment_id'), Appointment.title, Appointment.location,
+        Appointment.appointment_datetime,
+        User.id.label('elder_id'), User.first_name.label('elder_first_name'),
+        User.last_name.label('elder_last_name'), User.email.label('elder_email')
+    ).join(
+        User, User.id == Appointment.user_id
+    ).filter(
+        Appointment.status == 'pending'
+    )
+
+
+def medicine_tick_windows(window_start, window_end, reminder_before_min, alert_after_min):
+    """ช่วงของ due_at ที่มีเหตุการณ์ยา (ล่วงหน้า / ถึงเวลา / ยาขาด) ตกอยู่ใน [window_start, window_end)"""
+    day_start = datetime.combine((window_end - timedelta(minutes=1)).date(), time.min)
+    before = timedelta(minutes=reminder_before_min)
+    windows = [(window_start + before, window_end + before), (window_start, window_end)]
+    # ยาขาด: เลยเวลามาครบ k * ALERT_AFTER_MINUTES (k >= 1) ในช่วงนี้ และเป็นยาของวันนี้
+    windows += repeat_windows(window_start, window_end, timedelta(minutes=alert_after_min), day_start)
+    return windows
+
+
+def medicine_tick_query(windows):
+    """รอบการทานยาที่ยังไม่ทานซึ่ง due_at อยู่ในช่วง windows (index (status, due_at))"""
+    return medicine_event_query().filter(range_windows(DoseOccurrence.due_at, windows))
+
+
+def appointment_tick_windows(window_start, window_end):
+    """ช่วงของ appointment_datetime ที่ถึงเวลานัดหรือเลยมาครบทุก 1 ชั่วโมงใน [window_start, window_end)"""
+    day_start = datetime.combine((window_end - timedelta(minutes=1)).date(), time.min)
+    # เตือนซ้ำ: เลยเวลานัดมาแล้ว k ชั่วโมง (k >= 1) ในช่วงนี้ และเป็นนัดของวันนี้
+    windows = [(window_start, window_end)]
+    windows += repeat_windows(window_start, window_end, timedelta(hours=1), day_start)
+    return windows
+
+
+def appointment_tick_query(windows):
+    """นัดหมายที่ยังรอยืนยันซึ่ง appointment_datetime อยู่ในช่วง windows (index (status, appointment_datetime))"""
+    return appointment_event_query().filter(range_windows(Appointment.appointment_datetime, windows))
+
+
+def tomorrow_appointments_query(tomorrow):
+    """นัดหมายที่ยังรอยืนยันของวัน tomorrow (index (status, appointment_datetime))"""
+    return Appointment.query.options(joinedload(Appointment.patient)).filter(
+        Appointment.status == 'pending',
+        within(Appointment.appointment_datetime, day_range(tomorrow))
+    )
+
+
+def medicine_dispatch_key(event, slot):
+    """key ใน reminder_dispatch ของเหตุการณ์ยา 1 ครั้ง"""
+    return ('medicine', event.occurrence_id, event.due_at.date(), slot)
+
+
+def appointment_dispatch_key(event, slot):
+    """key ใน reminder_dispatch ของเหตุการณ์นัดหมาย 1 ครั้ง"""
+    return ('appointment', event.appointment_id, event.appointment_datetime.date(), slot)
+
+
+def pre_reminder_message(event):
+    return f"แจ้งเตือนล่วงหน้า: {event.med_name} ({event.med_time})"
+
+
+def medicine_overdue_message(event):
+    return f"ยาขาด (เตือนซ้ำ): {event.med_name} ({event.med_time}) ของ {event.elder_first_name} {event.elder_last_name}"
+
+
+def appointment_overdue_message(event):
+    return f"นัดหมายเลยเวลา (เตือนซ้ำ): {event.title}"
+
+
+def send_medicine_pre_reminder(event, reminder_before_min):
+    """A. แจ้งเตือนล่วงหน้า (คืนค่า Notification ที่ต้องบันทึก)"""
+    if not event.elder_email:
+        return []
+    dispatch_email('medicine_pre_reminder', [event.elder_email], {
+        'first_name': event.elder_first_name, 'med_name': event.med_name,
+        'med_time': event.med_time, 'minutes': reminder_before_min
+    })
+    return [(event.elder_id, pre_reminder_message(event))]
+
+
+def send_medicine_due_alert(event, managers):
+    """B. แจ้งเตือนเมื่อ "ถึงเวลาพอดี" """
+    manager_emails = [email for _, email in managers if email]
+    if event.elder_email:
+        dispatch_email('medicine_due_elder', [event.elder_email], {
+            'first_name': event.elder_first_name, 'med_name': event.med_name, 'med_time': event.med_time
+        })
+    if manager_emails:
+        dispatch_email('medicine_due_manager', manager_emails, {
+            'elder_name': f"{event.elder_first_name} {event.elder_last_name}",
+            'med_name': event.med_name, 'med_time': event.med_time
+        })
+    return []
+
+
+def send_medicine_overdue_alert(event, managers, minutes_passed):
+    """C. แจ้งเตือนซ้ำ (ยาขาด) (คืนค่า Notification ที่ต้องบันทึก)"""
+    manager_emails = [email for _, email in managers if email]
+    if manager_emails:
+        dispatch_email('medicine_overdue_manager', manager_emails, {
+            'elder_name': f"{event.elder_first_name} {event.elder_last_name}",
+            'med_name': event.med_name, 'med_time': event.med_time,
+            'time_passed': format_minutes_to_readable_time(minutes_passed)
+        })
+    if event.elder_email:
+        dispatch_email('medicine_overdue_elder', [event.elder_email], {
+            'first_name': event.elder_first_name, 'med_name': event.med_name, 'med_time': event.med_time
+        })
+    message = medicine_overdue_message(event)
+    return [(manager_id, message) for manager_id, _ in managers]
+
+
+def send_appointment_due_alert(event, managers):
+    """A. แจ้งเตือนนัดหมายเมื่อ "ถึงเวลาพอดี" """
+    manager_emails = [email for _, email in managers if email]
+    params = {
+        'title': event.title, 'location': event.location,
+        'time': event.appointment_datetime.strftime('%H:%M น.')
+    }
+    if manager_emails:
+        dispatch_email('appointment_due_manager', manager_emails, {
+            **params, 'elder_name': f"{event.elder_first_name} {event.elder_last_name}"
+        })
+    if event.elder_email:
+        dispatch_email('appointment_due_elder', [event.elder_email], {**params, 'first_name': event.elder_first_name})
+    return []
+
+
+def send_appointment_overdue_alert(event, managers, minutes_passed):
+    """B. แจ้งเตือนซ้ำ "ทุกๆ 1 ชั่วโมงหลังจากเลยเวลา" (คืนค่า Notification ที่ต้องบันทึก)"""
+    manager_emails = [email for _, email in managers if email]
+    if manager_emails:
+        dispatch_email('appointment_overdue_manager', manager_emails, {
+            'elder_name': f"{event.elder_first_name} {event.elder_last_name}", 'title': event.title,
+            'time_passed': format_minutes_to_readable_time(minutes_passed)
+        })
+    message = appointment_overdue_message(event)
+    return [(manager_id, message) for manager_id, _ in managers]
+
+
+def check_medicine_schedule(app, now=None):
+    """
+    Job ที่ทำงานทุกนาทีเพื่อส่งการแจ้งเตือนการทานยาผ่าน "อีเมล"
+    ประมวลผลทุกเหตุการณ์ (ล่วงหน้า / ถึงเวลา / ยาขาด) ในช่วงตั้งแต่ watermark ล่าสุดถึงนาทีปัจจุบัน
+    tick ที่ช้าหรือถูกข้ามจึงไม่ทำให้แจ้งเตือนหาย และการส่งซ้ำถูกกันด้วย reminder_dispatch
+    แล้วโหลดข้อมูลที่เกี่ยวข้องแบบ bulk ทีละ chunk จำนวน query จึงไม่ขึ้นกับจำนวนยา
+    """
+    with app.app_context(), metrics.tick('check_medicine_schedule'):
+        now = now or datetime.now()
+        window_start, window_end = open_tick_window('check_medicine_schedule', now)
+        if window_start >= window_end:
+            return
+        # เหตุการณ์ทั้งหมดถูกประเมิน ณ นาทีสุดท้ายของช่วง
+        minute_start = window_end - timedelta(minutes=1)
+        today = minute_start.date()
+
+        reminder_before_min, alert_after_min = load_reminder_settings()
+        windows = medicine_tick_windows(window_start, window_end, reminder_before_min, alert_after_min)
+
+        base_query = medicine_tick_query(windows)
+
+        # แจ้งเตือนทั้งหมดของ tick นี้ถูกรวมเป็น digest ต่อผู้รับ (ตามช่วงเวลา DIGEST_WINDOW_MINUTES)
+        digest_window = load_digest_window()
+        with collect_digest(now) as digest:
+            for chunk in iter_chunks(base_query, DoseOccurrence.id):
+                metrics.count('medications_examined', len(chunk))
+                elder_ids = {event.elder_id for event in chunk}
+                med_ids = [event.medication_id for event in chunk]
+
+                # ยาที่มี log ของวันนี้แล้ว (กันกรณีที่ occurrence ยังไม่ถูกปิด)
+                taken_ids = taken_ids_on(med_ids, today)
+                contacts = load_manager_contacts(elder_ids)
+
+                # จัดว่าแต่ละรายการเป็นเหตุการณ์แบบไหน แล้วจอง key ใน reminder_dispatch พร้อมกันทั้ง chunk
+                candidates = []
+                for event in chunk:
+                    if event.medication_id in taken_ids:
+                        continue
+                    # tick ที่ตามเก็บย้อนหลังจะส่งเฉพาะการเตือนครั้งล่าสุดของแต่ละรายการ (ไม่ส่งย้อนทุกรอบ)
+                    minutes_passed = int((minute_start - event.due_at).total_seconds() // 60)
+                    if minutes_passed < 0:
+                        slot = 'pre'
+                    elif minutes_passed < alert_after_min:
+                        slot = 'due'
+                    else:
+                        slot = f'overdue:{minutes_passed // alert_after_min}'
+                    candidates.append((event, slot, minutes_passed))
+                claimed = claim_dispatches([medicine_dispatch_key(event, slot) for event, slot, _ in candidates])
+
+                new_notifications = []
+                for event, slot, minutes_passed in candidates:
+                    if medicine_dispatch_key(event, slot) not in claimed:
+                        continue
+                    managers = contacts.get(event.elder_id, [])
+                    if slot == 'pre':
+                        new_notifications += send_medicine_pre_reminder(event, reminder_before_min)
+                    elif slot == 'due':
+                        send_medicine_due_alert(event, managers)
+                    else:
+                        new_notifications += send_medicine_overdue_alert(event, managers, minutes_passed)
+
+                add_internal_notifications(new_notifications, now)
+                digest.write()
+                db.session.commit()
+
+        flushed = flush_digests(now, digest_window, dispatch_email)
+        metrics.count('digest_items_flushed', flushed)
+        commit_tick_window('check_medicine_schedule', window_end)
+
+
+def check_today_appointments(app, now=None):
+    """
+    Job ที่ทำงานทุก "นาที" เพื่อส่งการแจ้งเตือนสำหรับนัดหมายใน "วันนี้"
+    ประมวลผลนัดหมายที่ถึงเวลา หรือเลยเวลามาครบทุกๆ 1 ชั่วโมง ในช่วงตั้งแต่ watermark ล่าสุดถึงนาทีปัจจุบัน
+    """
+    with app.app_context(), metrics.tick('check_today_appointments'):
+        now = now or datetime.now()
+        window_start, window_end = open_tick_window('check_today_appointments', now)
+        if window_start >= window_end:
+            return
+        minute_start = window_end - timedelta(minutes=1)
+        windows = appointment_tick_windows(window_start, window_end)
+
+        base_query = appointment_tick_query(windows)
+
+        # แจ้งเตือนทั้งหมดของ tick นี้ถูกรวมเป็น digest ต่อผู้รับ (ตามช่วงเวลา DIGEST_WINDOW_MINUTES)
+        digest_window = load_digest_window()
+        with collect_digest(now) as digest:
+            for chunk in iter_chunks(base_query, Appointment.id):
+                metrics.count('appointments_examined', len(chunk))
+                contacts = load_manager_contacts({event.elder_id for event in chunk})
+
+                candidates = []
+                for event in chunk:
+                    minutes_passed = int((minute_start - event.appointment_datetime).total_seconds() // 60)
+                    slot = 'due' if minutes_passed < 60 else f'overdue:{minutes_passed // 60}'
+                    candidates.append((event, slot, minutes_passed))
+                claimed = claim_dispatches([appointment_dispatch_key(event, slot) for event, slot, _ in candidates])
+
+                new_notifications = []
+                for event, slot, minutes_passed in candidates:
+                    if appointment_dispatch_key(event, slot) not in claimed:
+                        continue
+                    managers = contacts.get(event.elder_id, [])
+                    if slot == 'due':
+                        send_appointment_due_alert(event, managers)
+                    else:
+                        new_notifications += send_appointment_overdue_alert(event, managers, minutes_passed)
+
+                add_internal_notifications(new_notifications, now)
+                digest.write()
+                db.session.commit()
+
+        flushed = flush_digests(now, digest_window, dispatch_email)
+        metrics.count('digest_items_flushed', flushed)
+        commit_tick_window('check_today_appointments', window_end)
+
+
+def check_tomorrow_appointments(app, now=None):
     """
     Job ที่ทำงานทุกวัน (ตอนเช้า) เพื่อส่งการแจ้งเตือนสำหรับนัดหมายใน "วันพรุ่งนี้"
     """
-    with app.app_context():
-        today = date.today()
+    with app.app_context(), metrics.tick('check_tomorrow_appointments', interval_seconds=24 * 60 * 60):
+        today = (now or datetime.now()).date()
         tomorrow = today + timedelta(days=1)
         
-        appointments_tomorrow = Appointment.query.filter(
-            func.date(Appointment.appointment_datetime) == tomorrow,
-            Appointment.status == 'pending'
-        ).all()
+        appointments_tomorrow = tomorrow_appointments_query(tomorrow).all()
+        metrics.count('appointments_examined', len(appointments_tomorrow))
+        contacts = load_manager_contacts({appt.user_id for appt in appointments_tomorrow})
+        claimed = claim_dispatches([('appointment', appt.id, tomorrow, 'tomorrow') for appt in appointments_tomorrow])
 
         for appt in appointments_tomorrow:
+            if ('appointment', appt.id, tomorrow, 'tomorrow') not in claimed:
+                continue
             elder = appt.patient
-            elder_name = f"{elder.first_name} {elder.last_name}"
-            appt_time_str = appt.appointment_datetime.strftime('%H:%M น.')
-            
-            manager_emails = [manager.email for manager in elder.managers if manager.email]
+            params = {
+                'title': appt.title, 'location': appt.location,
+                'time': appt.appointment_datetime.strftime('%H:%M น.')
+            }
+
+            manager_emails = [email for _, email in contacts[appt.user_id] if email]
             if manager_emails:
-                send_email(
-                    subject=f"🗓️ แจ้งเตือนนัดหมายวันพรุ่งนี้ของ {elder_name}",
-                    recipients=manager_emails,
-                    text_body=f"แจ้งเตือน: คุณ {elder_name} มีนัดหมายในวันพรุ่งนี้\n\nเรื่อง: {appt.title}\nเวลา: {appt_time_str}\nสถานที่: {appt.location}"
-                )
-            
+                dispatch_email('appointment_tomorrow_manager', manager_emails, {
+                    **params, 'elder_name': f"{elder.first_name} {elder.last_name}"
+                })
+
             if elder.email:
-                send_email(
-                    subject=f'🗓️ แจ้งเตือนนัดหมายวันพรุ่งนี้: {appt.title}',
-                    recipients=[elder.email],
-                    text_body=f"สวัสดีคุณ {elder.first_name},\n\nขอแจ้งเตือนว่าท่านมีนัดหมายในวันพรุ่งนี้ ({tomorrow.strftime('%d/%m/%Y')})\n\nเรื่อง: {appt.title}\nเวลา: {appt_time_str}\nสถานที่: {appt.location}\n\nกรุณาเตรียมตัวล่วงหน้าค่ะ"
-                )
-        
+                dispatch_email('appointment_tomorrow_elder', [elder.email], {
+                    **params, 'first_name': elder.first_name, 'date': tomorrow.strftime('%d/%m/%Y')
+                })
+
         db.session.commit()
 
 
-def init_scheduler(app):
-    """สร้างและเริ่มการทำงานของ Scheduler"""
-    scheduler = BackgroundScheduler(daemon=True)
-    
-    # Job 1: เช็คเวลากินยา (ทำงานทุกนาที)
+def poll_reminder_engine(app):
+    """ส่งการเปลี่ยนแปลงที่ web worker บันทึกไว้ในตาราง reminder_change เข้า ReminderEngine ของ process นี้"""
+    engine = get_engine(app)
+    if engine:
+        engine.apply_changes()
+
+
+def resync_reminder_engine(app):
+    """
+    โหลดคิวของ ReminderEngine ใหม่ทั้งหมดเป็นระยะ (ตัวสำรองของ poll_reminder_engine)
+    และลบแถวเก่าใน reminder_change ที่เลยช่วงที่ engine ย้อนดูไปนานแล้ว
+    """
+    engine = get_engine(app)
+    if engine:
+        engine.rebuild()
+    with app.app_context():
+        ReminderChange.query.filter(
+            ReminderChange.created_at < datetime.utcnow() - timedelta(days=1)
+        ).delete(synchronize_session=False)
+        db.session.commit()
+
+
+def flush_reminder_digests(app):
+    """
+    ส่ง digest ที่ครบ DIGEST_WINDOW_MINUTES แล้ว (โหมด ReminderEngine)
+    engine ส่ง digest ท้ายทุกชุดเหตุการณ์อยู่แล้ว Job นี้ครอบคลุมช่วงที่ไม่มีเหตุการณ์ให้ส่ง
+    """
+    with app.app_context(), metrics.tick('flush_reminder_digests'):
+        flushed = flush_digests(datetime.now(), load_digest_window(), dispatch_email)
+        metrics.count('digest_items_flushed', flushed)
+        db.session.commit()
+
+
+def publish_scheduler_metrics(app, lease):
+    """
+    บันทึก metric ของ process นี้ลงตาราง scheduler_metrics_snapshot (ทำงานทุก process ของ Scheduler)
+    metric อยู่ในหน่วยความจำของ process ที่รัน Job ส่วน /api/admin/stats/scheduler ถูกเรียกที่ web worker
+    จึงต้องอ่านผ่านฐานข้อมูล แถวของ process ที่หยุดส่งนานเกิน 1 วันจะถูกลบ
+    """
+    with app.app_context():
+        now = datetime.utcnow()
+        db.session.merge(SchedulerMetricsSnapshot(
+            holder=lease.holder,
+            is_leader=lease.is_leader,
+            metrics=json.dumps(metrics.snapshot()),
+            updated_at=now
+        ))
+        SchedulerMetricsSnapshot.query.filter(
+            SchedulerMetricsSnapshot.updated_at < now - timedelta(days=1)
+        ).delete(synchronize_session=False)
+        db.session.commit()
+
+
+def create_scheduler(blocking=False, job_defaults=None):
+    """
+    เลือก backend ของ APScheduler ให้เข้ากับสภาพแวดล้อม
+    ถ้า process ถูก monkey-patch ด้วย gevent (เช่น gunicorn --worker-class gevent) ให้ใช้ GeventScheduler
+    เพื่อให้ Job ทำงานเป็น greenlet และไม่บล็อก request อื่นๆ
+    """
+    job_defaults = job_defaults or {}
+    try:
+        from gevent import monkey
+        if monkey.is_module_patched('threading'):
+            from apscheduler.schedulers.gevent import GeventScheduler
+            return GeventScheduler(job_defaults=job_defaults)
+    except ImportError:
+        pass
+    # import APScheduler เฉพาะเมื่อสร้าง Scheduler จริง (endpoint ที่ import โมดูลนี้ไม่ต้องจ่ายค่า import)
+    if blocking:
+        from apscheduler.schedulers.blocking import BlockingScheduler
+        return BlockingScheduler(job_defaults=job_defaults)
+    from apscheduler.schedulers.background import BackgroundScheduler
+    return BackgroundScheduler(daemon=True, job_defaults=job_defaults)
+
+
+def record_job_event(event):
+    """
+    Listener ของ APScheduler: วัด lag ระหว่างเวลาที่ Job ควรเริ่มกับเวลาที่เริ่มจริง
+    และนับรอบที่พลาดเวลา รอบที่ถูกข้ามเพราะรอบก่อนยังไม่เสร็จ และรอบที่ error
+    """
+    from apscheduler.events import EVENT_JOB_SUBMITTED, EVENT_JOB_MISSED, EVENT_JOB_MAX_INSTANCES, EVENT_JOB_ERROR
+    if event.code == EVENT_JOB_SUBMITTED:
+        scheduled_at = event.scheduled_run_times[-1]
+        lag = (datetime.now(scheduled_at.tzinfo) - scheduled_at).total_seconds()
+        metrics.observe('scheduler_job_lag_seconds', max(lag, 0), job=event.job_id)
+        metrics.set_gauge('scheduler_job_last_lag_seconds', max(lag, 0), job=event.job_id)
+    elif event.code == EVENT_JOB_MISSED:
+        metrics.inc('scheduler_job_missed_total', job=event.job_id)
+    elif event.code == EVENT_JOB_MAX_INSTANCES:
+        metrics.inc('scheduler_job_overlap_skipped_total', job=event.job_id)
+        print(f"{event.job_id}: ข้ามรอบนี้เพราะรอบก่อนหน้ายังทำงานไม่เสร็จ")
+    elif event.code == EVENT_JOB_ERROR:
+        metrics.inc('scheduler_job_errors_total', job=event.job_id)
+
+
+def leader_only(lease, func):
+    """ห่อ Job ให้ทำงานเฉพาะใน process ที่ถือ lease ผู้นำอยู่"""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if not lease.is_leader:
+            return None
+        return func(*args, **kwargs)
+    return wrapper
+
+
+def init_scheduler(app, blocking=False):
+    """
+    สร้างและเริ่มการทำงานของ Scheduler
+    ทุก process ที่เรียกฟังก์ชันนี้จะแข่งกันถือ lease ในฐานข้อมูล และมีเพียงผู้นำเท่านั้นที่รัน Job จริง
+    (blocking=True ใช้กับคำสั่ง `flask scheduler run`)
+    """
+    # ทุก Job ทำงานได้ครั้งละ 1 รอบ และรอบที่พลาดหลายรอบจะถูกรวมเป็นรอบเดียว
+    # (tick รอบถัดไปจะตามเก็บเหตุการณ์ที่ค้างจาก watermark เอง)
+    scheduler = create_scheduler(blocking, job_defaults={
+        'coalesce': True,
+        'max_instances': 1,
+        'misfire_grace_time': app.config.get('SCHEDULER_MISFIRE_GRACE_SECONDS', 30),
+    })
+    from apscheduler.events import EVENT_JOB_SUBMITTED, EVENT_JOB_MISSED, EVENT_JOB_MAX_INSTANCES, EVENT_JOB_ERROR
+    scheduler.add_listener(
+        record_job_event, EVENT_JOB_SUBMITTED | EVENT_JOB_MISSED | EVENT_JOB_MAX_INSTANCES | EVENT_JOB_ERROR
+    )
+    use_engine = app.config.get('REMINDER_ENGINE') == 'timing_wheel'
+
+    def on_acquire():
+        # เติมรอบการทานยาของ "วันนี้" ทันทีที่ได้เป็นผู้นำ (กรณี Job รายคืนไม่ได้ทำงาน)
+        materialize_dose_occurrences(app)
+        if use_engine:
+            engine = ReminderEngine(app)
+            app.extensions['reminder_engine'] = engine
+            engine.start()
+
+    def on_lose():
+        engine = app.extensions.pop('reminder_engine', None)
+        if engine:
+            engine.stop()
+
+    lease = LeaderLease(
+        app,
+        ttl_seconds=app.config.get('LEADER_LEASE_TTL_SECONDS', 60),
+        on_acquire=on_acquire,
+        on_lose=on_lose
+    )
+    app.extensions['scheduler_lease'] = lease
+
+    # Heartbeat: ต่ออายุ lease หรือรับช่วงต่อเมื่อผู้นำเดิมหายไป (ทำงานทุก process)
+    scheduler.add_job(
+        func=lease.heartbeat,
+        trigger='interval',
+        seconds=app.config.get('LEADER_HEARTBEAT_SECONDS', 15),
+        next_run_time=datetime.now(),
+        id='leader_heartbeat_job',
+        replace_existing=True
+    )
+
+    # บันทึก metric ของ process นี้ลงฐานข้อมูลให้หน้า admin (web worker) อ่าน (ทำงานทุก process)
+    scheduler.add_job(
+        func=publish_scheduler_metrics,
+        args=[app, lease],
+        trigger='interval',
+        seconds=app.config.get('SCHEDULER_METRICS_PUBLISH_SECONDS', 15),
+        id='publish_scheduler_metrics_job',
+        replace_existing=True
+    )
+
+    # Job 0: สร้างรอบการทานยาของ "วันพรุ่งนี้" ล่วงหน้า (ทำงานทุกคืน ตอน 23:30)
+    scheduler.add_job(
+        func=leader_only(lease, materialize_dose_occurrences),
+        kwargs={'app': app, 'days_ahead': 1},
+        trigger='cron',
+        hour=23,
+        minute=30,
+        id='materialize_dose_occurrences_job',
+        misfire_grace_time=3600,
+        replace_existing=True
+    )
+
+    # Job 0.1: ตรวจซ้ำหลังเที่ยงคืนว่ารอบของ "วันนี้" ครบ (กรณี Job 23:30 พลาด หรือมีการเปลี่ยนผู้นำระหว่างนั้น)
+    # ทำซ้ำได้อย่างปลอดภัย แถวที่มีอยู่แล้วจะถูกข้าม
     scheduler.add_job(
-        func=check_medicine_schedule, 
-        args=[app], 
-        trigger="interval", 
-        minutes=1,
-        id='check_medicine_schedule_job',
+        func=leader_only(lease, materialize_dose_occurrences),
+        kwargs={'app': app},
+        trigger='cron',
+        hour=0,
+        minute=5,
+        id='materialize_dose_occurrences_today_job',
+        misfire_grace_time=3600,
         replace_existing=True
     )
     
-    # Job 2: เช็คนัดหมายของ "วันนี้" (ทำงานทุกนาที)
+    if use_engine:
+        # Job 1+2 ถูกแทนที่ด้วย ReminderEngine ที่ปลุกตรงเวลาของแต่ละเหตุการณ์
+        # รับการเปลี่ยนแปลงจาก Endpoint (web worker) ทุก REMINDER_ENGINE_POLL_SECONDS
+        scheduler.add_job(
+            func=leader_only(lease, poll_reminder_engine),
+            args=[app],
+            trigger='interval',
+            seconds=app.config.get('REMINDER_ENGINE_POLL_SECONDS', 2),
+            id='poll_reminder_engine_job',
+            replace_existing=True
+        )
+        scheduler.add_job(
+            func=leader_only(lease, flush_reminder_digests),
+            args=[app],
+            trigger='interval',
+            minutes=1,
+            id='flush_reminder_digests_job',
+            replace_existing=True
+        )
+        scheduler.add_job(
+            func=leader_only(lease, resync_reminder_engine),
+            args=[app],
+            trigger='interval',
+            minutes=app.config.get('REMINDER_ENGINE_RESYNC_MINUTES', 5),
+            id='resync_reminder_engine_job',
+            replace_existing=True
+        )
+    else:
+        # Job 1: เช็คเวลากินยา (ทำงานทุกนาที)
+        scheduler.add_job(
+            func=leader_only(lease, check_medicine_schedule), 
+            args=[app], 
+            trigger="interval", 
+            minutes=1,
+            id='check_medicine_schedule_job',
+            replace_existing=True
+        )
+    
+        # Job 2: เช็คนัดหมายของ "วันนี้" (ทำงานทุกนาที)
+        scheduler.add_job(
+            func=leader_only(lease, check_today_appointments),
+            args=[app],
+            trigger='interval',
+            minutes=1,
+            id='check_today_appointments_job',
+            replace_existing=True
+        )
+
+    # Job 4: ล้างบันทึกการส่งแจ้งเตือนเก่าใน reminder_dispatch (ทำงานทุกคืน ตอนตี 3)
+    scheduler.add_job(
+        func=leader_only(lease, prune_dispatch_ledger),
+        args=[app],
+        trigger='cron',
+        hour=3,
+        minute=0,
+        id='prune_reminder_dispatch_job',
+        misfire_grace_time=3600,
+        replace_existing=True
+    )
+
+    # Job 5: ส่งอีเมลที่ค้างใน email_outbox (ทุก process ช่วยกันส่งได้ เพราะการจองแถวไม่ชนกัน)
     scheduler.add_job(
-        func=check_today_appointments,
+        func=drain_outbox,
         args=[app],
         trigger='interval',
-        minutes=1,
-        id='check_today_appointments_job',
+        seconds=app.config.get('EMAIL_OUTBOX_POLL_SECONDS', 5),
+        id='drain_email_outbox_job',
+        replace_existing=True
+    )
+    scheduler.add_job(
+        func=leader_only(lease, prune_outbox),
+        args=[app],
+        trigger='cron',
+        hour=3,
+        minute=10,
+        id='prune_email_outbox_job',
+        misfire_grace_time=3600,
         replace_existing=True
     )
 
     # Job 3: เช็คนัดหมายล่วงหน้าของ "วันพรุ่งนี้" (ทำงานวันละครั้ง ตอน 7 โมงเช้า)
     scheduler.add_job(
-        func=check_tomorrow_appointments,
+        func=leader_only(lease, check_tomorrow_appointments),
         args=[app],
         trigger='cron',
         hour=7,
         minute=0,
         id='check_tomorrow_appointments_job',
+        misfire_grace_time=3600,
         replace_existing=True
     )
 
-    scheduler.start()
     print("ตัวจัดตารางแจ้งเตือน (Email) ได้เริ่มทำงานเรียบร้อยแล้ว")
+    try:
+        greenlet = scheduler.start()
+        if blocking and greenlet is not None:
+            greenlet.join()
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        if blocking:
+            on_lose()
+            lease.release()
+    return scheduler
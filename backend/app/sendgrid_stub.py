@@ -0,0 +1,142 @@
+# backend/app/sendgrid_stub.py
+"""
+เซิร์ฟเวอร์จำลอง SendGrid /v3/mail/send สำหรับทดสอบบนเครื่อง (ใช้ผ่านคำสั่ง `flask outbox stub-server`)
+
+ตรวจรูปแบบคำขอตามขีดจำกัดหลักของ SendGrid แล้วเก็บคำขอที่รับไว้ โดยไม่ส่งอีเมลจริง
+ชี้แอปมาที่เซิร์ฟเวอร์นี้ด้วย SENDGRID_API_URL=http://127.0.0.1:<port>/v3/mail/send
+"""
+import json
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+MAX_PERSONALIZATIONS = 1000
+MAX_RECIPIENTS = 1000
+MAX_SUBSTITUTION_BYTES = 10000
+
+
+def validate_payload(payload):
+    """ตรวจคำขอเหมือนที่ SendGrid ตรวจ คืนค่า list ของ error (ว่าง = ผ่าน)"""
+    errors = []
+    personalizations = payload.get('personalizations') or []
+    if not payload.get('from', {}).get('email'):
+        errors.append('The from object must be provided for every email send.')
+    if not personalizations:
+        errors.append('The personalizations field is required and must have at least one personalization.')
+    if len(personalizations) > MAX_PERSONALIZATIONS:
+        errors.append(f'The personalizations field cannot have more than {MAX_PERSONALIZATIONS} items.')
+    if sum(len(p.get('to') or []) for p in personalizations) > MAX_RECIPIENTS:
+        errors.append(f'The total number of recipients must be no more than {MAX_RECIPIENTS}.')
+    if not payload.get('content'):
+        errors.append('Unless a valid template_id is provided, the content parameter is required.')
+
+    for p in personalizations:
+        if not p.get('to'):
+            errors.append('The to array is required for all personalization objects.')
+        if any('@' not in (to.get('email') or '') for to in p.get('to') or []):
+            errors.append('Does not contain a valid address.')
+        if not (p.get('subject') or payload.get('subject')):
+            errors.append('The subject is required. You can get around this requirement if you use a template.')
+        substitutions = p.get('substitutions') or {}
+        if len(json.dumps(substitutions, ensure_ascii=False).encode('utf-8')) > MAX_SUBSTITUTION_BYTES:
+            errors.append(f'Substitutions may not exceed {MAX_SUBSTITUTION_BYTES} bytes per personalization.')
+    return errors
+
+
+def render_personalizations(payload):
+    """แปลงคำขอเป็นอีเมลแต่ละฉบับ (ผู้รับ, หัวข้อ, เนื้อหาหลังแทนค่า substitutions) เหมือนที่ผู้รับจะได้เห็น"""
+    emails = []
+    for p in payload.get('personalizations') or []:
+        substitutions = p.get('substitutions') or {}
+        bodies = {}
+        for content in payload.get('content') or []:
+            value = content['value']
+            for token, replacement in substitutions.items():
+                value = value.replace(token, replacement)
+            bodies[content['type']] = value
+        emails.append({
+            'to': [to['email'] for to in p.get('to') or []],
+            'subject': p.get('subject') or payload.get('subject'),
+            'text': bodies.get('text/plain'),
+            'html': bodies.get('text/html'),
+        })
+    return emails
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        server = self.server
+        if self.path.rstrip('/') != '/v3/mail/send':
+            return self._reply(404, {'errors': [{'message': 'Not found'}]})
+        if not (self.headers.get('Authorization') or '').startswith('Bearer '):
+            return self._reply(401, {'errors': [{'message': 'Permission denied, wrong credentials'}]})
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return self._reply(400, {'errors': [{'message': 'Bad Request'}]})
+
+        with server.lock:
+            # สถานะที่ตั้งให้ตอบผิดพลาด (ทดสอบ retry / dead-letter) ใช้ทีละ 1 คำขอตามลำดับ
+            forced_status = server.fail_with.pop(0) if server.fail_with else None
+        if forced_status:
+            return self._reply(forced_status, {'errors': [{'message': 'Injected failure'}]})
+
+        errors = validate_payload(payload)
+        if errors:
+            return self._reply(400, {'errors': [{'message': message} for message in errors]})
+        with server.lock:
+            server.requests.append(payload)
+        self._reply(202, None)
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode('utf-8') if body is not None else b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class SendGridStub(ThreadingHTTPServer):
+    """
+    เซิร์ฟเวอร์จำลอง SendGrid
+    - requests: คำขอที่ผ่านการตรวจแล้ว (JSON) ตามลำดับที่ได้รับ
+    - fail_with: list ของ HTTP status ที่จะตอบกลับแทนคำขอถัดไป เช่น [500, 400]
+    """
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=0, verbose=False):
+        super().__init__((host, port), _Handler)
+        self.verbose = verbose
+        self.lock = threading.Lock()
+        self.requests = []
+        self.fail_with = []
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}/v3/mail/send'
+
+    def emails(self):
+        """อีเมลทั้งหมดที่ได้รับ (แยกตาม personalization)"""
+        with self.lock:
+            return [email for payload in self.requests for email in render_personalizations(payload)]
+
+    def start(self):
+        """เริ่มรับคำขอใน background thread (คืนค่าตัวเอง)"""
+        self._thread = threading.Thread(target=self.serve_forever, name='sendgrid-stub', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread:
+            self._thread.join()
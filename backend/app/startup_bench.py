@@ -0,0 +1,95 @@
+# backend/app/startup_bench.py
+"""
+วัดเวลาเริ่มต้นแอป (import + create_app) สำหรับคำสั่ง `flask admin startup-bench`
+
+แต่ละรอบรันใน process ใหม่ด้วย `python -X importtime` (import ที่ cache ไว้ใน process เดิมจึงไม่บิดผล)
+แล้วสรุปเวลา import ของแต่ละแพ็กเกจระดับบนสุด เพื่อดูว่าอะไรทำให้ worker ของ gunicorn และคำสั่ง `flask ...` เริ่มช้า
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+# โมดูลที่ควรถูก import แบบ lazy (ไม่ควรถูกโหลดระหว่าง create_app)
+DEFERRED_MODULES = ('firebase_admin', 'google.auth', 'google.cloud', 'apscheduler', 'sendgrid')
+
+# รันใน process ลูก: จับเวลา import แพ็กเกจ app และ create_app แยกกัน
+_SNIPPET = """
+import json, sys
+from time import perf_counter
+started = perf_counter()
+from config import config
+from app import create_app
+imported = perf_counter()
+create_app(config[sys.argv[1]])
+finished = perf_counter()
+print(json.dumps({'import': imported - started, 'create_app': finished - imported, 'modules': sorted(sys.modules)}))
+"""
+
+
+def parse_importtime(output):
+    """
+    แปลงผลของ -X importtime เป็น list ของ (ชื่อโมดูล, self µs, cumulative µs, ระดับความลึก)
+    (บรรทัดรูปแบบ "import time:  self | cumulative | <เว้นวรรค 2 ต่อระดับ>ชื่อโมดูล")
+    """
+    rows = []
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        try:
+            self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+            self_us, cumulative_us = int(self_us), int(cumulative_us)
+        except ValueError:
+            continue  # บรรทัดหัวตาราง
+        depth = (len(name) - len(name.lstrip(' ')) - 1) // 2
+        rows.append((name.strip(), self_us, cumulative_us, depth))
+    return rows
+
+
+def run_once(config_name='default', cwd=None):
+    """รัน import + create_app 1 รอบใน process ใหม่ คืนค่า (เวลาที่วัดได้, ผลของ importtime ที่แปลงแล้ว)"""
+    cwd = cwd or os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ)
+    # ไม่ให้ create_app เริ่ม Scheduler ระหว่างวัด
+    env.pop('WERKZEUG_RUN_MAIN', None)
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', _SNIPPET, config_name],
+        cwd=cwd, env=env, capture_output=True, text=True
+    )
+    lines = [line for line in result.stdout.splitlines() if line.startswith('{')]
+    if result.returncode != 0 or not lines:
+        raise RuntimeError(f"create_app failed (exit {result.returncode}):\n{result.stderr[-2000:]}")
+    return json.loads(lines[-1]), parse_importtime(result.stderr)
+
+
+def summarize(runs):
+    """
+    สรุปผลหลายรอบ: ค่ามัธยฐานของเวลา import/create_app/รวม (วินาที),
+    เวลา import (self) ตามแพ็กเกจระดับบนสุด (µs, ค่ามัธยฐาน) และโมดูลใน DEFERRED_MODULES ที่ถูกโหลด
+    """
+    per_package = defaultdict(list)
+    for _, rows in runs:
+        # รวมเวลา self ของทุกโมดูลในแพ็กเกจ (ไม่นับซ้ำแพ็กเกจอื่นที่มัน import ต่อ)
+        totals = defaultdict(int)
+        for name, self_us, _, _ in rows:
+            totals[name.split('.')[0]] += self_us
+        for package, total in totals.items():
+            per_package[package].append(total)
+
+    timings = [timing for timing, _ in runs]
+    loaded = set().union(*(timing['modules'] for timing in timings))
+    return {
+        'import': statistics.median(t['import'] for t in timings),
+        'create_app': statistics.median(t['create_app'] for t in timings),
+        'total': statistics.median(t['import'] + t['create_app'] for t in timings),
+        'packages': sorted(
+            ((package, statistics.median(values)) for package, values in per_package.items()),
+            key=lambda item: item[1], reverse=True
+        ),
+        'deferred_loaded': [
+            module for module in DEFERRED_MODULES
+            if any(name == module or name.startswith(module + '.') for name in loaded)
+        ],
+    }
@@ -2,40 +2,63 @@ from flask import Blueprint, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from .extensions import db
 from .models import User, Medication, MedicationLog, Appointment, HealthRecord
-from sqlalchemy import func, extract
+from .date_ranges import day_range, month_range, within
+from .db_routing import read_replica
+from .medication_status import active_on, taken_on
+from .elder_access import can_manage_elder, managed_elder_ids
+from .current_user import current_identity, current_role
+from .appointments import upcoming_appointments_query
+from sqlalchemy import func
 from datetime import date, datetime, timedelta
 from collections import defaultdict
 
 stats_bp = Blueprint('stats', __name__, url_prefix='/api/stats')
 
+
+# --- Query ของ Endpoint (ใช้ร่วมกับ `flask admin explain-check`) ---
+def weekly_log_counts_query(elder_id, first_day):
+    """จำนวนการทานยาต่อวันของผู้สูงอายุ 7 วันตั้งแต่ first_day (index (user_id, taken_at, id))"""
+    return db.session.query(
+        func.date(MedicationLog.taken_at).label('log_date'),
+        func.count(MedicationLog.id).label('log_count')
+    ).filter(
+        MedicationLog.user_id == elder_id,
+        within(MedicationLog.taken_at, day_range(first_day, days=7))
+    ).group_by('log_date')
+
+
+def monthly_health_records_query(elder_ids, year, month):
+    """ข้อมูลสุขภาพของผู้สูงอายุใน elder_ids ในเดือนที่ระบุ (index (user_id, record_date, id))"""
+    return HealthRecord.query.filter(
+        HealthRecord.user_id.in_(elder_ids),
+        within(HealthRecord.record_date, month_range(year, month))
+    )
+
+
 @stats_bp.route('/caregiver_dashboard/<int:elder_id>', methods=['GET'])
 @jwt_required()
+@read_replica
 def get_caregiver_dashboard_stats(elder_id):
     current_user_id = get_jwt_identity()
-    caregiver = User.query.get(current_user_id)
+    caregiver = current_identity()
     elder = User.query.get(elder_id)
     
     # ตรวจสอบสิทธิ์
-    if not caregiver or caregiver.role not in ['caregiver', 'osm'] or not elder or elder not in caregiver.managed_elders:
+    if not caregiver or caregiver.role not in ['caregiver', 'osm'] or not elder or not can_manage_elder(caregiver.id, elder.id):
         return jsonify(msg="Permission denied or elder not found"), 403
 
     today = date.today()
     
     # --- 1. สรุปการกินยาของวันนี้ (ปรับปรุง Query ให้แม่นยำขึ้น) ---
-    meds_today_query = Medication.query.filter(
-        Medication.user_id == elder_id,
-        Medication.start_date <= today,
-        (Medication.end_date == None) | (Medication.end_date >= today)
-    )
-    meds_today_ids = [m.id for m in meds_today_query.all()]
+    meds_today_ids = [
+        med_id for (med_id,) in db.session.query(Medication.id).filter(
+            Medication.user_id == elder_id, active_on(today)
+        )
+    ]
     total_meds_today = len(meds_today_ids)
     
-    taken_count = 0
-    if total_meds_today > 0:
-        taken_count = MedicationLog.query.filter(
-            MedicationLog.medication_id.in_(meds_today_ids),
-            func.date(MedicationLog.taken_at) == today
-        ).count()
+    # นับเป็นจำนวนยา (ไม่ใช่จำนวน log) เพื่อไม่ให้ยาที่บันทึกซ้ำทำให้ยอด "ยังไม่ทาน" ติดลบ
+    taken_count = len(taken_on(meds_today_ids, today))
     
     missed_count = total_meds_today - taken_count
             
@@ -44,16 +67,11 @@ def get_caregiver_dashboard_stats(elder_id):
 
     # --- 3. สถิติ 7 วันย้อนหลัง (Line Chart) ---
     seven_days_ago = today - timedelta(days=6)
-    daily_logs = db.session.query(
-        func.date(MedicationLog.taken_at).label('log_date'),
-        func.count(MedicationLog.id).label('log_count')
-    ).filter(
-        MedicationLog.user_id == elder_id,
-        MedicationLog.taken_at >= seven_days_ago
-    ).group_by('log_date').all()
+    daily_logs = weekly_log_counts_query(elder_id, seven_days_ago).all()
     
     # สร้าง Dictionary เพื่อให้ง่ายต่อการ map ข้อมูล
-    log_dict = {log.log_date: log.log_count for log in daily_logs}
+    # (func.date คืนค่าเป็น String บน SQLite และเป็น date บน PostgreSQL จึงแปลงเป็น 'YYYY-MM-DD' ก่อน)
+    log_dict = {str(log.log_date): log.log_count for log in daily_logs}
     
     chart_labels_dt = [(seven_days_ago + timedelta(days=i)) for i in range(7)]
     # TODO: แปลงเป็นชื่อวันภาษาไทยถ้าต้องการ
@@ -61,10 +79,9 @@ def get_caregiver_dashboard_stats(elder_id):
     chart_data = [log_dict.get(dt.isoformat(), 0) for dt in chart_labels_dt]
 
     # --- 4. การนัดพบแพทย์ถัดไป ---
-    next_appointment = Appointment.query.filter(
-        Appointment.user_id == elder_id,
-        Appointment.appointment_datetime >= datetime.utcnow()
-    ).order_by(Appointment.appointment_datetime.asc()).first()
+    next_appointment = upcoming_appointments_query(elder_id, datetime.utcnow()).order_by(
+        Appointment.appointment_datetime.asc()
+    ).first()
     
     return jsonify({
         "summary_today": { "taken": taken_count, "missed": missed_count },
@@ -82,11 +99,11 @@ def get_caregiver_dashboard_stats(elder_id):
 
 @stats_bp.route('/osm_monthly_summary', methods=['GET'])
 @jwt_required()
+@read_replica
 def get_osm_monthly_summary():
     current_user_id = get_jwt_identity()
-    osm_user = User.query.get(current_user_id)
-    
-    if not osm_user or osm_user.role != 'osm':
+    # ใช้ role จาก token (ไม่ต้อง query ผู้ใช้)
+    if current_role() != 'osm':
         return jsonify(msg="Permission denied"), 403
 
     today = date.today()
@@ -94,8 +111,7 @@ def get_osm_monthly_summary():
     current_year = today.year
 
     # ใช้ผู้สูงอายุที่ดูแลอยู่ (Managed Elders)
-    managed_elders = osm_user.managed_elders.all()
-    managed_elders_ids = [elder.id for elder in managed_elders]
+    managed_elders_ids = list(managed_elder_ids(current_user_id))
 
     if not managed_elders_ids:
         # --- *** จุดที่แก้ไข 1: ส่ง Key ให้ครบถ้วน *** ---
@@ -106,11 +122,7 @@ def get_osm_monthly_summary():
         }), 200
 
     # ดึงข้อมูลสุขภาพเฉพาะของผู้สูงอายุในความดูแล
-    records = HealthRecord.query.filter(
-        HealthRecord.user_id.in_(managed_elders_ids),
-        extract('year', HealthRecord.record_date) == current_year,
-        extract('month', HealthRecord.record_date) == current_month
-    ).all()
+    records = monthly_health_records_query(managed_elders_ids, current_year, current_month).all()
 
     # --- คำนวณกลุ่มเสี่ยง ---
     SYSTOLIC_HIGH = 140
@@ -6,6 +6,9 @@ from flask import current_app, send_from_directory
 from flask import Blueprint, request, jsonify
 from .models import User
 from .extensions import db
+from .recipients import invalidate_elders
+from .elder_access import can_manage_elder, invalidate_managers
+from .current_user import current_identity, current_role, get_current_user
 from flask_jwt_extended import jwt_required, get_jwt, get_jwt_identity
 from flask import render_template, request, flash, redirect, url_for
 from werkzeug.security import check_password_hash
@@ -77,7 +80,7 @@ def upload_avatar():
 @jwt_required()
 def update_avatar(user_id):
     current_user_id = get_jwt_identity()
-    current_user = User.query.get(current_user_id)
+    current_user = current_identity()
     user_to_update = User.query.get_or_404(user_id)
 
     # --- ตรวจสอบสิทธิ์ ---
@@ -86,7 +89,7 @@ def update_avatar(user_id):
     is_owner = current_user.id == user_to_update.id
     is_manager = (current_user.role in ['caregiver', 'osm'] and 
                   user_to_update.role == 'elder' and 
-                  user_to_update in current_user.managed_elders)
+                  can_manage_elder(current_user.id, user_to_update.id))
 
     if not is_owner and not is_manager:
         return jsonify(msg="Permission denied"), 403
@@ -153,7 +156,7 @@ def get_my_managed_elders():
         return jsonify({"msg": "Unauthorized"}), 403
 
     current_user_id = get_jwt_identity()
-    manager = User.query.get(current_user_id)
+    manager = get_current_user()
     if not manager:
         return jsonify(msg="ไม่พบผู้ใช้ที่มีบทบาทผู้จัดการในฐานข้อมูล"), 404
 
@@ -192,7 +195,7 @@ def add_elder():
     if claims.get('role') not in ['caregiver', 'osm']:
         return jsonify({"msg": "ไม่มีสิทธิ์: การกระทำนี้อนุญาตให้เฉพาะผู้ดูแลหรือ อสม. เท่านั้น"}), 403
 
-    manager_user = User.query.get(current_user_id)
+    manager_user = get_current_user()
     if not manager_user:
          return jsonify({"msg": "ไม่พบผู้ใช้ในฐานข้อมูล"}), 404
 
@@ -233,6 +236,8 @@ def add_elder():
 
     db.session.add(elder)
     db.session.commit()
+    invalidate_elders(elder.id)
+    invalidate_managers(manager_user.id)
     return jsonify({"msg": f"สร้างผู้สูงอายุชื่อ '{username}' เรียบร้อย และเชื่อมต่อกับผู้ดูแล '{manager_user.username}' แล้ว"}), 201
 
 # -----------------------------------------------------------------------------
@@ -242,7 +247,7 @@ def add_elder():
 @jwt_required()
 def link_elder_by_id():
     current_user_id = get_jwt_identity()
-    manager = User.query.get(current_user_id)
+    manager = get_current_user()
     if not manager or manager.role not in ['caregiver', 'osm']:
         return jsonify(msg="Permission denied"), 403
 
@@ -253,11 +258,13 @@ def link_elder_by_id():
     if not elder:
         return jsonify(msg="Elder not found"), 404
     
-    if elder in manager.managed_elders:
+    if can_manage_elder(manager.id, elder.id):
         return jsonify(msg="You are already managing this elder"), 409
 
     manager.managed_elders.append(elder)
     db.session.commit()
+    invalidate_elders(elder.id)
+    invalidate_managers(manager.id)
     return jsonify(msg=f"Successfully linked with {elder.first_name}"), 200
 
 # -----------------------------------------------------------------------------
@@ -267,7 +274,7 @@ def link_elder_by_id():
 @jwt_required()
 def unlink_elder():
     current_user_id = get_jwt_identity()
-    manager = User.query.get(current_user_id)
+    manager = get_current_user()
     
     if not manager or manager.role not in ['caregiver', 'osm']:
         return jsonify(msg="ไม่มีสิทธิ์เข้าใช้งาน"), 403
@@ -281,10 +288,12 @@ def unlink_elder():
         return jsonify(msg="ไม่พบข้อมูลผู้สูงอายุในระบบ"), 404
 
     # ตรวจสอบว่าผู้สูงอายุคนนี้อยู่ในความดูแลของผู้ใช้คนนี้จริงหรือไม่
-    if elder_to_unlink in manager.managed_elders:
+    if can_manage_elder(manager.id, elder_to_unlink.id):
         # ใช้ .remove() เพื่อลบความสัมพันธ์ออกจาก association table
         manager.managed_elders.remove(elder_to_unlink)
         db.session.commit()
+        invalidate_elders(elder_to_unlink.id)
+        invalidate_managers(manager.id)
         return jsonify(msg=f"ยกเลิกการเชื่อมต่อกับ {elder_to_unlink.first_name} สำเร็จแล้ว"), 200
     else:
         return jsonify(msg="คุณไม่มีสิทธิ์ดูแลผู้สูงอายุรายนี้"), 403
@@ -296,7 +305,7 @@ def unlink_elder():
 @jwt_required()
 def register_fcm():
     current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    user = get_current_user()
     if not user:
         return jsonify(msg="ไม่พบข้อมูลผู้ใช้ในระบบ"), 404
         
@@ -317,9 +326,7 @@ def register_fcm():
 @users_bp.route('/admin/reset_password/<int:user_id>', methods=['GET', 'POST'])
 @jwt_required(locations=['cookies'])
 def admin_reset_password(user_id):
-    admin_id = get_jwt_identity()
-    admin_user = User.query.get(admin_id)
-    if not admin_user or admin_user.role != 'admin':
+    if current_role() != 'admin':
         return "Permission Denied", 403
 
     user_to_edit = User.query.get_or_404(user_id)
@@ -363,11 +370,11 @@ def get_all_elders():
 @jwt_required()
 def get_elder_details(elder_id):
     current_user_id = get_jwt_identity()
-    manager = User.query.get(current_user_id)
+    manager = current_identity()
     elder = User.query.filter_by(id=elder_id, role='elder').first_or_404()
 
     # ตรวจสอบสิทธิ์: เฉพาะผู้ดูแลของผู้สูงอายุคนนี้เท่านั้นที่ดูได้
-    if manager.role not in ['caregiver', 'osm'] or elder not in manager.managed_elders:
+    if manager.role not in ['caregiver', 'osm'] or not can_manage_elder(manager.id, elder.id):
         return jsonify(msg="Permission denied"), 403
 
     return jsonify({
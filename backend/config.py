@@ -36,6 +36,108 @@ class Config:
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(days=1)
     JWT_TOKEN_LOCATION = ["headers"]
     JWT_COOKIE_CSRF_PROTECT = False
+
+    # --- การตั้งค่า Scheduler ---
+    # 'timing_wheel' = ใช้ ReminderEngine แบบ in-memory ที่ปลุกตรงเวลาของแต่ละเหตุการณ์ (ค่าเริ่มต้น)
+    #                 Endpoint บันทึกการเปลี่ยนแปลงลงตาราง reminder_change ให้ engine ใน process ผู้นำอ่าน
+    # 'polling' = ตรวจฐานข้อมูลทุกนาที
+    REMINDER_ENGINE = os.environ.get('REMINDER_ENGINE') or 'timing_wheel'
+    # ReminderEngine อ่านการเปลี่ยนแปลงจาก reminder_change ทุกกี่วินาที
+    REMINDER_ENGINE_POLL_SECONDS = 2
+    # โหลดคิวของ ReminderEngine ใหม่ทั้งหมดทุกกี่นาที (ตัวสำรองกรณีพลาดการเปลี่ยนแปลง)
+    REMINDER_ENGINE_RESYNC_MINUTES = 5
+
+    # ให้ web worker (gunicorn) รัน Scheduler ไปด้วยหรือไม่
+    # ค่าเริ่มต้นคือไม่รัน และให้ใช้คำสั่ง `flask scheduler run` เป็น process แยก
+    # ถ้าเปิดไว้ ทุก worker จะแข่งกันถือ lease และมีเพียงตัวเดียวที่รัน Job
+    SCHEDULER_EMBEDDED = (os.environ.get('SCHEDULER_EMBEDDED') or 'false').lower() == 'true'
+    # อายุของ lease ผู้นำ และความถี่ในการต่ออายุ (วินาที)
+    LEADER_LEASE_TTL_SECONDS = 60
+    LEADER_HEARTBEAT_SECONDS = 15
+    # tick ที่ช้าหรือถูกข้าม จะประมวลผลย้อนหลังจาก watermark ได้ไม่เกินกี่นาที
+    # (เหตุการณ์ที่เก่ากว่านี้จะถูกข้ามไป เพื่อไม่ให้ส่งแจ้งเตือนค้างทีละมากๆ หลังระบบล่มนาน)
+    SCHEDULER_MAX_CATCHUP_MINUTES = 60
+    # APScheduler: tick ที่พลาดเวลาไม่เกินกี่วินาทียังให้ทำงาน (รอบที่พลาดหลายรอบจะถูกรวมเป็นรอบเดียว)
+    SCHEDULER_MISFIRE_GRACE_SECONDS = 30
+    # ทุกกี่วินาที process Scheduler บันทึก metric ของตัวเองลงฐานข้อมูล (ให้ /api/admin/stats/scheduler ของ web worker อ่าน)
+    SCHEDULER_METRICS_PUBLISH_SECONDS = 15
+
+    # cache รายชื่อผู้ดูแลของผู้สูงอายุ (จำนวนผู้สูงอายุสูงสุด, อายุของข้อมูล)
+    # การเปลี่ยนแปลงจาก process อื่นรับผ่านเลขรุ่นใน recipient_cache_version ทันที อายุนี้เป็นเพียงตัวสำรอง
+    RECIPIENT_CACHE_SIZE = 10000
+    RECIPIENT_CACHE_TTL_SECONDS = 300
+
+    # cache รายชื่อผู้สูงอายุที่ผู้ดูแลแต่ละคนดูแล (app/elder_access.py) ใช้กับรายการ/สรุปผล ไม่ใช้ตรวจสิทธิ์
+    ELDER_ACCESS_CACHE_SIZE = 10000
+    ELDER_ACCESS_CACHE_TTL_SECONDS = 60
+
+    # cache ข้อมูลพื้นฐานของผู้ใช้ (role, status, ชื่อ) ที่ใช้ตรวจสิทธิ์ทุก request (app/current_user.py)
+    # ถูกล้างทันทีเมื่อ process นี้แก้ไขผู้ใช้ การแก้ไขจาก process อื่นจะมีผลภายใน TTL
+    IDENTITY_CACHE_SIZE = 10000
+    IDENTITY_CACHE_TTL_SECONDS = 60
+
+    # การแบ่งหน้าแบบ cursor (app/pagination.py): จำนวนต่อหน้าเมื่อไม่ระบุ limit และค่าสูงสุดที่ยอมให้ขอ
+    PAGE_SIZE_DEFAULT = 50
+    PAGE_SIZE_MAX = 200
+
+    # URL หน้ารีเซ็ตรหัสผ่านของ Web App ({token} จะถูกแทนด้วย token)
+    PASSWORD_RESET_URL = os.environ.get('PASSWORD_RESET_URL') or 'http://localhost:5173/reset-password/{token}'
+    # คำขอรีเซ็ตรหัสผ่านถูกประมวลผลนอก request (app/password_reset.py) ค้างในคิวได้ไม่เกินกี่รายการต่อ process
+    PASSWORD_RESET_QUEUE_SIZE = 1000
+
+    # ซิงก์สถานะการทานยาไปยัง Firebase RTDB แบบ write-behind (app/rtdb_sync.py)
+    # 'firebase' หรือ 'memory' (RTDB จำลองในหน่วยความจำ สำหรับทดสอบ)
+    RTDB_SYNC_CLIENT = os.environ.get('RTDB_SYNC_CLIENT') or 'firebase'
+    # รวมการเขียนเป็น update() ครั้งเดียวทุกกี่มิลลิวินาที หรือเมื่อค้างครบกี่ path
+    RTDB_SYNC_FLUSH_MS = 200
+    RTDB_SYNC_MAX_BATCH = 500
+    # ค้างได้ไม่เกินกี่ path ระหว่างที่ Firebase ล่ม, retry แบบ exponential backoff (1s, 2s, 4s, ... ไม่เกิน 60s)
+    RTDB_SYNC_MAX_PENDING = 10000
+    RTDB_SYNC_RETRY_BACKOFF_SECONDS = 1
+    RTDB_SYNC_RETRY_MAX_SECONDS = 60
+
+    # --- Read replica (app/db_routing.py) ---
+    # endpoint ที่อ่านอย่างเดียว (@read_replica) จะอ่านจากฐานข้อมูลสำเนาถ้าตั้งค่า DATABASE_REPLICA_URL ไว้
+    # อ่านจากฐานข้อมูลหลักแทนเมื่อสำเนาตามหลังเกิน REPLICA_MAX_LAG_SECONDS (ตรวจทุก REPLICA_LAG_CHECK_SECONDS)
+    # และผู้ใช้ที่เพิ่งเขียนข้อมูลจะอ่านจากฐานข้อมูลหลักต่ออีก REPLICA_STICKY_SECONDS (read-your-writes)
+    # ผ่าน header X-DB-Primary-Until ที่ client ส่งกลับมา (ดู app/db_routing.py)
+    SQLALCHEMY_BINDS = {'replica': os.environ['DATABASE_REPLICA_URL']} if os.environ.get('DATABASE_REPLICA_URL') else {}
+    REPLICA_MAX_LAG_SECONDS = 5
+    REPLICA_LAG_CHECK_SECONDS = 5
+    REPLICA_STICKY_SECONDS = 10
+
+    # วัดเวลารอ connection จาก pool (app/db_pool.py, เฉพาะฐานข้อมูลที่ไม่ใช่ SQLite)
+    DB_POOL_METRICS = True
+
+    # --- การตั้งค่าการส่งอีเมล (SendGrid) ---
+    SENDGRID_API_URL = os.environ.get('SENDGRID_API_URL') or 'https://api.sendgrid.com/v3/mail/send'
+    # จำนวน worker ที่ส่งอีเมลพร้อมกัน (= จำนวน connection สูงสุดไปยัง SendGrid) และขนาดคิว
+    EMAIL_WORKERS = int(os.environ.get('EMAIL_WORKERS') or 4)
+    EMAIL_QUEUE_SIZE = int(os.environ.get('EMAIL_QUEUE_SIZE') or 1000)
+    # ถ้าคิวเต็ม ผู้เรียกจะรอได้ไม่เกินกี่วินาที ก่อนส่งอีเมลนั้นเองแบบ synchronous (backpressure)
+    EMAIL_ENQUEUE_TIMEOUT_SECONDS = 5
+    EMAIL_HTTP_TIMEOUT_SECONDS = 10
+    # เวลาสูงสุดที่รอให้คิวว่างตอนปิด process
+    EMAIL_DRAIN_TIMEOUT_SECONDS = 30
+    # คำขอแบบรวม (multi-personalization): ผู้รับรวมต่อคำขอ และขนาด substitutions ต่อฉบับ ตามขีดจำกัดของ SendGrid
+    EMAIL_BATCH_MAX_RECIPIENTS = 1000
+    EMAIL_BATCH_MAX_SUBSTITUTION_BYTES = 10000
+    # จำกัดอัตราการส่ง (token bucket, หน่วยเป็นผู้รับต่อวินาที ต่อ drainer 1 ตัว) 0 = ไม่จำกัด
+    # อีเมลไม่เร่งด่วนใช้ได้เฉพาะ token ที่เกิน EMAIL_RATE_URGENT_RESERVE ของ burst ส่วนที่เหลือถูกเลื่อนไปส่งภายหลัง
+    EMAIL_RATE_LIMIT_PER_SECOND = float(os.environ.get('EMAIL_RATE_LIMIT_PER_SECOND') or 50)
+    EMAIL_RATE_LIMIT_BURST = 500
+    EMAIL_RATE_URGENT_RESERVE = 0.2
+    # จำกัดอัตราต่อโดเมนผู้รับเฉพาะโดเมนที่ระบุ (rate, burst) เช่น {'gmail.com': (20, 200)}
+    # โดเมนที่ไม่ได้ระบุถูกจำกัดด้วยอัตรารวมของผู้ให้บริการเท่านั้น
+    EMAIL_DOMAIN_RATE_LIMITS = {}
+    # Outbox: จำนวนแถวที่ drainer ดึงต่อรอบ, ความถี่ในการตรวจ, อายุการจองแถว
+    EMAIL_OUTBOX_BATCH_SIZE = 1000
+    EMAIL_OUTBOX_POLL_SECONDS = 5
+    EMAIL_OUTBOX_LEASE_SECONDS = 120
+    # retry แบบ exponential backoff (30s, 60s, 120s, ... ไม่เกิน 1 ชั่วโมง) ครบจำนวนครั้งแล้วย้ายไป 'dead'
+    EMAIL_OUTBOX_MAX_ATTEMPTS = 8
+    EMAIL_OUTBOX_BACKOFF_SECONDS = 30
+    EMAIL_OUTBOX_BACKOFF_MAX_SECONDS = 3600
     
 
 class DevelopmentConfig(Config):
@@ -62,7 +164,25 @@ class ProductionConfig(Config):
     # แต่ SQLAlchemy เวอร์ชันใหม่ๆ ต้องการ "postgresql://"
     if SQLALCHEMY_DATABASE_URI and SQLALCHEMY_DATABASE_URI.startswith("postgres://"):
         SQLALCHEMY_DATABASE_URI = SQLALCHEMY_DATABASE_URI.replace("postgres://", "postgresql://", 1)
+    SQLALCHEMY_BINDS = {
+        key: url.replace("postgres://", "postgresql://", 1) if url.startswith("postgres://") else url
+        for key, url in Config.SQLALCHEMY_BINDS.items()
+    }
         
+    # --- Connection pool ของ PostgreSQL (ต่อ gunicorn worker 1 ตัว) ---
+    # worker แบบ gevent รับได้หลายร้อย request พร้อมกัน (greenlet) แต่ต้องไม่เปิด connection เกินที่ PostgreSQL รับได้:
+    # greenlet ที่เกิน DB_POOL_SIZE + DB_MAX_OVERFLOW จะรอ connection ว่าง (ไม่เกิน DB_POOL_TIMEOUT วินาที)
+    # จำนวน worker x (DB_POOL_SIZE + DB_MAX_OVERFLOW) + Scheduler ต้องน้อยกว่า max_connections ของฐานข้อมูล
+    # เวลารอดูได้จาก metric db_pool_checkout_wait_seconds (/api/admin/stats/db_pool)
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE') or 10),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW') or 10),
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT') or 10),
+        # ตรวจ connection ก่อนใช้ และเปิดใหม่ก่อนที่ฝั่ง server/proxy จะตัด connection ที่ค้างนาน
+        'pool_pre_ping': True,
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE') or 1800),
+    }
+
     # (ค่า Firebase และอื่นๆ สามารถดึงมาจาก Environment Variable ได้เช่นกัน)
     FIREBASE_DATABASE_URL = os.environ.get('FIREBASE_DATABASE_URL')
 
@@ -1,4 +1,10 @@
 from run import app
 
+# ถ้าเปิด SCHEDULER_EMBEDDED ทุก gunicorn worker จะเริ่ม Scheduler ของตัวเอง
+# แต่จะมีเพียง worker ที่ถือ lease ผู้นำเท่านั้นที่รัน Job จริง
+if app.config.get('SCHEDULER_EMBEDDED'):
+    from app.scheduler import init_scheduler
+    init_scheduler(app)
+
 if __name__ == "__main__":
-    app.run()
\ No newline at end of file
+    app.run()
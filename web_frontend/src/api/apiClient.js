@@ -11,6 +11,12 @@ const apiClient = axios.create({
     },
 });
 
+// read-your-writes: หลัง request ที่เขียนข้อมูล Backend จะส่ง X-DB-Primary-Until มา
+// ต้องส่งค่านี้กลับไปทุก request เพื่อให้ Backend อ่านจากฐานข้อมูลหลัก (ไม่ใช่สำเนาที่อาจยังไม่มีข้อมูลใหม่)
+// ไม่ว่า request จะไปตก worker ไหน (Backend ตรวจเวลาหมดอายุเอง)
+const PRIMARY_UNTIL_HEADER = 'X-DB-Primary-Until';
+const PRIMARY_UNTIL_KEY = 'dbPrimaryUntil';
+
 // เพิ่ม Interceptor เพื่อแนบ Token ไปกับทุก Request โดยอัตโนมัติ
 apiClient.interceptors.request.use(
     (config) => {
@@ -18,6 +24,10 @@ apiClient.interceptors.request.use(
         if (token) {
             config.headers['Authorization'] = `Bearer ${token}`;
         }
+        const primaryUntil = sessionStorage.getItem(PRIMARY_UNTIL_KEY);
+        if (primaryUntil) {
+            config.headers[PRIMARY_UNTIL_HEADER] = primaryUntil;
+        }
         return config;
     },
     (error) => {
@@ -25,4 +35,15 @@ apiClient.interceptors.request.use(
     }
 );
 
+// จำค่า X-DB-Primary-Until ล่าสุดจาก Backend (axios แปลงชื่อ header เป็นตัวพิมพ์เล็ก)
+apiClient.interceptors.response.use(
+    (response) => {
+        const primaryUntil = response.headers[PRIMARY_UNTIL_HEADER.toLowerCase()];
+        if (primaryUntil) {
+            sessionStorage.setItem(PRIMARY_UNTIL_KEY, primaryUntil);
+        }
+        return response;
+    }
+);
+
 export default apiClient;
\ No newline at end of file
@@ -0,0 +1,22 @@
+// src/components/LoadMoreButton.jsx
+import React from 'react';
+
+// ปุ่ม "โหลดเพิ่มเติม" ท้ายรายการที่แบ่งหน้าแบบ cursor (ใช้คู่กับ hooks/useCursorList)
+function LoadMoreButton({ hasMore, loadMore, loadingMore, loadMoreError }) {
+    if (!hasMore) return null;
+
+    return (
+        <div className="text-center pt-2">
+            {loadMoreError && <p className="text-red-500 text-sm mb-2">{loadMoreError}</p>}
+            <button
+                onClick={loadMore}
+                disabled={loadingMore}
+                className="bg-white text-gray-700 border px-4 py-2 rounded-md text-sm font-semibold hover:bg-gray-50 disabled:opacity-50"
+            >
+                {loadingMore ? 'กำลังโหลด...' : 'โหลดเพิ่มเติม'}
+            </button>
+        </div>
+    );
+}
+
+export default LoadMoreButton;
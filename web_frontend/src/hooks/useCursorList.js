@@ -0,0 +1,39 @@
+// src/hooks/useCursorList.js
+import { useState, useCallback } from 'react';
+import apiClient from '../api/apiClient';
+
+// ดึงรายการจาก Endpoint ที่แบ่งหน้าแบบ cursor (Backend ส่งครั้งละ PAGE_SIZE_DEFAULT = 50 รายการ พร้อม page.next_cursor)
+// cursorParam: 'before' สำหรับรายการใหม่ไปเก่า (ข้อมูลสุขภาพ), 'after' สำหรับรายการเก่าไปใหม่ (นัดหมาย)
+function useCursorList(url, itemsKey, cursorParam) {
+    const [items, setItems] = useState([]);
+    const [nextCursor, setNextCursor] = useState(null);
+    const [loadingMore, setLoadingMore] = useState(false);
+    const [loadMoreError, setLoadMoreError] = useState('');
+
+    // cursor = null คือโหลดหน้าแรกใหม่ทั้งหมด, มี cursor คือต่อท้ายรายการเดิม
+    const fetchPage = useCallback(async (cursor = null) => {
+        const params = cursor ? { [cursorParam]: cursor } : {};
+        const response = await apiClient.get(url, { params });
+        const pageItems = response.data[itemsKey] || [];
+        setItems(prevItems => (cursor ? [...prevItems, ...pageItems] : pageItems));
+        setNextCursor(response.data.page?.next_cursor || null);
+    }, [url, itemsKey, cursorParam]);
+
+    const loadMore = useCallback(async () => {
+        if (!nextCursor || loadingMore) return;
+        setLoadingMore(true);
+        setLoadMoreError('');
+        try {
+            await fetchPage(nextCursor);
+        } catch (err) {
+            console.error("Failed to load more items:", err);
+            setLoadMoreError('ไม่สามารถโหลดข้อมูลเพิ่มเติมได้');
+        } finally {
+            setLoadingMore(false);
+        }
+    }, [fetchPage, nextCursor, loadingMore]);
+
+    return { items, setItems, fetchPage, hasMore: Boolean(nextCursor), loadMore, loadingMore, loadMoreError };
+}
+
+export default useCursorList;
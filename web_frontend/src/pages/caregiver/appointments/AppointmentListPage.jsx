@@ -2,28 +2,30 @@
 import React, { useState, useEffect, useCallback } from 'react';
 import { useParams, useNavigate } from 'react-router-dom';
 import apiClient from '../../../api/apiClient';
+import useCursorList from '../../../hooks/useCursorList';
+import LoadMoreButton from '../../../components/LoadMoreButton';
 import { FaArrowLeft } from 'react-icons/fa';
 
 function AppointmentListPage() {
     const { elderId, elderName } = useParams();
     const navigate = useNavigate();
-    const [appointments, setAppointments] = useState([]);
     const [loading, setLoading] = useState(true);
     const [error, setError] = useState('');
+    // นัดหมายเรียงจากใกล้ที่สุด หน้าถัดไปใช้ after=next_cursor
+    const { items: appointments, setItems: setAppointments, fetchPage, ...pagination } = useCursorList(`/appointments/elder/${elderId}`, 'appointments', 'after');
 
     const fetchAppointments = useCallback(async () => {
         setLoading(true);
         setError('');
         try {
-            const response = await apiClient.get(`/appointments/elder/${elderId}`);
-            setAppointments(response.data.appointments || []);
+            await fetchPage();
         } catch (err) {
             console.error("Failed to fetch appointments", err);
             setError('ไม่สามารถโหลดข้อมูลนัดหมายได้');
         } finally {
             setLoading(false);
         }
-    }, [elderId]);
+    }, [fetchPage]);
 
     useEffect(() => {
         fetchAppointments();
@@ -119,6 +121,7 @@ function AppointmentListPage() {
                             ))
                         )
                     )}
+                    {!loading && !error && <LoadMoreButton {...pagination} />}
                 </div>
             </main>
 
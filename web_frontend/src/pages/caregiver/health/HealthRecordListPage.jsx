@@ -1,7 +1,8 @@
 // src/pages/caregiver/health/HealthRecordListPage.jsx
 import React, { useState, useEffect, useCallback } from 'react';
 import { useParams, useNavigate } from 'react-router-dom';
-import apiClient from '../../../api/apiClient';
+import useCursorList from '../../../hooks/useCursorList';
+import LoadMoreButton from '../../../components/LoadMoreButton';
 import { FaArrowLeft, FaHeart, FaWeight, FaStopwatch, FaStickyNote } from 'react-icons/fa';
 
 // Component ย่อยสำหรับแสดงข้อมูลแต่ละแถว
@@ -15,24 +16,24 @@ const InfoRow = ({ icon, text }) => (
 function HealthRecordListPage() {
     const { elderId, elderName } = useParams();
     const navigate = useNavigate();
-    const [records, setRecords] = useState([]);
     const [loading, setLoading] = useState(true);
     const [error, setError] = useState('');
+    // ข้อมูลสุขภาพเรียงใหม่ไปเก่า หน้าถัดไปใช้ before=next_cursor
+    const { items: records, fetchPage, ...pagination } = useCursorList(`/health/records/elder/${elderId}`, 'records', 'before');
 
     const fetchHealthRecords = useCallback(async () => {
         setLoading(true);
         setError('');
         try {
             // ใช้ Endpoint เดิมที่เราสร้างไว้สำหรับดึงข้อมูลสุขภาพ
-            const response = await apiClient.get(`/health/records/elder/${elderId}`);
-            setRecords(response.data.records || []);
+            await fetchPage();
         } catch (err) {
             console.error("Failed to fetch health records:", err);
             setError('ไม่สามารถโหลดข้อมูลสุขภาพได้');
         } finally {
             setLoading(false);
         }
-    }, [elderId]);
+    }, [fetchPage]);
 
     useEffect(() => {
         fetchHealthRecords();
@@ -76,6 +77,7 @@ function HealthRecordListPage() {
                             ))
                         )
                     )}
+                    {!loading && !error && <LoadMoreButton {...pagination} />}
                 </div>
             </main>
         </div>
@@ -1,27 +1,28 @@
 // src/pages/elder/AppointmentsTab.jsx
 import React, { useState, useEffect, useCallback } from 'react';
-import apiClient from '../../api/apiClient';
+import useCursorList from '../../hooks/useCursorList';
+import LoadMoreButton from '../../components/LoadMoreButton';
 import { FaCalendarAlt, FaClock, FaHospital, FaUserMd } from 'react-icons/fa';
 
 function AppointmentsTab() {
-    const [appointments, setAppointments] = useState([]);
     const [loading, setLoading] = useState(true);
     const [error, setError] = useState('');
+    // นัดหมายเรียงจากใกล้ที่สุด หน้าถัดไปใช้ after=next_cursor
+    const { items: appointments, fetchPage, ...pagination } = useCursorList('/appointments/my_appointments', 'appointments', 'after');
 
     const fetchAppointments = useCallback(async () => {
         setLoading(true);
         setError('');
         try {
             // ใช้ Endpoint สำหรับดึงนัดหมายของตัวเอง
-            const response = await apiClient.get('/appointments/my_appointments');
-            setAppointments(response.data.appointments || []);
+            await fetchPage();
         } catch (err) {
             console.error("Failed to fetch appointments:", err);
             setError('ไม่สามารถโหลดข้อมูลนัดหมายได้');
         } finally {
             setLoading(false);
         }
-    }, []);
+    }, [fetchPage]);
 
     useEffect(() => {
         fetchAppointments();
@@ -57,6 +58,7 @@ function AppointmentsTab() {
                     ))
                 )
             )}
+            {!loading && !error && <LoadMoreButton {...pagination} />}
         </div>
     );
 }
@@ -1,14 +1,16 @@
 // src/pages/elder/HealthRecordsTab.jsx
 import React, { useState, useEffect, useCallback } from 'react';
-import apiClient from '../../api/apiClient';
+import useCursorList from '../../hooks/useCursorList';
+import LoadMoreButton from '../../components/LoadMoreButton';
 import { jwtDecode } from 'jwt-decode';
 import { FaHeart, FaWeight, FaStopwatch, FaStickyNote } from 'react-icons/fa';
 
 function HealthRecordsTab() {
-    const [records, setRecords] = useState([]);
     const [loading, setLoading] = useState(true);
     const [error, setError] = useState('');
     const [userId, setUserId] = useState(null);
+    // ข้อมูลสุขภาพเรียงใหม่ไปเก่า หน้าถัดไปใช้ before=next_cursor
+    const { items: records, fetchPage, ...pagination } = useCursorList(`/health/records/elder/${userId}`, 'records', 'before');
 
     // ดึง User ID จาก Token
     useEffect(() => {
@@ -29,15 +31,14 @@ function HealthRecordsTab() {
         setError('');
         try {
             // ใช้ Endpoint สำหรับดึงข้อมูลสุขภาพของตัวเอง
-            const response = await apiClient.get(`/health/records/elder/${userId}`);
-            setRecords(response.data.records || []);
+            await fetchPage();
         } catch (err) {
             console.error("Failed to fetch health records:", err);
             setError('ไม่สามารถโหลดข้อมูลสุขภาพได้');
         } finally {
             setLoading(false);
         }
-    }, [userId]);
+    }, [userId, fetchPage]);
 
     useEffect(() => {
         fetchHealthRecords();
@@ -77,6 +78,7 @@ function HealthRecordsTab() {
                     ))
                 )
             )}
+            {!loading && !error && <LoadMoreButton {...pagination} />}
         </div>
     );
 }
@@ -1,7 +1,8 @@
 // src/pages/osm/OsmHealthRecordPage.jsx
 import React, { useState, useEffect, useCallback } from 'react';
 import { useParams, useNavigate } from 'react-router-dom';
-import apiClient from '../../api/apiClient';
+import useCursorList from '../../hooks/useCursorList';
+import LoadMoreButton from '../../components/LoadMoreButton';
 import { FaArrowLeft, FaHeart, FaWeight, FaStopwatch, FaStickyNote } from 'react-icons/fa';
 
 // Component ย่อยสำหรับแสดงข้อมูลแต่ละแถว
@@ -15,23 +16,23 @@ const InfoRow = ({ icon, text }) => (
 function OsmHealthRecordPage() {
     const { elderId, elderName } = useParams();
     const navigate = useNavigate();
-    const [records, setRecords] = useState([]);
     const [loading, setLoading] = useState(true);
     const [error, setError] = useState('');
+    // ข้อมูลสุขภาพเรียงใหม่ไปเก่า หน้าถัดไปใช้ before=next_cursor
+    const { items: records, fetchPage, ...pagination } = useCursorList(`/health/records/elder/${elderId}`, 'records', 'before');
 
     const fetchHealthRecords = useCallback(async () => {
         setLoading(true);
         setError('');
         try {
-            const response = await apiClient.get(`/health/records/elder/${elderId}`);
-            setRecords(response.data.records || []);
+            await fetchPage();
         } catch (err) {
             console.error("Failed to fetch health records:", err);
             setError('ไม่สามารถโหลดข้อมูลสุขภาพได้');
         } finally {
             setLoading(false);
         }
-    }, [elderId]);
+    }, [fetchPage]);
 
     useEffect(() => {
         fetchHealthRecords();
@@ -75,6 +76,7 @@ function OsmHealthRecordPage() {
                             ))
                         )
                     )}
+                    {!loading && !error && <LoadMoreButton {...pagination} />}
                 </div>
             </main>
         </div>